@@ -25,6 +25,8 @@ def _create_gmail_archive_compat():
     from pathlib import Path
     from typing import Any, Dict, Optional
 
+    from ownmail.storage import read_email
+
     class GmailArchiveCompat:
         """Backward-compatible wrapper for GmailArchive.
 
@@ -51,8 +53,7 @@ def _create_gmail_archive_compat():
             """Index an email for full-text search."""
             try:
                 t0 = time.time()
-                with open(filepath, "rb") as f:
-                    content = f.read()
+                content = read_email(filepath)
                 t_read = time.time() - t0
 
                 t0 = time.time()
@@ -76,6 +77,7 @@ def _create_gmail_archive_compat():
                     attachments=parsed["attachments"],
                     conn=conn,
                     skip_delete=skip_delete,
+                    body_indexed_bytes=parsed.get("body_indexed_bytes"),
                 )
                 t_fts = time.time() - t0
 
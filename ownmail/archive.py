@@ -11,18 +11,178 @@ import signal
 import sqlite3
 import sys
 import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
 from email.utils import parsedate_to_datetime as _parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
-from ownmail.config import get_db_dir
+from ownmail import blobs, storage
+from ownmail.config import get_db_dir, get_index_limits, get_index_strip_quotes
 from ownmail.database import ArchiveDatabase
 from ownmail.keychain import KeychainStorage
+from ownmail.normalize import strip_quoted_text
 from ownmail.parser import EmailParser
 from ownmail.providers.base import EmailProvider
 
+# A spooled message is indexed from its first (body cap * this) bytes:
+# room for the transfer encoding (base64, quoted-printable) of the text
+SPOOL_INDEX_FACTOR = 4
+# Budget for the MIME part headers kept after that prefix
+SPOOL_INDEX_HEADER_BYTES = 256 * 1024
+
+
+class AdaptiveBatchSize:
+    """AIMD controller for download batch sizes.
+
+    Grows the batch by one message while per-message latency holds steady
+    or falls and errors stay rare, and halves it when the server pushes
+    back (timeouts, HTTP 429/503, IMAP NO responses).
+    """
+
+    # Error markers that mean "slow down" rather than "this message is bad"
+    THROTTLE_MARKERS = (
+        "429", "503", "rate limit", "ratelimit", "too many",
+        "timed out", "timeout", "fetch failed",
+    )
+    GROW_MAX_ERROR_RATE = 0.02  # Only grow when at most 2% of a batch failed
+    LATENCY_SLACK = 1.05  # Latency may wobble this much and still count as steady
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.size = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self._latency: Optional[float] = None  # Smoothed seconds per message
+        self._messages = 0
+        self._errors = 0
+        self._elapsed = 0.0
+
+    @classmethod
+    def is_throttle_error(cls, error_msg: str) -> bool:
+        """Check whether an error message signals server-side throttling."""
+        error_msg = str(error_msg).lower()
+        return any(marker in error_msg for marker in cls.THROTTLE_MARKERS)
+
+    def record(self, count: int, elapsed: float, errors: int, throttled: bool) -> None:
+        """Update the batch size from one batch's outcome.
+
+        Args:
+            count: Messages requested in the batch
+            elapsed: Seconds the download took
+            errors: Messages that failed
+            throttled: Whether any failure was a throttling error
+        """
+        if count < 1:
+            return
+        self._messages += count
+        self._errors += errors
+        self._elapsed += elapsed
+
+        latency = elapsed / count
+        if throttled:
+            self.size = max(self.minimum, self.size // 2)
+        elif errors / count <= self.GROW_MAX_ERROR_RATE and (
+            self._latency is None or latency <= self._latency * self.LATENCY_SLACK
+        ):
+            self.size = min(self.maximum, self.size + 1)
+
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency = 0.7 * self._latency + 0.3 * latency
+
+    @property
+    def throughput(self) -> float:
+        """Messages per second spent downloading."""
+        return self._messages / self._elapsed if self._elapsed > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        """Fraction of requested messages that failed."""
+        return self._errors / self._messages if self._messages else 0.0
+
+    def status(self) -> str:
+        """Short summary for the progress line."""
+        return f"batch {self.size} | {self.throughput:.1f} msg/s | {self.error_rate:.0%} err"
+
+
+class ArchiveWriter:
+    """Single SQLite writer shared by backups running concurrently.
+
+    Each source downloads in its own thread, but every database write
+    runs on one writer thread with one connection, committed after each
+    job (rolled back if the job raises). The writer also renders one
+    progress line per source.
+    """
+
+    def __init__(self, archive: "EmailArchive"):
+        self._archive = archive
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ownmail-writer")
+        self.conn: sqlite3.Connection = self._executor.submit(self._connect).result()
+        self.stop_event = threading.Event()
+        self._status: Dict[str, str] = {}
+        self._status_lock = threading.RLock()  # log() may run in a signal handler
+        self._rendered_lines = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._archive.db.db_path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _run_and_commit(self, fn, args, write_behind):
+        try:
+            result = fn(*args)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        if write_behind is not None:
+            # Files first: a committed row never points at unsynced data
+            write_behind.flush()
+        self.conn.commit()
+        return result
+
+    def run(self, fn, *args, write_behind: Optional[storage.WriteBehind] = None):
+        """Run fn(*args) on the writer thread, commit, and return its result.
+
+        With write_behind, its pending fsyncs are flushed before the commit.
+        """
+        return self._executor.submit(self._run_and_commit, fn, args, write_behind).result()
+
+    def report(self, source_name: str, text: str) -> None:
+        """Update a source's progress and redraw the combined status block."""
+        with self._status_lock:
+            self._status[source_name] = text
+            self._redraw("")
+
+    def log(self, text: str) -> None:
+        """Print a message above the status block, then redraw the block."""
+        with self._status_lock:
+            self._redraw(text + "\n")
+
+    def _redraw(self, message: str) -> None:
+        # Called with _status_lock held
+        out = f"\r\033[{self._rendered_lines}F\033[J" if self._rendered_lines else "\r"
+        out += message
+        for name, status in self._status.items():
+            out += f"\033[K  {name}: {status}\n"
+        self._rendered_lines = len(self._status)
+        print(out, end="", flush=True)
+
+    def close(self) -> None:
+        """Commit, close the connection and stop the writer thread."""
+        def _close():
+            self.conn.commit()
+            self.conn.close()
+
+        self._executor.submit(_close).result()
+        self._executor.shutdown()
+        if self._archive._batch_conn is self.conn:
+            self._archive._batch_conn = None
+
 
 class EmailArchive:
     """Orchestrates email backup, indexing, and search.
@@ -54,6 +214,9 @@ class EmailArchive:
         # Batch connection for fast writes
         self._batch_conn: Optional[sqlite3.Connection] = None
 
+        # Open pack segments per source directory (pack layout)
+        self._pack_writers: Dict[Path, storage.PackWriter] = {}
+
     def get_emails_dir(self, source_name: str) -> Path:
         """Get emails directory for a source.
 
@@ -75,6 +238,11 @@ class EmailArchive:
         since: Optional[str] = None,
         until: Optional[str] = None,
         verbose: bool = False,
+        backfill_threshold: Optional[int] = None,
+        writer: Optional["ArchiveWriter"] = None,
+        compression: Optional[str] = None,
+        layout: Optional[str] = None,
+        dedup_attachments: bool = False,
     ) -> dict:
         """Backup emails from a provider.
 
@@ -83,23 +251,36 @@ class EmailArchive:
             since: Only backup emails after this date (YYYY-MM-DD)
             until: Only backup emails before this date (YYYY-MM-DD)
             verbose: Show detailed progress output
+            backfill_threshold: Two-phase download. Messages larger than
+                this many bytes are queued in the database and downloaded
+                after all smaller ones, so search is usable sooner.
+            writer: Shared writer when several sources download at once.
+                All database writes then go through its single connection,
+                progress goes to its combined status line and Ctrl-C is
+                handled by the caller.
+            compression: Store new emails compressed ("zstd" writes
+                .eml.zst files). Content hashes are still computed over
+                the uncompressed bytes.
+            layout: Storage layout for new emails: "date" (default, one
+                file each under YYYY/MM/), "day" (YYYY/MM/DD/), "hash"
+                (YYYY/MM/<xx>/) or "pack" (appended to pack segments,
+                see ownmail.storage).
+            dedup_attachments: Move large base64 attachments into the
+                archive-wide content-addressed blob store (ownmail.blobs).
 
         Returns:
             Dictionary with success_count, error_count, interrupted
         """
+        storage.check_compression(compression)
+        storage.check_layout(layout)
         account = provider.account
         emails_dir = self.get_emails_dir(provider.source_name)
         emails_dir.mkdir(parents=True, exist_ok=True)
 
-        # Get downloaded IDs for this account
+        # Downloaded IDs and content hashes are checked in SQLite rather than
+        # loaded into memory, so startup cost stays flat as the archive grows
         if verbose:
-            print("[verbose] Loading downloaded IDs from database...", flush=True)
-        downloaded_ids = self.db.get_downloaded_ids(account)
-        # Also load content hashes for content-based dedup
-        # (handles provider_id format changes, e.g. INBOX:uid → [Gmail]/All Mail:uid)
-        downloaded_hashes = self.db.get_downloaded_content_hashes(account)
-        if verbose:
-            print(f"[verbose] Found {len(downloaded_ids)} previously downloaded IDs", flush=True)
+            print(f"[verbose] Found {self.db.get_email_count(account)} previously downloaded emails", flush=True)
 
         # Get sync state (key depends on provider type)
         sync_key = "sync_state" if provider.name == "imap" else "history_id"
@@ -109,6 +290,16 @@ class EmailArchive:
         if verbose:
             print(f"[verbose] Sync state: {sync_state}", flush=True)
 
+        def db_write(fn, *args):
+            """Run a DB write step that takes a trailing conn argument.
+
+            With a shared writer it runs on the writer thread and its
+            connection, in order with this source's batches.
+            """
+            if writer is None:
+                return fn(*args)
+            return writer.run(fn, *args, writer.conn)
+
         # Get new message IDs (with optional date filter)
         print("Checking for new emails...", flush=True)
         if verbose:
@@ -121,8 +312,64 @@ class EmailArchive:
         if verbose:
             print(f"[verbose] Provider returned {len(new_ids)} message IDs", flush=True)
 
+        # Apply label changes (moves, relabels) reported for downloaded emails
+        label_changes = getattr(provider, "get_label_changes", None)
+        label_changes = label_changes() if callable(label_changes) else None
+        if isinstance(label_changes, dict) and label_changes:
+            updated = db_write(self.db.apply_label_changes, account, label_changes)
+            if updated:
+                print(f"  Updated labels for {updated} existing emails", flush=True)
+
         # Filter out already downloaded
-        new_ids = [mid for mid in new_ids if mid not in downloaded_ids]
+        new_ids = self.db.filter_new_ids(account, new_ids)
+
+        # Failed downloads from earlier runs: due ones are retried first,
+        # the rest wait out their backoff
+        failed_before = self.db.get_failed_ids(account)
+        pending = set(self.db.filter_new_ids(account, sorted(failed_before)))
+        stale = [mid for mid in failed_before if mid not in pending]
+        if stale:
+            db_write(self.db.clear_download_failures, account, stale)
+        retry_ids = [mid for mid in self.db.get_retry_ids(account) if mid in pending]
+
+        # Large messages queued by an earlier two-phase run
+        queued_ids = self.db.get_backfill_ids(account)
+        backfill_ids = self.db.filter_new_ids(account, queued_ids)
+        pending = set(backfill_ids)
+        stale = [mid for mid in queued_ids if mid not in pending]
+        if stale:
+            db_write(self.db.remove_backfill, account, stale)
+        backfill_set = set(backfill_ids)
+        retry_ids = [mid for mid in retry_ids if mid not in backfill_set]
+        new_ids = [mid for mid in new_ids if mid not in backfill_set and mid not in failed_before]
+
+        if backfill_threshold and new_ids:
+            get_sizes = getattr(provider, "get_message_sizes", None)
+            sizes = get_sizes(new_ids) if callable(get_sizes) else None
+            if isinstance(sizes, dict):
+                large = {
+                    mid: size for mid, size in sizes.items()
+                    if isinstance(size, int) and size > backfill_threshold
+                }
+                if large:
+                    db_write(self.db.queue_backfill, account, large)
+                    new_ids = [mid for mid in new_ids if mid not in large]
+                    backfill_ids += sorted(large, key=large.get)
+                    backfill_set.update(large)
+
+        # Newest first across folders: an interrupted first sync leaves the
+        # most recent months complete and searchable
+        dates = self._get_message_dates(provider, new_ids + backfill_ids)
+        if dates:
+            new_ids = self._newest_first(new_ids, dates)
+            backfill_ids = self._newest_first(backfill_ids, dates)
+        # Priority window (month) per message; progress is committed per window
+        windows = {mid: time.strftime("%Y-%m", time.gmtime(ts)) for mid, ts in dates.items()}
+        current_window = None
+
+        new_ids = retry_ids + new_ids
+        phase_one_count = len(new_ids)
+        new_ids = new_ids + backfill_ids
 
         if not new_ids:
             print("\n✓ No new emails to download. Archive is up to date!")
@@ -130,15 +377,19 @@ class EmailArchive:
             # Date-filtered runs are partial syncs, don't update history_id
             if not since and not until:
                 if new_state:
-                    self.db.set_sync_state(account, sync_key, new_state)
+                    db_write(self.db.set_sync_state, account, sync_key, new_state)
                 elif sync_state is None:
                     # After full sync, get current state
                     current_state = provider.get_current_sync_state()
                     if current_state:
-                        self.db.set_sync_state(account, sync_key, current_state)
+                        db_write(self.db.set_sync_state, account, sync_key, current_state)
             return {"success_count": 0, "error_count": 0, "interrupted": False, "failed_ids": []}
 
         print(f"\nFound {len(new_ids)} new emails to download")
+        if retry_ids:
+            print(f"  Retrying {len(retry_ids)} previously failed emails first")
+        if backfill_ids:
+            print(f"  {len(backfill_ids)} large emails will be backfilled after the rest")
         print("(Press Ctrl-C to stop - progress is saved, you can resume anytime)\n")
 
         success_count = 0
@@ -157,12 +408,34 @@ class EmailArchive:
             interrupted = True
             print("\n\n⏸ Stopping after current email... (Ctrl-C again to force quit)")
 
-        original_handler = signal.signal(signal.SIGINT, signal_handler)
+        if writer is None:
+            original_handler = signal.signal(signal.SIGINT, signal_handler)
 
-        # Use shared connection for batching
-        self._batch_conn = sqlite3.connect(self.db.db_path)
-        self._batch_conn.execute("PRAGMA journal_mode = WAL")
-        self._batch_conn.execute("PRAGMA synchronous = NORMAL")
+            # Use shared connection for batching
+            self._batch_conn = sqlite3.connect(self.db.db_path)
+            self._batch_conn.execute("PRAGMA journal_mode = WAL")
+            self._batch_conn.execute("PRAGMA synchronous = NORMAL")
+        else:
+            self._batch_conn = writer.conn
+
+        def run_store(fn, *args):
+            """Run a DB write step inline, or on the shared writer thread."""
+            if writer is None:
+                return fn(*args)
+            return writer.run(fn, *args, write_behind=write_behind)
+
+        def progress(text: str) -> None:
+            if writer is None:
+                print(f"\r\033[K  {text}", end="", flush=True)
+            else:
+                writer.report(provider.source_name, text)
+
+        def notice(text: str) -> None:
+            """Print a message without breaking the progress display."""
+            if writer is None:
+                print(f"\n  {text}")
+            else:
+                writer.log(f"  [{provider.source_name}] {text}")
 
         last_rate = 0.0
         last_eta_str = "..."
@@ -175,33 +448,217 @@ class EmailArchive:
             batch_size = 1
         has_batch = batch_size > 1 and hasattr(provider, 'download_messages_batch')
 
-        # Track failed message IDs for reporting
+        # Batch size adapts to the server between 1 and the provider's cap
+        max_batch_size = getattr(provider, "max_download_batch_size", None)
+        if not isinstance(max_batch_size, int) or max_batch_size < batch_size:
+            max_batch_size = batch_size
+        controller = AdaptiveBatchSize(batch_size, max_batch_size)
+
+        # Let providers stream large messages to temp files next to the archive
+        if hasattr(provider, "spool_dir"):
+            provider.spool_dir = emails_dir
+
+        # Plan each phase separately so no batch mixes small and large emails
+        batches = deque(
+            self._plan_batches(provider, new_ids[:phase_one_count], batch_size, has_batch)
+            + self._plan_batches(provider, backfill_ids, batch_size, has_batch)
+        )
+
+        # Track failed message IDs for reporting and the retry queue
         failed_ids: list[str] = []
+        failure_errors: Dict[str, str] = {}
+
+        def download_done(msg_id: str) -> None:
+            if msg_id in backfill_set:
+                self.db.remove_backfill(account, [msg_id], conn=self._batch_conn)
+            if msg_id in failed_before:
+                self.db.clear_download_failures(account, [msg_id], conn=self._batch_conn)
+
+        # Email files are fsynced in groups, always before the rows that
+        # point at them are committed
+        write_behind = storage.WriteBehind()
+
+        def commit() -> None:
+            write_behind.flush()
+            self._batch_conn.commit()
+
+        def store_batch(batch_ids: List[str], batch_results: Dict) -> None:
+            """Save, index and record one downloaded batch (the DB write side)."""
+            nonlocal success_count, error_count, last_commit_count
+            nonlocal last_rate, last_eta_str, current_window
+            # Process batch results
+            for j, msg_id in enumerate(batch_ids):
+                if interrupted:
+                    break
+
+                if windows and windows.get(msg_id) != current_window:
+                    commit()
+                    current_window = windows.get(msg_id)
+
+                current_idx = i + j + 1
+                result = batch_results.get(msg_id)
+
+                if result is None or result[0] is None:
+                    error_msg = result[2] if result else "Unknown error"
+                    # Treat 404 (message deleted/trashed) as a soft skip
+                    if "404" in str(error_msg) and "not found" in str(error_msg).lower():
+                        download_done(msg_id)
+                        progress(f"[{current_idx}/{len(new_ids)}] skipped {msg_id} (deleted from server)")
+                        continue
+                    notice(f"Error downloading {msg_id}: {error_msg}")
+                    if msg_id not in failed_ids:
+                        failed_ids.append(msg_id)
+                    failure_errors[msg_id] = error_msg
+                    error_count += 1
+                    continue
+
+                raw_data, labels, _ = result
+
+                # Content-based dedup: skip if we already have this exact email
+                # (handles provider_id format changes across scan methods)
+                if isinstance(raw_data, Path):
+                    content_hash = self._hash_file(raw_data)
+                else:
+                    content_hash = hashlib.sha256(raw_data).hexdigest()
+                if self.db.has_content_hash(account, content_hash, conn=self._batch_conn):
+                    if isinstance(raw_data, Path):
+                        raw_data.unlink()
+                    download_done(msg_id)
+                    # Keep labels from the new location (e.g. IMAP folder move)
+                    if labels:
+                        self.db.add_labels_by_content_hash(
+                            account, content_hash, labels, conn=self._batch_conn
+                        )
+                    success_count += 1
+                    i_skipped = i + j + 1
+                    if success_count > 0:
+                        elapsed = time.time() - start_time
+                        last_rate = success_count / elapsed if elapsed > 0 else 0
+                    progress(f"[{i_skipped}/{len(new_ids)}] {last_rate:.1f}/s | skipped (already downloaded)")
+                    continue
+
+                # A spooled message is too big to load: index a bounded read
+                index_content = raw_data
+                if isinstance(raw_data, Path):
+                    index_content = self._read_for_index(
+                        raw_data, get_index_limits(self.config)["max_body_bytes"]
+                    )
+
+                # Save to file
+                filepath, email_date = self._save_email(
+                    raw_data, msg_id, account, emails_dir, compression, layout,
+                    dedup_attachments, write_behind,
+                )
+
+                if filepath:
+                    size_bytes = storage.stored_size(filepath)
+                    size_str = self._format_size(size_bytes)
+
+                    # Compute stable email_id from account + provider_id
+                    email_id = ArchiveDatabase.make_email_id(account, msg_id)
+
+                    # Mark as downloaded first (creates the row in emails table)
+                    self.db.mark_downloaded(
+                        email_id=email_id,
+                        provider_id=msg_id,
+                        filename=str(filepath.relative_to(self.archive_dir)),
+                        content_hash=content_hash,
+                        account=account,
+                        conn=self._batch_conn,
+                        email_date=email_date,
+                    )
+
+                    # Index the email (updates the row with parsed metadata + FTS)
+                    self._index_email(email_id, filepath, index_content, skip_delete=True)
+
+                    # Store labels in email_labels table
+                    if labels:
+                        rowid_row = self._batch_conn.execute(
+                            "SELECT rowid, email_date FROM emails WHERE email_id = ?",
+                            (email_id,)
+                        ).fetchone()
+                        if rowid_row:
+                            for label in labels:
+                                self._batch_conn.execute(
+                                    "INSERT OR IGNORE INTO email_labels (email_rowid, label, email_date) VALUES (?, ?, ?)",
+                                    (rowid_row[0], label, rowid_row[1])
+                                )
+
+                    # Set indexed_hash to mark as indexed
+                    self._batch_conn.execute(
+                        "UPDATE emails SET indexed_hash = ? WHERE email_id = ?",
+                        (content_hash, email_id)
+                    )
+
+                    download_done(msg_id)
+                    success_count += 1
+
+                    # Commit periodically
+                    if success_count - last_commit_count >= COMMIT_INTERVAL:
+                        commit()
+                        last_commit_count = success_count
+
+                    # Update progress stats
+                    elapsed = time.time() - start_time
+                    last_rate = success_count / elapsed if elapsed > 0 else 0
+                    remaining = len(new_ids) - current_idx
+                    eta = remaining / last_rate if last_rate > 0 else 0
+                    last_eta_str = self._format_eta(eta, current_idx)
+
+                    batch_info = f" | {controller.status()}" if has_batch else ""
+                    progress(f"[{current_idx}/{len(new_ids)}] {last_rate:.1f}/s | ETA {last_eta_str:>5} | {size_str:>7}{batch_info}")
+                else:
+                    error_count += 1
+
+            # Drop spooled temp files that were not moved into the archive
+            for result in batch_results.values():
+                if result and isinstance(result[0], Path) and result[0].exists():
+                    result[0].unlink()
 
         try:
             i = 0
-            while i < len(new_ids) and not interrupted:
-                # Get batch of IDs to download
-                batch_ids = new_ids[i:i + batch_size]
+            while batches and not interrupted:
+                if writer is not None and writer.stop_event.is_set():
+                    interrupted = True
+                    break
+                batch_ids = batches.popleft()
+                if has_batch and len(batch_ids) > controller.size:
+                    batches.appendleft(batch_ids[controller.size:])
+                    batch_ids = batch_ids[:controller.size]
+
+                if i == phase_one_count and i > 0:
+                    # Everything small is in: the backfill queue lives in the
+                    # DB, so the sync point can move forward already.
+                    run_store(self._batch_conn.commit)
+                    if not since and not until and error_count == 0:
+                        self._save_sync_state(provider, account, sync_key, new_state, db_write)
+                    notice(f"Backfilling {len(backfill_ids)} large emails...")
 
                 # Show progress
                 if success_count > 0 and last_rate > 0:
-                    print(f"\r\033[K  [{i + 1}/{len(new_ids)}] {last_rate:.1f}/s | ETA {last_eta_str:>5} | downloading batch...", end="", flush=True)
+                    batch_info = controller.status() if has_batch else "downloading batch..."
+                    progress(f"[{i + 1}/{len(new_ids)}] {last_rate:.1f}/s | ETA {last_eta_str:>5} | {batch_info}")
                 else:
-                    print(f"\r\033[K  [{i + 1}/{len(new_ids)}] downloading...", end="", flush=True)
+                    progress(f"[{i + 1}/{len(new_ids)}] downloading...")
 
                 # Download batch with error handling
                 batch_results = {}
+                batch_start = time.time()
                 if has_batch and len(batch_ids) > 1:
                     try:
                         batch_results = provider.download_messages_batch(batch_ids)
                     except Exception as e:
                         # Entire batch failed - mark all IDs as failed and continue
                         error_msg = str(e)
-                        print(f"\n  Batch download failed: {error_msg}")
+                        notice(f"Batch download failed: {error_msg}")
+                        controller.record(
+                            len(batch_ids), time.time() - batch_start, len(batch_ids),
+                            AdaptiveBatchSize.is_throttle_error(error_msg),
+                        )
                         for msg_id in batch_ids:
                             batch_results[msg_id] = (None, [], error_msg)
                             failed_ids.append(msg_id)
+                            failure_errors[msg_id] = error_msg
                         error_count += len(batch_ids)
                         i += len(batch_ids)
                         continue
@@ -214,112 +671,34 @@ class EmailArchive:
                         except Exception as e:
                             batch_results[msg_id] = (None, [], str(e))
 
-                # Process batch results
-                for j, msg_id in enumerate(batch_ids):
-                    if interrupted:
-                        break
-
-                    current_idx = i + j + 1
-                    result = batch_results.get(msg_id)
-
-                    if result is None or result[0] is None:
-                        error_msg = result[2] if result else "Unknown error"
-                        # Treat 404 (message deleted/trashed) as a soft skip
-                        if "404" in str(error_msg) and "not found" in str(error_msg).lower():
-                            print(f"\r\033[K  [{current_idx}/{len(new_ids)}] skipped {msg_id} (deleted from server)", end="", flush=True)
-                            continue
-                        print(f"\n  Error downloading {msg_id}: {error_msg}")
-                        if msg_id not in failed_ids:
-                            failed_ids.append(msg_id)
-                        error_count += 1
-                        continue
-
-                    raw_data, labels, _ = result
-
-                    # Content-based dedup: skip if we already have this exact email
-                    # (handles provider_id format changes across scan methods)
-                    content_hash = hashlib.sha256(raw_data).hexdigest()
-                    if content_hash in downloaded_hashes:
-                        success_count += 1
-                        i_skipped = i + j + 1
-                        if success_count > 0:
-                            elapsed = time.time() - start_time
-                            last_rate = success_count / elapsed if elapsed > 0 else 0
-                        print(f"\r\033[K  [{i_skipped}/{len(new_ids)}] {last_rate:.1f}/s | skipped (already downloaded)", end="", flush=True)
-                        continue
-
-                    # Save to file
-                    filepath, email_date = self._save_email(
-                        raw_data, msg_id, account, emails_dir
+                if has_batch:
+                    batch_errors = [
+                        batch_results[mid][2] if batch_results.get(mid) else "Unknown error"
+                        for mid in batch_ids
+                        if not batch_results.get(mid) or batch_results[mid][0] is None
+                    ]
+                    controller.record(
+                        len(batch_ids), time.time() - batch_start, len(batch_errors),
+                        any(AdaptiveBatchSize.is_throttle_error(e) for e in batch_errors),
                     )
 
-                    if filepath:
-                        size_bytes = filepath.stat().st_size
-                        size_str = self._format_size(size_bytes)
-
-                        # Compute stable email_id from account + provider_id
-                        email_id = ArchiveDatabase.make_email_id(account, msg_id)
-
-                        # Mark as downloaded first (creates the row in emails table)
-                        self.db.mark_downloaded(
-                            email_id=email_id,
-                            provider_id=msg_id,
-                            filename=str(filepath.relative_to(self.archive_dir)),
-                            content_hash=content_hash,
-                            account=account,
-                            conn=self._batch_conn,
-                            email_date=email_date,
-                        )
-
-                        # Index the email (updates the row with parsed metadata + FTS)
-                        self._index_email(email_id, filepath, raw_data,
-                                          skip_delete=True)
-
-                        # Store labels in email_labels table
-                        if labels:
-                            rowid_row = self._batch_conn.execute(
-                                "SELECT rowid, email_date FROM emails WHERE email_id = ?",
-                                (email_id,)
-                            ).fetchone()
-                            if rowid_row:
-                                for label in labels:
-                                    self._batch_conn.execute(
-                                        "INSERT OR IGNORE INTO email_labels (email_rowid, label, email_date) VALUES (?, ?, ?)",
-                                        (rowid_row[0], label, rowid_row[1])
-                                    )
-
-                        # Set indexed_hash to mark as indexed
-                        self._batch_conn.execute(
-                            "UPDATE emails SET indexed_hash = ? WHERE email_id = ?",
-                            (content_hash, email_id)
-                        )
-
-                        success_count += 1
-                        downloaded_hashes.add(content_hash)
-
-                        # Commit periodically
-                        if success_count - last_commit_count >= COMMIT_INTERVAL:
-                            self._batch_conn.commit()
-                            last_commit_count = success_count
-
-                        # Update progress stats
-                        elapsed = time.time() - start_time
-                        last_rate = success_count / elapsed if elapsed > 0 else 0
-                        remaining = len(new_ids) - current_idx
-                        eta = remaining / last_rate if last_rate > 0 else 0
-                        last_eta_str = self._format_eta(eta, current_idx)
-
-                        print(f"\r\033[K  [{current_idx}/{len(new_ids)}] {last_rate:.1f}/s | ETA {last_eta_str:>5} | {size_str:>7}", end="", flush=True)
-                    else:
-                        error_count += 1
+                run_store(store_batch, batch_ids, batch_results)
 
                 i += len(batch_ids)
 
         finally:
-            self._batch_conn.commit()
-            self._batch_conn.close()
-            self._batch_conn = None
-            signal.signal(signal.SIGINT, original_handler)
+            if writer is None:
+                self._close_pack_writer(emails_dir)
+                self.db.record_download_failures(account, failure_errors, conn=self._batch_conn)
+                commit()
+                self._batch_conn.close()
+                self._batch_conn = None
+                signal.signal(signal.SIGINT, original_handler)
+            else:
+                writer.run(self._close_pack_writer, emails_dir)
+                writer.run(
+                    self.db.record_download_failures, account, failure_errors, writer.conn
+                )
 
         # Update sync state only when ALL conditions are met:
         # 1. Not interrupted
@@ -327,12 +706,7 @@ class EmailArchive:
         # 3. No errors (all messages downloaded successfully)
         # This ensures history_id marks a complete sync point
         if not interrupted and not since and not until and error_count == 0:
-            if new_state:
-                self.db.set_sync_state(account, sync_key, new_state)
-            else:
-                current_state = provider.get_current_sync_state()
-                if current_state:
-                    self.db.set_sync_state(account, sync_key, current_state)
+            self._save_sync_state(provider, account, sync_key, new_state, db_write)
 
         return {
             "success_count": success_count,
@@ -341,66 +715,290 @@ class EmailArchive:
             "failed_ids": failed_ids,
         }
 
+    @staticmethod
+    def _plan_batches(
+        provider: EmailProvider, msg_ids: List[str], batch_size: int, has_batch: bool
+    ) -> List[List[str]]:
+        """Split message IDs into download batches.
+
+        Providers that know message sizes pack batches by bytes. Other
+        batch providers get one chunk that the adaptive batch size cuts
+        as it goes; everything else gets fixed-size slices.
+        """
+        if not msg_ids:
+            return []
+        plan = getattr(provider, "plan_download_batches", None)
+        if has_batch and callable(plan):
+            planned = plan(msg_ids)
+            if isinstance(planned, list) and sum(len(b) for b in planned) == len(msg_ids):
+                return planned
+        if has_batch:
+            return [msg_ids]
+        return [msg_ids[k:k + batch_size] for k in range(0, len(msg_ids), batch_size)]
+
+    @staticmethod
+    def _get_message_dates(provider: EmailProvider, msg_ids: List[str]) -> Dict[str, float]:
+        """Estimated message dates (epoch seconds) from the provider, if it can tell."""
+        get_dates = getattr(provider, "get_message_dates", None)
+        if not msg_ids or not callable(get_dates):
+            return {}
+        dates = get_dates(msg_ids)
+        if not isinstance(dates, dict):
+            return {}
+        return {mid: ts for mid, ts in dates.items() if isinstance(ts, (int, float))}
+
+    @staticmethod
+    def _newest_first(msg_ids: List[str], dates: Dict[str, float]) -> List[str]:
+        """Order message IDs newest first; undated ones keep their order at the end."""
+        return sorted(msg_ids, key=lambda mid: (mid not in dates, -dates.get(mid, 0)))
+
+    def _save_sync_state(
+        self,
+        provider: EmailProvider,
+        account: str,
+        sync_key: str,
+        new_state: Optional[str],
+        db_write=None,
+    ) -> None:
+        """Store the provider's sync point after a complete download.
+
+        The provider is asked for its current state on the calling thread;
+        only the write goes through db_write (backup()'s writer routing).
+        """
+        state = new_state or provider.get_current_sync_state()
+        if not state:
+            return
+        if db_write is None:
+            self.db.set_sync_state(account, sync_key, state)
+        else:
+            db_write(self.db.set_sync_state, account, sync_key, state)
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """SHA-256 of a file, read in chunks."""
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def _read_header_block(path: Path) -> bytes:
+        """Read the header section of an email file (up to the blank line)."""
+        lines = []
+        with open(path, "rb") as f:
+            for line in f:
+                if line in (b"\r\n", b"\n"):
+                    break
+                lines.append(line)
+        return b"".join(lines)
+
+    @staticmethod
+    def _read_for_index(path: Path, max_body_bytes: Optional[int]) -> bytes:
+        """Read a spooled email for indexing in bounded memory.
+
+        The first max_body_bytes * SPOOL_INDEX_FACTOR bytes are kept
+        whole, enough for the capped body text. Past that only the
+        header blocks of later MIME parts are kept (bodies dropped), so
+        attachment names are still indexed. Without a body cap the
+        whole file is read.
+        """
+        if max_body_bytes is None:
+            return path.read_bytes()
+        prefix_bytes = max_body_bytes * SPOOL_INDEX_FACTOR
+        kept = []
+        size = 0
+        header_bytes = 0
+        in_headers = False
+        with open(path, "rb") as f:
+            while True:
+                line = f.readline(64 * 1024)
+                if not line:
+                    break
+                if size < prefix_bytes:
+                    kept.append(line)
+                    size += len(line)
+                elif header_bytes >= SPOOL_INDEX_HEADER_BYTES:
+                    break
+                elif line.startswith(b"--") or in_headers:
+                    # A boundary line (or the headers after one)
+                    kept.append(line)
+                    header_bytes += len(line)
+                    in_headers = line not in (b"\r\n", b"\n")
+        return b"".join(kept)
+
     def _save_email(
         self,
         raw_data: bytes,
         msg_id: str,
         account: str,
         emails_dir: Path,
+        compression: Optional[str] = None,
+        layout: Optional[str] = None,
+        dedup_attachments: bool = False,
+        write_behind: Optional[storage.WriteBehind] = None,
     ) -> tuple:
         """Save email to filesystem atomically.
 
+        raw_data may also be a Path to a spooled temp file on the same
+        filesystem, which is renamed into place instead of rewritten.
+        With compression="zstd" the email is stored as .eml.zst. With
+        layout="pack" it is appended to the source's pack segment and the
+        returned path is its pack address. With dedup_attachments, large
+        attachments go to the blob store and the email is saved as .emlb.
+
+        With write_behind, fsyncs are deferred to its next flush(), which
+        must happen before the database rows for this email are committed.
+        Without it the email is made durable before returning.
+
         Returns:
             Tuple of (filepath, email_date_iso) or (None, None) on error
         """
+        durable = write_behind or storage.WriteBehind()
         try:
-            # Parse date for directory structure using the same robust
-            # logic as EmailParser (Korean weekday prefixes, numeric months,
-            # Received-header fallback, etc.)
-            email_msg = email.message_from_bytes(raw_data)
-            date_str = email_msg.get("Date", "")
-            if not date_str:
-                date_str = EmailParser._extract_date_from_received(email_msg)
-            date_str = EmailParser._normalize_date(date_str)
-            email_date_iso = None
-
-            try:
-                msg_date = _parsedate_to_datetime(date_str)
-                # Normalize to UTC for consistent sorting across timezones
-                msg_date_utc = msg_date.astimezone(timezone.utc)
-                date_prefix = msg_date_utc.strftime("%Y%m%d_%H%M%S")
-                year_month = msg_date_utc.strftime("%Y/%m")
-                email_date_iso = msg_date_utc.strftime("%Y-%m-%dT%H:%M:%S+00:00")
-            except Exception:
-                date_prefix = "unknown"
-                year_month = "unknown"
-
-            msg_dir = emails_dir / year_month
-            msg_dir.mkdir(parents=True, exist_ok=True)
-
-            # Create filename from date + hash of message ID
-            safe_id = hashlib.sha256(msg_id.encode()).hexdigest()[:12]
-            filename = f"{date_prefix}_{safe_id}.eml"
-            filepath = msg_dir / filename
-
-            # Atomic write
-            fd, temp_path = tempfile.mkstemp(dir=msg_dir, suffix=".tmp")
-            try:
-                os.write(fd, raw_data)
-                os.close(fd)
-                os.rename(temp_path, filepath)
-            except Exception:
-                os.close(fd)
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-                raise
-
+            filepath, email_date_iso = self._write_email(
+                raw_data, msg_id, emails_dir, compression, layout, dedup_attachments, durable
+            )
+            if write_behind is None:
+                durable.flush()
             return filepath, email_date_iso
 
         except Exception as e:
             print(f"\n  Error saving {msg_id}: {e}")
             return None, None
 
+    def _write_email(
+        self,
+        raw_data: Union[bytes, Path],
+        msg_id: str,
+        emails_dir: Path,
+        compression: Optional[str],
+        layout: Optional[str],
+        dedup_attachments: bool,
+        durable: storage.WriteBehind,
+    ) -> tuple:
+        """Write one email into the archive (see _save_email)."""
+        # Parse date for directory structure using the same robust
+        # logic as EmailParser (Korean weekday prefixes, numeric months,
+        # Received-header fallback, etc.)
+        if isinstance(raw_data, Path):
+            email_msg = email.message_from_bytes(self._read_header_block(raw_data))
+        else:
+            email_msg = email.message_from_bytes(raw_data)
+        date_str = email_msg.get("Date", "")
+        if not date_str:
+            date_str = EmailParser._extract_date_from_received(email_msg)
+        date_str = EmailParser._normalize_date(date_str)
+        email_date_iso = None
+
+        try:
+            msg_date = _parsedate_to_datetime(date_str)
+            # Normalize to UTC for consistent sorting across timezones
+            msg_date_utc = msg_date.astimezone(timezone.utc)
+            date_prefix = msg_date_utc.strftime("%Y%m%d_%H%M%S")
+            email_date_iso = msg_date_utc.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        except Exception:
+            date_prefix = "unknown"
+
+        # Create filename from date + hash of message ID
+        safe_id = hashlib.sha256(msg_id.encode()).hexdigest()[:12]
+        base_suffix = ".eml"
+        if dedup_attachments:
+            blob_dir = self.archive_dir / blobs.BLOB_DIR
+            if isinstance(raw_data, Path):
+                # Streamed: a spooled message is never loaded whole
+                stub = blobs.split_attachments_file(raw_data, blob_dir, durable)
+                if stub is not None:
+                    raw_data.unlink()
+            else:
+                stub = blobs.split_attachments(raw_data, blob_dir, durable)
+            if stub is not None:
+                raw_data = stub
+                base_suffix = blobs.DEDUP_SUFFIX
+        filename = f"{date_prefix}_{safe_id}{storage.email_suffix(compression, base_suffix)}"
+
+        if layout == "pack":
+            # Named by its plain-file path, which is where unpack puts it
+            name = f"{storage.email_dir('date', filename)}/{filename}"
+            return self._pack_email(raw_data, name, emails_dir, compression, durable), email_date_iso
+
+        msg_dir = emails_dir / storage.email_dir(layout, filename)
+        durable.ensure_dir(msg_dir)
+        filepath = msg_dir / filename
+
+        if isinstance(raw_data, Path) and not compression:
+            os.replace(raw_data, filepath)
+            durable.add_file(filepath)
+            return filepath, email_date_iso
+
+        # Atomic write
+        fd, temp_path = tempfile.mkstemp(dir=msg_dir, suffix=".tmp")
+        try:
+            if isinstance(raw_data, Path):
+                storage.compress_file(raw_data, fd)
+            elif compression:
+                os.write(fd, storage.compress_bytes(raw_data))
+            else:
+                os.write(fd, raw_data)
+            os.close(fd)
+            os.rename(temp_path, filepath)
+            durable.add_file(filepath)
+            if isinstance(raw_data, Path):
+                raw_data.unlink()
+        except Exception:
+            os.close(fd)
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return filepath, email_date_iso
+
+    def _pack_email(
+        self,
+        raw_data: Union[bytes, Path],
+        name: str,
+        emails_dir: Path,
+        compression: Optional[str],
+        durable: storage.WriteBehind,
+    ) -> Path:
+        """Append an email to the source's pack segment.
+
+        Returns:
+            Pack address of the stored email
+        """
+        pack_writer = self._pack_writers.get(emails_dir)
+        if pack_writer is None:
+            durable.ensure_dir(emails_dir / storage.PACK_DIR)
+            pack_writer = storage.PackWriter(emails_dir / storage.PACK_DIR)
+            self._pack_writers[emails_dir] = pack_writer
+
+        if not compression:
+            address = pack_writer.append(raw_data, name)
+        elif isinstance(raw_data, Path):
+            # Compress the spooled message next to itself, then copy it in
+            fd, temp_path = tempfile.mkstemp(dir=raw_data.parent, suffix=".tmp")
+            try:
+                try:
+                    storage.compress_file(raw_data, fd)
+                finally:
+                    os.close(fd)
+                address = pack_writer.append(Path(temp_path), name)
+            finally:
+                os.unlink(temp_path)
+        else:
+            address = pack_writer.append(storage.compress_bytes(raw_data), name)
+
+        durable.add_pack(pack_writer)
+        if isinstance(raw_data, Path):
+            raw_data.unlink()
+        return address
+
+    def _close_pack_writer(self, emails_dir: Path) -> None:
+        """Close the source's open pack segment, if any."""
+        pack_writer = self._pack_writers.pop(emails_dir, None)
+        if pack_writer is not None:
+            pack_writer.close()
+
     def _index_email(
         self,
         email_id: str,
@@ -421,10 +1019,13 @@ class EmailArchive:
         """
         try:
             # Parse email
+            limits = get_index_limits(self.config)
             if content:
-                parsed = EmailParser.parse_file(content=content)
+                parsed = EmailParser.parse_file(content=content, **limits)
             else:
-                parsed = EmailParser.parse_file(filepath=filepath)
+                parsed = EmailParser.parse_file(filepath=filepath, **limits)
+            if get_index_strip_quotes(self.config):
+                parsed["body"] = strip_quoted_text(parsed["body"])
 
             # Use batch connection if available
             conn = self._batch_conn
@@ -439,6 +1040,7 @@ class EmailArchive:
                 attachments=parsed["attachments"],
                 conn=conn,
                 skip_delete=skip_delete,
+                body_indexed_bytes=parsed["body_indexed_bytes"],
             )
 
             return True
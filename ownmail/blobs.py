@@ -0,0 +1,396 @@
+"""Content-addressed store for large attachments (attachment dedup).
+
+With ``dedup_attachments: true``, large base64 MIME parts are cut out of
+each email and stored once, decoded, under ``attachment-blobs/`` at the
+archive root, keyed by the SHA-256 of their content. The email is saved
+as a ``.emlb`` file: a small manifest of the removed parts followed by the
+rest of the message. A part is only cut out if re-encoding its content
+reproduces the original bytes exactly, so reassembly is byte-exact.
+
+Manifest format (one line per removed part, offsets into the stripped
+message)::
+
+    OWNMAIL-EMLB 1 <count>
+    <offset> <sha256> <line width> <crlf|lf>
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+BLOB_DIR = "attachment-blobs"
+DEDUP_SUFFIX = ".emlb"
+BLOB_MIN_BYTES = 32 * 1024  # Smaller parts are cheaper to keep inline
+
+_MAGIC = b"OWNMAIL-EMLB 1 "
+_BOUNDARY = re.compile(rb'boundary\s*=\s*"?([^";\r\n]+)"?', re.IGNORECASE)
+_BASE64_CTE = re.compile(rb"^content-transfer-encoding:\s*base64\s*$", re.IGNORECASE | re.MULTILINE)
+_EOLS = {b"\r\n": b"crlf", b"\n": b"lf"}
+_LINE_LIMIT = 64 * 1024  # Longer lines are read in pieces
+_RUN_MEMORY_BYTES = 1024 * 1024  # Kept in memory before spilling to a temp file
+_BLOB_DIR_CACHE_SIZE = 256
+
+_blob_dirs: Dict[Path, Path] = {}
+
+
+def blob_path(blob_dir: Path, digest: str) -> Path:
+    """Location of a blob in the store."""
+    return blob_dir / digest[:2] / digest
+
+
+def _encode(data: bytes, width: int, eol: bytes) -> bytes:
+    """Base64-encode data as lines of the given width."""
+    encoded = base64.b64encode(data)
+    return eol.join(encoded[i:i + width] for i in range(0, len(encoded), width))
+
+
+def _split_eol(line: bytes) -> Tuple[bytes, bytes]:
+    """Split a line into its content and its line ending."""
+    if line.endswith(b"\r\n"):
+        return line[:-2], b"\r\n"
+    if line.endswith(b"\n"):
+        return line[:-1], b"\n"
+    return line, b""
+
+
+class _Base64Run:
+    """A base64 part body being cut out of a message as it streams past.
+
+    Lines are checked as they arrive: all of the run's width and line
+    ending, bar a shorter last one, and canonical base64 throughout, so
+    that _encode() reproduces the run byte-exactly. Decoded data goes to
+    a temp file in the blob store once it outgrows _RUN_MEMORY_BYTES; the
+    original lines are kept in a spooled file to write back if the run
+    does not qualify.
+    """
+
+    def __init__(self, blob_dir: Path, write_behind, first_line: bytes):
+        content, self.eol = _split_eol(first_line)
+        self.width = len(content)
+        self.ok = self.width > 0 and self.eol in _EOLS
+        self.last_eol = b""
+        self.raw = tempfile.SpooledTemporaryFile(max_size=_RUN_MEMORY_BYTES)
+        self.raw_len = 0
+        self._blob_dir = blob_dir
+        self._write_behind = write_behind
+        self._digest = hashlib.sha256()
+        self._decoded = bytearray()
+        self._temp_fd = None
+        self._temp_path = None
+        self._pending = b""  # Base64 characters not decoded yet (< 4)
+        self._short = False  # A short line was seen: it must be the last
+        self._padded = False
+        self.add(first_line)
+
+    def add(self, line: bytes) -> None:
+        self.raw.write(line)
+        self.raw_len += len(line)
+        if not self.ok:
+            return
+        content, eol = _split_eol(line)
+        if self._short or self._padded or eol not in (self.eol, b"") or len(content) > self.width:
+            self.ok = False
+            return
+        self.last_eol = eol
+        if len(content) < self.width or not eol:
+            self._short = True
+        chars = self._pending + content
+        cut = len(chars) - len(chars) % 4
+        block, self._pending = chars[:cut], chars[cut:]
+        try:
+            data = binascii.a2b_base64(block)
+        except binascii.Error:
+            self.ok = False
+            return
+        if base64.b64encode(data) != block:
+            self.ok = False
+            return
+        self._padded = block.endswith(b"=")
+        self._digest.update(data)
+        self._decoded += data
+        if len(self._decoded) > _RUN_MEMORY_BYTES:
+            if self._temp_fd is None:
+                self._blob_dir.mkdir(parents=True, exist_ok=True)
+                self._temp_fd, self._temp_path = tempfile.mkstemp(dir=self._blob_dir, suffix=".tmp")
+            os.write(self._temp_fd, self._decoded)
+            self._decoded = bytearray()
+
+    def finish(self) -> Optional[str]:
+        """Store the blob if the run qualifies; return its digest, else None."""
+        region_len = self.raw_len - len(self.last_eol)
+        if not self.ok or self._pending or region_len < BLOB_MIN_BYTES:
+            self.discard()
+            return None
+        digest = self._digest.hexdigest()
+        if self._temp_fd is None:
+            _write_blob(self._blob_dir, digest, bytes(self._decoded), self._write_behind)
+            return digest
+        os.write(self._temp_fd, self._decoded)
+        os.fsync(self._temp_fd)
+        os.close(self._temp_fd)
+        self._temp_fd = None
+        _install_blob(self._blob_dir, digest, Path(self._temp_path), self._write_behind)
+        return digest
+
+    def discard(self) -> None:
+        """Drop the decoded data (the original lines stay in self.raw)."""
+        if self._temp_fd is not None:
+            os.close(self._temp_fd)
+            self._temp_fd = None
+            os.unlink(self._temp_path)
+
+
+def _split_stream(src: BinaryIO, out: BinaryIO, blob_dir: Path, write_behind) -> bool:
+    """Write the .emlb form of the message read from src to out.
+
+    The message is read line by line, so memory use does not grow with
+    its size. Returns False (with nothing written) if no part qualified.
+    """
+    entries = []
+    boundaries = set()
+    delimiter = None
+    headers = None  # Header lines of the current MIME part, once past a delimiter
+    body_next = False  # The previous line ended the headers of a base64 part
+    run = None
+    written = 0
+
+    with tempfile.SpooledTemporaryFile(max_size=_RUN_MEMORY_BYTES) as stripped:
+        try:
+            while True:
+                line = src.readline(_LINE_LIMIT)
+                is_delimiter = (
+                    delimiter is not None and line.startswith(b"--")
+                    and delimiter.match(line.rstrip(b"\r\n")) is not None
+                )
+                if run is not None:
+                    if line.strip() and not is_delimiter:
+                        run.add(line)
+                        continue
+                    # A blank line, the next delimiter or EOF ends the run
+                    digest = run.finish()
+                    if digest is not None:
+                        entries.append(b"%d %s %d %s" % (written, digest.encode(), run.width, _EOLS[run.eol]))
+                        stripped.write(run.last_eol)
+                        written += len(run.last_eol)
+                    else:
+                        run.raw.seek(0)
+                        shutil.copyfileobj(run.raw, stripped)
+                        written += run.raw_len
+                    run.raw.close()
+                    run = None
+                if not line:
+                    break
+                if body_next:
+                    body_next = False
+                    if line.strip() and not is_delimiter:
+                        run = _Base64Run(blob_dir, write_behind, line)
+                        continue
+
+                stripped.write(line)
+                written += len(line)
+                if is_delimiter:
+                    headers = bytearray()
+                    continue
+                found = {m.group(1).strip() for m in _BOUNDARY.finditer(line)} - boundaries
+                if found:
+                    boundaries |= found
+                    delimiter = re.compile(
+                        rb"--(?:" + b"|".join(re.escape(b) for b in boundaries) + rb")(?:--)?[ \t]*\r?"
+                    )
+                if headers is not None:
+                    if line in (b"\r\n", b"\n"):
+                        body_next = _BASE64_CTE.search(bytes(headers)) is not None
+                        headers = None
+                    elif len(headers) < _LINE_LIMIT:
+                        headers += line
+        finally:
+            if run is not None:
+                run.discard()
+                run.raw.close()
+
+        if not entries:
+            return False
+        out.write(_MAGIC + b"%d\n" % len(entries) + b"".join(e + b"\n" for e in entries))
+        stripped.seek(0)
+        shutil.copyfileobj(stripped, out)
+    return True
+
+
+def split_attachments(raw: bytes, blob_dir: Path, write_behind=None) -> Optional[bytes]:
+    """Move large base64 parts of an email into the blob store.
+
+    Args:
+        raw: Original email bytes
+        blob_dir: Blob store directory
+        write_behind: Optional storage.WriteBehind that new blob
+            directory entries are registered with (their directory fsync
+            is then left to its flush)
+
+    Returns:
+        The .emlb content (manifest + stripped message), or None if no
+        part could be split off byte-exactly
+    """
+    out = io.BytesIO()
+    if not _split_stream(io.BytesIO(raw), out, blob_dir, write_behind):
+        return None
+    return out.getvalue()
+
+
+def split_attachments_file(path: Path, blob_dir: Path, write_behind=None) -> Optional[Path]:
+    """Like split_attachments(), for a message spooled to a file.
+
+    The file is streamed, so large messages are never held in memory.
+
+    Returns:
+        Path of a temp file next to path holding the .emlb content, or
+        None if no part could be split off byte-exactly
+    """
+    fd, stub_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as out:
+            found = _split_stream(src, out, blob_dir, write_behind)
+    except BaseException:
+        os.unlink(stub_path)
+        raise
+    if not found:
+        os.unlink(stub_path)
+        return None
+    return Path(stub_path)
+
+
+def _write_blob(blob_dir: Path, digest: str, data: bytes, write_behind=None) -> None:
+    """Store a blob unless it is already there (content-addressed).
+
+    Later emails reuse a blob by its name alone, so the data is always
+    fsynced before the rename: a crash can leave a temp file behind, but
+    never a torn blob under its digest. A blob of the wrong size (torn
+    by an older version) is rewritten.
+    """
+    path = blob_path(blob_dir, digest)
+    if _has_blob(path, len(data)):
+        return
+    if write_behind is not None:
+        write_behind.ensure_dir(path.parent)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    if write_behind is not None:
+        write_behind.add_dir(path.parent)
+
+
+def _install_blob(blob_dir: Path, digest: str, temp_path: Path, write_behind=None) -> None:
+    """Move an fsynced temp file into the store as a blob (see _write_blob)."""
+    path = blob_path(blob_dir, digest)
+    try:
+        if _has_blob(path, temp_path.stat().st_size):
+            temp_path.unlink()
+            return
+        if write_behind is not None:
+            write_behind.ensure_dir(path.parent)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, path)
+    except Exception:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+    if write_behind is not None:
+        write_behind.add_dir(path.parent)
+
+
+def _has_blob(path: Path, size: int) -> bool:
+    """Check that a blob is stored with the expected size."""
+    try:
+        return path.stat().st_size == size
+    except FileNotFoundError:
+        return False
+
+
+def manifest_digests(content: bytes) -> List[str]:
+    """Digests of the blobs an .emlb file refers to."""
+    header_end = content.index(b"\n")
+    count = int(content[len(_MAGIC):header_end])
+    lines = content[header_end + 1:].split(b"\n", count)
+    return [entry.split(b" ")[1].decode() for entry in lines[:count]]
+
+
+def list_blobs(blob_dir: Path) -> Dict[str, Path]:
+    """All files in the blob store, by name (their digest, for intact blobs)."""
+    return {
+        path.name: path
+        for path in sorted(blob_dir.glob("*/*"))
+        if path.is_file()
+    }
+
+
+def blob_is_intact(path: Path, chunk_size: int = 1024 * 1024) -> bool:
+    """Check that a blob's SHA-256 matches its name."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest() == path.name
+
+
+def find_blob_dir(directory: Path) -> Optional[Path]:
+    """Find the blob store serving emails in this directory.
+
+    The store lives at the archive root, so it is the nearest
+    attachment-blobs/ directory above the email. Only found stores are
+    cached: one may be created later in a long-running process.
+    """
+    found = _blob_dirs.get(directory)
+    if found is not None:
+        return found
+    for parent in (directory, *directory.parents):
+        candidate = parent / BLOB_DIR
+        if candidate.is_dir():
+            if len(_blob_dirs) >= _BLOB_DIR_CACHE_SIZE:
+                _blob_dirs.clear()
+            _blob_dirs[directory] = candidate
+            return candidate
+    return None
+
+
+def reassemble(content: bytes, path: Path) -> bytes:
+    """Rebuild the original email bytes from .emlb content."""
+    header_end = content.index(b"\n")
+    count = int(content[len(_MAGIC):header_end])
+    lines = content[header_end + 1:].split(b"\n", count)
+    body = lines[count]
+
+    blob_dir = find_blob_dir(Path(path).parent)
+    if blob_dir is None:
+        raise FileNotFoundError(f"No {BLOB_DIR}/ directory found for {path}")
+
+    pieces = []
+    pos = 0
+    for entry in lines[:count]:
+        offset, digest, width, eol = entry.split(b" ")
+        offset = int(offset)
+        data = blob_path(blob_dir, digest.decode()).read_bytes()
+        pieces.append(body[pos:offset])
+        pieces.append(_encode(data, int(width), b"\r\n" if eol == b"crlf" else b"\n"))
+        pos = offset
+    pieces.append(body[pos:])
+    return b"".join(pieces)
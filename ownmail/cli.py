@@ -1,12 +1,15 @@
 """Command-line interface for ownmail."""
 
 import argparse
+import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
 from pathlib import Path
 from typing import Optional
 
 from ownmail import __version__
-from ownmail.archive import EmailArchive
+from ownmail.archive import ArchiveWriter, EmailArchive
 from ownmail.config import (
     get_archive_root,
     get_source_by_name,
@@ -15,6 +18,7 @@ from ownmail.config import (
     parse_secret_ref,
     validate_config,
 )
+from ownmail.database import MAX_DOWNLOAD_ATTEMPTS
 from ownmail.keychain import KeychainStorage
 from ownmail.providers.gmail import GmailProvider
 
@@ -22,6 +26,10 @@ from ownmail.providers.gmail import GmailProvider
 SCRIPT_DIR = Path(__file__).parent.absolute()
 DEFAULT_ARCHIVE_DIR = SCRIPT_DIR.parent / "archive"
 
+# Watch mode (download --watch)
+WATCH_TIMEOUT = 25 * 60  # Longest wait for changes before a safety re-sync
+WATCH_RETRY_DELAY = 60  # Seconds to wait before reconnecting after an error
+
 # Template for new config.yaml with commented options
 _CONFIG_TEMPLATE = """\
 # ownmail configuration
@@ -376,6 +384,8 @@ def cmd_download(
     since: Optional[str] = None,
     until: Optional[str] = None,
     verbose: bool = False,
+    parallel: bool = False,
+    watch: bool = False,
 ) -> None:
     """Run download for one or all sources.
 
@@ -386,6 +396,8 @@ def cmd_download(
         since: Only download emails after this date (YYYY-MM-DD)
         until: Only download emails before this date (YYYY-MM-DD)
         verbose: Show detailed progress output
+        parallel: Download all sources at the same time
+        watch: Keep running and download new emails as they arrive
     """
     print("\n" + "=" * 50)
     print("ownmail - Download")
@@ -408,132 +420,324 @@ def cmd_download(
             sys.exit(1)
         sources = [source]
 
+    if watch:
+        _watch_sources(archive, sources, keychain, verbose)
+        return
+
+    if parallel and len(sources) > 1:
+        _download_sources_parallel(archive, sources, keychain, since, until, verbose)
+        return
 
     for source in sources:
-        name = source["name"]
-        source_type = source["type"]
-        account = source["account"]
+        summary = _download_source(archive, source, keychain, since, until, verbose)
+        if summary:
+            _print_download_summary(summary)
+
+
+def _download_sources_parallel(
+    archive: EmailArchive,
+    sources: list,
+    keychain: KeychainStorage,
+    since: Optional[str],
+    until: Optional[str],
+    verbose: bool,
+) -> None:
+    """Download several sources at once, one worker thread per source.
+
+    All database writes go through one shared ArchiveWriter, so the run
+    takes about as long as the slowest source. Summaries are printed
+    once every source has finished.
+    """
+    print(f"Downloading {len(sources)} sources in parallel\n", flush=True)
+    summaries = _run_sources_with_writer(
+        archive, sources,
+        lambda source, writer: _download_source(
+            archive, source, keychain, since, until, verbose, writer
+        ),
+        "⏸ Stopping after current batches...",
+    )
+
+    print()
+    for summary in summaries:
+        if summary:
+            _print_download_summary(summary)
 
-        print(f"Source: {name} ({account})")
 
-        if source_type == "gmail_api":
-            # Parse auth
-            auth = source.get("auth", {})
-            secret_ref = auth.get("secret_ref", "")
+def _run_sources_with_writer(archive: EmailArchive, sources: list, fn, stop_message: str) -> list:
+    """Run fn(source, writer) for every source in its own thread.
 
-            if not secret_ref:
-                print(f"❌ Error: Source '{name}' missing auth.secret_ref")
-                continue
+    All database writes go through one shared ArchiveWriter. The first
+    Ctrl-C sets the writer's stop event so workers finish cleanly; a
+    second one raises KeyboardInterrupt, which still closes the writer.
 
+    Returns:
+        Results of fn, one per source (failed sources are left out)
+    """
+    writer = ArchiveWriter(archive)
+
+    def signal_handler(signum, frame):
+        if writer.stop_event.is_set():
+            writer.log("\nForce quit.")
+            raise KeyboardInterrupt
+        writer.stop_event.set()
+        writer.log(f"\n{stop_message} (Ctrl-C again to force quit)")
+
+    original_handler = signal.signal(signal.SIGINT, signal_handler)
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="ownmail-source")
+    results = []
+    finished = False
+    try:
+        futures = [executor.submit(fn, source, writer) for source in sources]
+        for source, future in zip(sources, futures):
             try:
-                parse_secret_ref(secret_ref)  # Validate format
-            except ValueError as e:
-                print(f"❌ Error: {e}")
-                continue
-
-            # Create provider
-            if verbose:
-                print("[verbose] Creating Gmail provider...", flush=True)
-            provider = GmailProvider(
-                account=account,
-                keychain=keychain,
-                include_labels=source.get("include_labels", True),
-                source_name=name,
-            )
+                results.append(future.result())
+            except Exception as e:
+                writer.log(f"❌ Error: Source '{source['name']}' failed: {e}")
+        finished = True
+    finally:
+        signal.signal(signal.SIGINT, original_handler)
+        # On force quit, don't wait for workers still blocked on the network;
+        # their next write fails once the writer is closed.
+        executor.shutdown(wait=finished)
+        writer.close()
+    return results
+
+
+def _watch_sources(
+    archive: EmailArchive,
+    sources: list,
+    keychain: KeychainStorage,
+    verbose: bool,
+) -> None:
+    """Keep every source up to date until interrupted (download --watch).
 
-            # Authenticate
-            if verbose:
-                print("[verbose] Authenticating...", flush=True)
-            provider.authenticate()
-
-            # Get email count (fast query)
-            if verbose:
-                print("[verbose] Getting email count...", flush=True)
-            email_count = archive.db.get_email_count(account)
-            print(f"Archive location: {archive.archive_dir}", flush=True)
-            print(f"Previously downloaded: {email_count:,} emails", flush=True)
-
-            # Show date filter if specified
-            if since or until:
-                date_range = []
-                if since:
-                    date_range.append(f"from {since}")
-                if until:
-                    date_range.append(f"until {until}")
-                print(f"Date filter: {' '.join(date_range)}", flush=True)
-
-            # Run download
-            if verbose:
-                print("[verbose] Starting download...", flush=True)
-            result = archive.backup(provider, since=since, until=until, verbose=verbose)
-
-            # Print summary
-            total = email_count + result["success_count"]
-            print("\n" + "-" * 50)
-            if result["interrupted"]:
-                print("Download Paused!")
-                print(f"  Downloaded: {result['success_count']} emails")
-                print("\n  Run 'download' again to resume.")
-            else:
-                print("Download Complete!")
-                print(f"  Downloaded: {result['success_count']} emails")
-            if result["error_count"] > 0:
-                print(f"  Errors: {result['error_count']}")
-            print(f"  Total archived: {total:,} emails")
-            print("-" * 50 + "\n")
-
-        elif source_type == "imap":
-            from ownmail.providers.imap import ImapProvider
-
-            host = source.get("host", "imap.gmail.com")
-            port = source.get("port", 993)
-            exclude_folders = source.get("exclude_folders")
-
-            provider = ImapProvider(
-                account=account,
-                keychain=keychain,
-                host=host,
-                port=port,
-                exclude_folders=exclude_folders,
-                source_name=name,
+    Each source runs an incremental backup, then blocks in the provider's
+    wait_for_changes() (IMAP IDLE or Gmail history polling) and backs up
+    again as soon as the server reports new mail.
+    """
+    names = ", ".join(source["name"] for source in sources)
+    print(f"Watching {names} for new emails (Ctrl-C to stop)\n", flush=True)
+    _run_sources_with_writer(
+        archive, sources,
+        lambda source, writer: _watch_source(archive, source, keychain, verbose, writer),
+        "⏸ Stopping watch...",
+    )
+
+
+def _watch_source(
+    archive: EmailArchive,
+    source: dict,
+    keychain: KeychainStorage,
+    verbose: bool,
+    writer,
+) -> None:
+    """Back up one source whenever its server reports changes.
+
+    Connection errors are reported and retried after WATCH_RETRY_DELAY
+    with a freshly authenticated provider.
+    """
+    name = source["name"]
+    stop_event = writer.stop_event
+    provider = None
+    while not stop_event.is_set():
+        try:
+            if provider is None:
+                provider = _create_provider(source, keychain, verbose)
+                if provider is None:
+                    return
+            result = archive.backup(
+                provider, verbose=verbose,
+                backfill_threshold=source.get("backfill_threshold"),
+                writer=writer,
+                compression=source.get("compression"),
+                layout=source.get("layout"),
+                dedup_attachments=source.get("dedup_attachments", False),
             )
+            if result["success_count"]:
+                writer.log(f"[{name}] Downloaded {result['success_count']} new emails")
+            if stop_event.is_set():
+                break
+            provider.wait_for_changes(WATCH_TIMEOUT, stop_event)
+        except Exception as e:
+            writer.log(f"[{name}] ❌ Error: {e} (retrying in {WATCH_RETRY_DELAY}s)")
+            _close_provider(provider)
+            provider = None
+            stop_event.wait(WATCH_RETRY_DELAY)
+    _close_provider(provider)
+
+
+def _download_source(
+    archive: EmailArchive,
+    source: dict,
+    keychain: KeychainStorage,
+    since: Optional[str],
+    until: Optional[str],
+    verbose: bool,
+    writer=None,
+) -> Optional[dict]:
+    """Authenticate and back up one source.
+
+    Returns:
+        Summary dict for _print_download_summary(), or None if the
+        source was skipped
+    """
+    name = source["name"]
+    account = source["account"]
+
+    provider = _create_provider(source, keychain, verbose)
+    if provider is None:
+        return None
 
-            provider.authenticate()
+    try:
+        # Get email count (fast query)
+        if verbose:
+            print("[verbose] Getting email count...", flush=True)
+        email_count = archive.db.get_email_count(account)
+        print(f"Archive location: {archive.archive_dir}", flush=True)
+        print(f"Previously downloaded: {email_count:,} emails", flush=True)
+
+        # Show date filter if specified
+        if since or until:
+            date_range = []
+            if since:
+                date_range.append(f"from {since}")
+            if until:
+                date_range.append(f"until {until}")
+            print(f"Date filter: {' '.join(date_range)}", flush=True)
+
+        # Run download
+        if verbose:
+            print("[verbose] Starting download...", flush=True)
+        result = archive.backup(
+            provider, since=since, until=until, verbose=verbose,
+            backfill_threshold=source.get("backfill_threshold"),
+            writer=writer,
+            compression=source.get("compression"),
+            layout=source.get("layout"),
+            dedup_attachments=source.get("dedup_attachments", False),
+        )
 
-            email_count = archive.db.get_email_count(account)
-            print(f"Archive location: {archive.archive_dir}", flush=True)
-            print(f"Previously downloaded: {email_count:,} emails", flush=True)
+        get_stats = getattr(provider, "get_transfer_stats", None)
+        return {
+            "name": name,
+            "result": result,
+            "email_count": email_count,
+            "transfer_stats": get_stats() if callable(get_stats) else None,
+            "gave_up": len(archive.db.get_exhausted_failures(account)),
+        }
+    finally:
+        _close_provider(provider)
 
-            if since or until:
-                date_range = []
-                if since:
-                    date_range.append(f"from {since}")
-                if until:
-                    date_range.append(f"until {until}")
-                print(f"Date filter: {' '.join(date_range)}", flush=True)
 
-            result = archive.backup(provider, since=since, until=until, verbose=verbose)
+def _create_provider(source: dict, keychain: KeychainStorage, verbose: bool):
+    """Create and authenticate the provider for a source.
 
-            total = email_count + result["success_count"]
-            print("\n" + "-" * 50)
-            if result["interrupted"]:
-                print("Download Paused!")
-                print(f"  Downloaded: {result['success_count']} emails")
-                print("\n  Run 'download' again to resume.")
-            else:
-                print("Download Complete!")
-                print(f"  Downloaded: {result['success_count']} emails")
-            if result["error_count"] > 0:
-                print(f"  Errors: {result['error_count']}")
-            print(f"  Total archived: {total:,} emails")
-            print("-" * 50 + "\n")
+    Returns:
+        Authenticated provider, or None if the source is misconfigured
+    """
+    name = source["name"]
+    source_type = source["type"]
+    account = source["account"]
 
-            # Close IMAP connection
-            provider.close()
+    print(f"Source: {name} ({account})")
 
-        else:
-            print(f"  Unknown source type: {source_type}")
-            continue
+    if source_type == "gmail_api":
+        # Parse auth
+        auth = source.get("auth", {})
+        secret_ref = auth.get("secret_ref", "")
+
+        if not secret_ref:
+            print(f"❌ Error: Source '{name}' missing auth.secret_ref")
+            return None
+
+        try:
+            parse_secret_ref(secret_ref)  # Validate format
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            return None
+
+        # Create provider
+        if verbose:
+            print("[verbose] Creating Gmail provider...", flush=True)
+        provider = GmailProvider(
+            account=account,
+            keychain=keychain,
+            include_labels=source.get("include_labels", True),
+            source_name=name,
+        )
+
+        # Authenticate
+        if verbose:
+            print("[verbose] Authenticating...", flush=True)
+        provider.authenticate()
+
+    elif source_type == "imap":
+        from ownmail.providers.imap import (
+            FETCH_BODY_BATCH_BYTES,
+            STREAM_THRESHOLD_BYTES,
+            ImapProvider,
+        )
+
+        host = source.get("host", "imap.gmail.com")
+        port = source.get("port", 993)
+        exclude_folders = source.get("exclude_folders")
+
+        provider = ImapProvider(
+            account=account,
+            keychain=keychain,
+            host=host,
+            port=port,
+            exclude_folders=exclude_folders,
+            source_name=name,
+            compress=source.get("compress", True),
+            batch_bytes=source.get("batch_bytes", FETCH_BODY_BATCH_BYTES),
+            stream_threshold=source.get("stream_threshold", STREAM_THRESHOLD_BYTES),
+        )
+
+        provider.authenticate()
+
+    else:
+        print(f"  Unknown source type: {source_type}")
+        return None
+
+    return provider
+
+
+def _close_provider(provider) -> None:
+    """Close a provider's connection, if it keeps one open."""
+    close = getattr(provider, "close", None)
+    if callable(close):
+        close()
+
+
+def _print_download_summary(summary: dict) -> None:
+    """Print the end-of-download summary for one source."""
+    result = summary["result"]
+    total = summary["email_count"] + result["success_count"]
+    print("\n" + "-" * 50)
+    if result["interrupted"]:
+        print("Download Paused!")
+        print(f"  Downloaded: {result['success_count']} emails")
+        print("\n  Run 'download' again to resume.")
+    else:
+        print("Download Complete!")
+        print(f"  Downloaded: {result['success_count']} emails")
+    if result["error_count"] > 0:
+        print(f"  Errors: {result['error_count']} (queued for retry on the next run)")
+    if summary.get("gave_up"):
+        print(
+            f"  Gave up on: {summary['gave_up']} emails after {MAX_DOWNLOAD_ATTEMPTS} attempts "
+            "(run 'failed' to list them, 'failed --retry' to try again)"
+        )
+    print(f"  Total archived: {total:,} emails")
+    stats = summary["transfer_stats"]
+    if isinstance(stats, dict) and stats["bytes_in"]:
+        saved = 100 * (1 - stats["wire_bytes_in"] / stats["bytes_in"])
+        print(
+            f"  Transferred: {EmailArchive._format_size(stats['wire_bytes_in'])} "
+            f"({EmailArchive._format_size(stats['bytes_in'])} uncompressed, {saved:.0f}% saved)"
+        )
+    print("-" * 50 + "\n")
 
 
 def cmd_search(archive: EmailArchive, query: str, limit: int = 50) -> None:
@@ -641,6 +845,61 @@ def cmd_reset_sync(
     print("Already downloaded emails will be skipped.")
 
 
+def cmd_failed(
+    archive: EmailArchive,
+    config: dict,
+    source_name: Optional[str] = None,
+    retry: bool = False,
+) -> None:
+    """List downloads that were given up on, or queue them for another try.
+
+    Args:
+        archive: EmailArchive instance
+        config: Configuration dictionary
+        source_name: Specific source to check (None = all)
+        retry: Put the messages back in the retry queue
+    """
+    print("\n" + "=" * 50)
+    print("ownmail - Failed Downloads")
+    print("=" * 50 + "\n")
+
+    sources = get_sources(config)
+
+    if source_name:
+        source = get_source_by_name(config, source_name)
+        if not source:
+            print(f"❌ Error: Source '{source_name}' not found in config")
+            sys.exit(1)
+        sources = [source]
+
+    if not sources:
+        print("No sources configured.")
+        return
+
+    for source in sources:
+        account = source["account"]
+        if retry:
+            count = archive.db.reset_exhausted_failures(account)
+            print(f"✓ {source['name']}: {count} emails will be retried on the next download")
+            continue
+
+        failures = archive.db.get_exhausted_failures(account)
+        print(f"{source['name']} ({account}): {len(failures)} emails given up on")
+        for provider_id, attempts, last_error in failures:
+            print(f"  {provider_id}  ({attempts} attempts) {last_error}")
+
+
+def _fraction(value: str) -> float:
+    """argparse type for a fraction between 0 and 1 ("1/30" or "0.05")."""
+    try:
+        fraction = Fraction(value)
+    except (ValueError, ZeroDivisionError):
+        raise argparse.ArgumentTypeError(f"invalid fraction: {value}") from None
+    if not 0 <= fraction <= 1:
+        raise argparse.ArgumentTypeError(f"fraction must be between 0 and 1: {value}")
+    return float(fraction)
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -721,6 +980,16 @@ Examples:
         type=str,
         help="Only download emails before this date (YYYY-MM-DD)",
     )
+    download_parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Download all sources at the same time",
+    )
+    download_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and download new emails as they arrive",
+    )
     _add_global_opts(download_parser)
 
     # search command
@@ -762,6 +1031,12 @@ Examples:
         description="Check file integrity, detect orphans, and validate database health.",
     )
     verify_parser.add_argument("--fix", action="store_true", help="Fix issues (remove stale DB entries, rebuild FTS)")
+    verify_parser.add_argument("--workers", type=int, default=4,
+                               help="Files hashed in parallel (default: 4; fewer suits spinning disks)")
+    verify_parser.add_argument("--full", action="store_true",
+                               help="Rehash every file, not just changed ones and the scrub slice")
+    verify_parser.add_argument("--scrub-fraction", type=_fraction, default=1 / 30, metavar="FRACTION",
+                               help="Share of unchanged files rehashed per run, oldest first (default: 1/30)")
     _add_global_opts(verify_parser)
 
     # sync-check command
@@ -782,6 +1057,23 @@ Examples:
     reset_sync_parser.add_argument("--source", type=str, help="Source name to reset (default: all sources)")
     _add_global_opts(reset_sync_parser)
 
+    # failed command
+    failed_parser = subparsers.add_parser(
+        "failed",
+        help="List or retry downloads that kept failing",
+        description=(
+            f"List emails that failed to download {MAX_DOWNLOAD_ATTEMPTS} times "
+            "and are no longer retried."
+        ),
+    )
+    failed_parser.add_argument("--source", type=str, help="Source name to check (default: all sources)")
+    failed_parser.add_argument(
+        "--retry",
+        action="store_true",
+        help="Try these emails again on the next download",
+    )
+    _add_global_opts(failed_parser)
+
     # update-labels command
     update_labels_parser = subparsers.add_parser(
         "update-labels",
@@ -791,6 +1083,40 @@ Examples:
     update_labels_parser.add_argument("--source", type=str, help="Source name to update (default: all sources)")
     _add_global_opts(update_labels_parser)
 
+    # unpack command
+    unpack_parser = subparsers.add_parser(
+        "unpack",
+        help="Write packed emails back out as .eml files",
+        description="Regenerate the plain .eml tree from pack segments (layout: pack).",
+    )
+    unpack_parser.add_argument("--source", type=str, help="Source name to unpack (default: all sources)")
+    _add_global_opts(unpack_parser)
+
+    # relayout command
+    relayout_parser = subparsers.add_parser(
+        "relayout",
+        help="Move .eml files into another directory layout",
+        description="Move emails between YYYY/MM (date), YYYY/MM/DD (day) and "
+                    "YYYY/MM/<xx> (hash) directories, updating the database as it goes.",
+    )
+    relayout_parser.add_argument("--layout", required=True, choices=["date", "day", "hash"],
+                                 help="Target layout")
+    relayout_parser.add_argument("--source", type=str, help="Source name to move (default: all sources)")
+    _add_global_opts(relayout_parser)
+
+    # index-report command
+    index_report_parser = subparsers.add_parser(
+        "index-report",
+        help="Show index savings from stripping quotes and signatures",
+        description="Index a sample of emails with and without quoted history and "
+                    "signatures (index.strip_quotes) and compare index size and query time.",
+    )
+    index_report_parser.add_argument("--sample", type=int, default=2000,
+                                     help="Number of emails to sample (default: 2000)")
+    index_report_parser.add_argument("--query", action="append", dest="queries", metavar="QUERY",
+                                     help="FTS query to time; repeatable (default: the most common terms)")
+    _add_global_opts(index_report_parser)
+
     # list-unknown command
     unknown_parser = subparsers.add_parser(
         "list-unknown",
@@ -868,7 +1194,10 @@ Examples:
             archive = EmailArchive(archive_root, config)
 
             if args.command == "download":
-                cmd_download(archive, config, args.source, args.since, args.until, args.verbose)
+                if args.watch and (args.since or args.until):
+                    parser.error("--watch cannot be combined with --since/--until")
+                cmd_download(archive, config, args.source, args.since, args.until, args.verbose,
+                             parallel=args.parallel, watch=args.watch)
             elif args.command == "search":
                 cmd_search(archive, args.query, limit=args.limit)
             elif args.command == "stats":
@@ -883,15 +1212,26 @@ Examples:
                 cmd_rebuild(archive, args.file, args.pattern, args.force, args.debug, only)
             elif args.command == "verify":
                 from ownmail.commands import cmd_verify
-                cmd_verify(archive, args.fix, args.verbose)
+                cmd_verify(archive, args.fix, args.verbose, args.workers, args.full, args.scrub_fraction)
             elif args.command == "sync-check":
                 from ownmail.commands import cmd_sync_check
                 cmd_sync_check(archive, args.source, args.verbose)
             elif args.command == "reset-sync":
                 cmd_reset_sync(archive, config, args.source)
+            elif args.command == "failed":
+                cmd_failed(archive, config, args.source, retry=args.retry)
             elif args.command == "update-labels":
                 from ownmail.commands import cmd_update_labels
                 cmd_update_labels(archive, args.source)
+            elif args.command == "unpack":
+                from ownmail.commands import cmd_unpack
+                cmd_unpack(archive, args.source)
+            elif args.command == "relayout":
+                from ownmail.commands import cmd_relayout
+                cmd_relayout(archive, args.layout, args.source)
+            elif args.command == "index-report":
+                from ownmail.commands import cmd_index_report
+                cmd_index_report(archive, args.sample, args.queries)
             elif args.command == "list-unknown":
                 from ownmail.commands import cmd_list_unknown
                 cmd_list_unknown(archive, args.verbose)
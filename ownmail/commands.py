@@ -5,21 +5,39 @@ This module contains commands for archive maintenance:
 - verify: Verify archive integrity (files, hashes, database)
 - sync_check: Compare local archive with server
 - update_labels: Update labels from server or derive from IMAP folders
+- unpack / relayout: Move emails between storage layouts
 """
 
 import hashlib
+import math
 import signal
 import sqlite3
 import sys
 import time
+from contextlib import closing
 from datetime import timezone
 from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, List, Optional
 
 from ownmail.archive import EmailArchive
+from ownmail.blobs import BLOB_DIR, blob_is_intact, list_blobs
+from ownmail.config import get_index_limits, get_index_strip_quotes
 from ownmail.database import ArchiveDatabase
+from ownmail.normalize import strip_quoted_text
 from ownmail.parser import EmailParser
+from ownmail.storage import (
+    Readahead,
+    blob_digests,
+    email_exists,
+    hash_email,
+    head_digest,
+    is_deduped,
+    is_email_file,
+    locality_key,
+    read_email,
+    stat_email,
+)
 
 
 def cmd_rebuild(
@@ -169,6 +187,10 @@ def cmd_rebuild(
             conn.commit()
         print(" done")
 
+    # Read in on-disk order, with the next files warmed in the background
+    emails.sort(key=lambda row: locality_key(row[1]))
+    readahead = Readahead([archive.archive_dir / row[1] for row in emails])
+
     print(f"\nIndexing {len(emails)} emails...")
     print("(Press Ctrl-C to pause - progress is saved, run again to resume)\n")
 
@@ -193,9 +215,11 @@ def cmd_rebuild(
     batch_conn.execute("PRAGMA synchronous = NORMAL")
 
     try:
+        readahead.start()
         for i, (msg_id, filename, _content_hash, _indexed_hash) in enumerate(emails, 1):
             if interrupted:
                 break
+            readahead.advance()
 
             filepath = archive.archive_dir / filename
             short_name = Path(filename).name[:40]
@@ -203,7 +227,7 @@ def cmd_rebuild(
             # Show what we're working on
             print(f"\r\033[K  [{i}/{len(emails)}] {short_name}", end="", flush=True)
 
-            if not filepath.exists():
+            if not email_exists(filepath):
                 print(f"\n  Missing file: {filename}")
                 error_count += 1
                 continue
@@ -238,6 +262,7 @@ def cmd_rebuild(
             # Update progress line
             print(f"\r\033[K  [{i}/{len(emails)}] {rate:.1f}/s | ETA {eta_str:>5} | {short_name}", end="", flush=True)
     finally:
+        readahead.close()
         # Commit any remaining updates
         batch_conn.commit()
         batch_conn.close()
@@ -353,7 +378,7 @@ def _populate_dates_only(
             # If no date_str or parsing failed, try parsing the .eml file
             if not email_date_iso:
                 filepath = archive.archive_dir / filename
-                if filepath.exists():
+                if email_exists(filepath):
                     try:
                         parsed = EmailParser.parse_file(filepath=filepath)
                         if parsed["date_str"]:
@@ -414,7 +439,9 @@ def _index_single_email(
 ) -> bool:
     """Index a single email file."""
     try:
-        parsed = EmailParser.parse_file(filepath=filepath)
+        parsed = EmailParser.parse_file(filepath=filepath, **get_index_limits(archive.config))
+        if get_index_strip_quotes(archive.config):
+            parsed["body"] = strip_quoted_text(parsed["body"])
 
         # Compute email_date from parsed date_str
         email_date_iso = None
@@ -436,6 +463,7 @@ def _index_single_email(
             body=parsed["body"],
             attachments=parsed["attachments"],
             email_date=email_date_iso,
+            body_indexed_bytes=parsed["body_indexed_bytes"],
         )
         return True
     except Exception as e:
@@ -453,11 +481,12 @@ def _index_email_for_rebuild(
     """Index email during rebuild (uses batch connection)."""
     try:
         # Read file once for both parsing and hashing
-        with open(filepath, "rb") as f:
-            content = f.read()
+        content = read_email(filepath)
 
         content_hash = hashlib.sha256(content).hexdigest()
-        parsed = EmailParser.parse_file(content=content)
+        parsed = EmailParser.parse_file(content=content, **get_index_limits(archive.config))
+        if get_index_strip_quotes(archive.config):
+            parsed["body"] = strip_quoted_text(parsed["body"])
 
         # Create snippet from body
         body = parsed["body"]
@@ -500,13 +529,15 @@ def _index_email_for_rebuild(
                 indexed_hash = ?,
                 content_hash = COALESCE(content_hash, ?),
                 has_attachments = ?,
-                email_date = COALESCE(email_date, ?)
+                email_date = COALESCE(email_date, ?),
+                body_indexed_bytes = ?
             WHERE email_id = ?
             RETURNING rowid
             """,
             (parsed["subject"], parsed["sender"], recipients,
              parsed["date_str"], snippet,
-             content_hash, content_hash, has_attachments, email_date_iso, email_id)
+             content_hash, content_hash, has_attachments, email_date_iso,
+             parsed["body_indexed_bytes"], email_id)
         ).fetchone()
 
         # Insert into FTS and normalized tables
@@ -558,32 +589,219 @@ def _index_email_for_rebuild(
         return False
 
 
+VERIFY_WORKERS = 4
+# Share of unchanged files rehashed per run, so all are checked monthly
+VERIFY_SCRUB_FRACTION = 1 / 30
+# Futures queued per worker; bounds memory for million-email archives
+VERIFY_QUEUE_PER_WORKER = 4
+
+
 def _verify_single_file(args: tuple) -> tuple:
-    """Verify a single file's hash. Returns (status, filename).
+    """Verify a single file's hash.
+
+    args is (archive_dir, filename, stored_hash, cached, rehash), cached
+    being the catalogued (size, mtime_ns, inode, head_digest): a file
+    whose stat still matches is not rehashed unless rehash is set.
+
+    An .emlb stub whose head digest (which covers the whole stub) still
+    matches is 'ok' without reassembling it: its attachment blobs are
+    checked once each, against their names, by _verify_blobs().
 
-    Status: 'ok', 'missing', 'corrupted', 'no_hash'
+    Returns:
+        (status, filename, bytes hashed, stat), status being 'ok',
+        'unchanged', 'missing', 'corrupted' or 'no_hash'. For 'ok' the
+        stat also carries the head digest, for the file catalog.
     """
-    archive_dir, filename, stored_hash = args
+    archive_dir, filename, stored_hash, cached, rehash = args
 
     filepath = archive_dir / filename
 
-    if not filepath.exists():
-        return ('missing', filename)
+    try:
+        current_stat = stat_email(filepath)
+    except OSError:
+        return ('missing', filename, 0, None)
 
     if not stored_hash:
-        return ('no_hash', filename)
+        return ('no_hash', filename, 0, current_stat)
+
+    if cached and current_stat == cached[:3] and not rehash:
+        return ('unchanged', filename, 0, current_stat)
 
-    # Compute current hash
-    with open(filepath, "rb") as f:
-        current_hash = hashlib.sha256(f.read()).hexdigest()
+    if cached and cached[3] and is_deduped(filepath):
+        digest = head_digest(filepath)
+        if digest == cached[3]:
+            return ('ok', filename, current_stat[0], (*current_stat, digest))
+
+    # Stream the file through the hash rather than reading it whole
+    current_hash, size = hash_email(filepath)
 
     if current_hash == stored_hash:
-        return ('ok', filename)
+        return ('ok', filename, size, (*current_stat, head_digest(filepath)))
     else:
-        return ('corrupted', filename)
+        return ('corrupted', filename, size, current_stat)
+
 
+def _verify_files(work_items, workers: int):
+    """Run _verify_single_file over work_items with bounded submission.
+
+    Yields results as they complete; at most workers *
+    VERIFY_QUEUE_PER_WORKER files are queued at any time.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    items = iter(work_items)
+    max_pending = workers * VERIFY_QUEUE_PER_WORKER
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        while True:
+            for item in items:
+                pending.add(executor.submit(_verify_single_file, item))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def _verify_blobs(
+    archive_dir: Path,
+    blob_dir: Path,
+    filenames: List[str],
+    checked_stubs: set,
+    full: bool,
+    workers: int,
+    verbose: bool,
+) -> int:
+    """Check the attachment blob store and report what is wrong.
+
+    The manifests of all .emlb stubs give the referenced blobs. Blobs
+    referenced by a stub verified in this run (all of them with `full`)
+    are hashed once each and compared with their name, however many
+    emails share them.
+
+    Returns:
+        Number of issues found (missing, corrupted, unreferenced blobs)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    on_disk = list_blobs(blob_dir)
+    referenced = {}  # digest -> number of emails referring to it
+    to_hash = set()
+    for filename in filenames:
+        if not is_deduped(filename):
+            continue
+        try:
+            digests = blob_digests(archive_dir / filename)
+        except Exception:
+            # Missing or unreadable stub: reported with the files above
+            continue
+        for digest in digests:
+            referenced[digest] = referenced.get(digest, 0) + 1
+        if full or filename in checked_stubs:
+            to_hash.update(digests)
+
+    hashed = sorted(digest for digest in to_hash if digest in on_disk)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        intact = list(executor.map(lambda digest: blob_is_intact(on_disk[digest]), hashed))
+    corrupted = [digest for digest, ok in zip(hashed, intact) if not ok]
+    missing = sorted(digest for digest in referenced if digest not in on_disk)
+    unreferenced = sorted(digest for digest in on_disk if digest not in referenced)
+
+    print(f"  ✓ Attachment blobs OK: {len(hashed) - len(corrupted)} hashed of {len(on_disk)}")
+    issues = 0
+    if missing:
+        issues += 1
+        _print_file_list(
+            [f"{digest} ({referenced[digest]} emails)" for digest in missing],
+            "✗ Attachment blobs missing", verbose,
+        )
+    if corrupted:
+        issues += 1
+        _print_file_list(
+            [f"{digest} ({referenced.get(digest, 0)} emails)" for digest in corrupted],
+            "✗ Attachment blobs CORRUPTED (hash mismatch)", verbose,
+        )
+    if unreferenced:
+        issues += 1
+        _print_file_list(
+            [str(on_disk[digest].relative_to(archive_dir)) for digest in unreferenced],
+            "? Attachment blobs not referenced by any email", verbose,
+        )
+    return issues
 
-def cmd_verify(archive: EmailArchive, fix: bool = False, verbose: bool = False) -> None:
+
+def _scan_email_files(archive_dir: Path, subdirs: list, workers: int) -> List[str]:
+    """List stored email files as sorted paths relative to archive_dir.
+
+    Walks with os.scandir, one thread per directory below each subdir
+    (a source, or a year for the legacy emails/ layout).
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    def walk(directory: str, prefix: str) -> List[str]:
+        found = []
+        stack = [(directory, prefix)]
+        while stack:
+            path, rel = stack.pop()
+            try:
+                entries = os.scandir(path)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = f"{rel}/{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, name))
+                    elif is_email_file(entry.name):
+                        found.append(name)
+        return found
+
+    roots = []
+    files = []
+    for subdir in subdirs:
+        try:
+            entries = list(os.scandir(archive_dir / subdir))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                roots.append((entry.path, f"{subdir}/{entry.name}"))
+            elif is_email_file(entry.name):
+                files.append(f"{subdir}/{entry.name}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for found in executor.map(lambda root: walk(*root), roots):
+            files.extend(found)
+    files.sort()
+    return files
+
+
+def _unindexed_files(on_disk: Iterable[str], indexed: Iterable[str]) -> Iterator[str]:
+    """Sorted merge: yield paths in on_disk that are not in indexed.
+
+    Both inputs must be sorted (SQLite's binary collation orders UTF-8
+    text the same way Python orders str).
+    """
+    indexed = iter(indexed)
+    current = next(indexed, None)
+    for path in on_disk:
+        while current is not None and current < path:
+            current = next(indexed, None)
+        if current != path:
+            yield path
+
+
+def cmd_verify(
+    archive: EmailArchive,
+    fix: bool = False,
+    verbose: bool = False,
+    workers: int = VERIFY_WORKERS,
+    full: bool = False,
+    scrub_fraction: float = VERIFY_SCRUB_FRACTION,
+) -> None:
     """Verify archive integrity: files, hashes, and database health.
 
     Checks:
@@ -596,9 +814,15 @@ def cmd_verify(archive: EmailArchive, fix: bool = False, verbose: bool = False)
     - Updates DB paths for moved/renamed files
     - Removes DB rows for files that no longer exist on disk
     - Rebuilds FTS index when out of sync
+
+    Only files whose stat changed since they last verified (per the
+    file_catalog table) are rehashed, plus a rolling scrub of the
+    `scrub_fraction` of files verified longest ago; `full` rehashes
+    everything. Hashing runs on `workers` threads. The reported throughput and CPU
+    use show whether verify is disk-bound (CPU well below the worker
+    count) or CPU-bound.
     """
     import time
-    from concurrent.futures import ThreadPoolExecutor, as_completed
 
     print("\n" + "=" * 50)
     print("ownmail - Verify")
@@ -614,79 +838,125 @@ def cmd_verify(archive: EmailArchive, fix: bool = False, verbose: bool = False)
 
     with sqlite3.connect(db_path) as conn:
         emails = conn.execute(
-            "SELECT email_id, filename, content_hash FROM emails"
+            """SELECT e.email_id, e.filename, e.content_hash, c.size, c.mtime_ns, c.inode,
+                      c.head_digest
+               FROM emails e LEFT JOIN file_catalog c ON c.filename = e.filename"""
         ).fetchall()
+    # Hash in on-disk order so the workers' reads stay close together
+    emails.sort(key=lambda row: locality_key(row[1]))
 
     total = len(emails)
     ok_count = 0
     missing_count = 0
     corrupted_count = 0
     no_hash_count = 0
+    unchanged_count = 0
+    verified_stats = []
     corrupted_files = []
     missing_files = []
     missing_email_ids = []
     missing_hashes = {}  # content_hash -> (filename, email_id)
-    indexed_files = set()
+    checked_stubs = set()  # .emlb files verified this run
 
     if total == 0:
         print("No emails in database.\n")
     else:
         print(f"1. Verifying {total} files...\n")
 
-        work_items = []
         email_id_by_filename = {}
         hash_by_filename = {}
-        for email_id, filename, stored_hash in emails:
-            indexed_files.add(filename)
+        for email_id, filename, stored_hash, *_ in emails:
             email_id_by_filename[filename] = email_id
             hash_by_filename[filename] = stored_hash
-            work_items.append((archive.archive_dir, filename, stored_hash))
+        scrub = set() if full else archive.db.get_scrub_filenames(math.ceil(total * scrub_fraction))
+        work_items = (
+            (archive.archive_dir, filename, stored_hash,
+             tuple(cached) if cached[0] is not None else None, full or filename in scrub)
+            for _email_id, filename, stored_hash, *cached in emails
+        )
 
         completed = 0
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = {executor.submit(_verify_single_file, item): item for item in work_items}
-
-            for future in as_completed(futures):
-                completed += 1
-                print(f"  [{completed}/{total}] Verifying...\033[K", end="\r")
-
-                status, filename = future.result()
-                if status == 'ok':
-                    ok_count += 1
-                elif status == 'missing':
-                    missing_count += 1
-                    missing_files.append(filename)
-                    eid = email_id_by_filename[filename]
-                    missing_email_ids.append(eid)
-                    stored_hash = hash_by_filename[filename]
-                    if stored_hash:
-                        missing_hashes[stored_hash] = (filename, eid)
-                elif status == 'corrupted':
-                    corrupted_count += 1
-                    corrupted_files.append(filename)
-                elif status == 'no_hash':
-                    no_hash_count += 1
-
-        # Orphaned files
+        bytes_hashed = 0
+        hash_start = time.time()
+        cpu_start = time.process_time()
+        for status, filename, size, file_stat in _verify_files(work_items, max(1, workers)):
+            completed += 1
+            bytes_hashed += size
+            if completed % 100 == 0 or completed == total:
+                elapsed = time.time() - hash_start
+                rate = bytes_hashed / elapsed / 1e6 if elapsed > 0 else 0.0
+                print(f"  [{completed}/{total}] Verifying... {rate:.1f} MB/s\033[K", end="\r")
+
+            if status == 'ok':
+                ok_count += 1
+                verified_stats.append((filename, *file_stat))
+                if is_deduped(filename):
+                    checked_stubs.add(filename)
+            elif status == 'unchanged':
+                ok_count += 1
+                unchanged_count += 1
+            elif status == 'missing':
+                missing_count += 1
+                missing_files.append(filename)
+                eid = email_id_by_filename[filename]
+                missing_email_ids.append(eid)
+                stored_hash = hash_by_filename[filename]
+                if stored_hash:
+                    missing_hashes[stored_hash] = (filename, eid)
+            elif status == 'corrupted':
+                corrupted_count += 1
+                corrupted_files.append(filename)
+            elif status == 'no_hash':
+                no_hash_count += 1
+
+        hash_time = time.time() - hash_start
+        cpu_busy = (time.process_time() - cpu_start) / hash_time if hash_time > 0 else 0.0
+        rate = bytes_hashed / hash_time / 1e6 if hash_time > 0 else 0.0
+        print(f"\n  Hashed {bytes_hashed / 1e6:.1f} MB in {hash_time:.1f}s: {rate:.1f} MB/s, "
+              f"CPU {cpu_busy:.1f} of {max(1, workers)} workers busy\033[K", end="")
+        if unchanged_count:
+            print(f"\n  Skipped {unchanged_count} unchanged files (scrubbed {len(scrub)}; "
+                  "--full rehashes all)\033[K", end="")
+
+        # Catalogued (size, head digest) of missing files, read before the
+        # catalog forgets them, so orphans can be ruled out as moves cheaply
+        missing_keys = {}
+        with sqlite3.connect(db_path) as conn:
+            for filename, _eid in missing_hashes.values():
+                missing_keys[filename] = conn.execute(
+                    "SELECT size, head_digest FROM file_catalog WHERE filename = ?", (filename,)
+                ).fetchone()
+        archive.db.update_file_catalog(verified_stats, missing_files + corrupted_files)
+
+        # Orphaned files: merge the sorted disk listing with the sorted
+        # filenames in the database
         print("\n  Scanning for orphaned files...\033[K", end="\r")
-        orphaned_files = []
-        for subdir in ["emails", "sources"]:
-            check_dir = archive.archive_dir / subdir
-            if check_dir.exists():
-                for eml_file in check_dir.rglob("*.eml"):
-                    rel_path = str(eml_file.relative_to(archive.archive_dir))
-                    if rel_path not in indexed_files:
-                        orphaned_files.append(rel_path)
-
-        # Detect moved/renamed files by matching hashes
+        on_disk = _scan_email_files(archive.archive_dir, ["emails", "sources"], max(1, workers))
+        # The cursor is closed explicitly: the merge can stop before it is
+        # exhausted, and an unfinished read would keep the database locked
+        with sqlite3.connect(db_path) as conn, closing(conn.execute(
+            "SELECT filename FROM emails WHERE filename IS NOT NULL ORDER BY filename"
+        )) as indexed:
+            orphaned_files = list(_unindexed_files(on_disk, (row[0] for row in indexed)))
+
+        # Detect moved/renamed files by matching hashes. Orphans whose
+        # (size, head digest) matches no missing file are not hashed,
+        # unless a missing file was never catalogued.
         moved_files = []  # (old_path, new_path, email_id)
         if missing_hashes and orphaned_files:
+            known_keys = set(missing_keys.values())
+            known_sizes = {key[0] for key in known_keys if key}
+            match_all = None in known_keys or any(key[1] is None for key in known_keys if key)
             remaining_orphans = []
             for orphan_path in orphaned_files:
                 orphan_full = archive.archive_dir / orphan_path
                 try:
-                    with open(orphan_full, "rb") as f:
-                        orphan_hash = hashlib.sha256(f.read()).hexdigest()
+                    if not match_all:
+                        size = orphan_full.stat().st_size
+                        if size not in known_sizes or (size, head_digest(orphan_full)) not in known_keys:
+                            remaining_orphans.append(orphan_path)
+                            continue
+                    orphan_hash, _ = hash_email(orphan_full)
                 except OSError:
                     remaining_orphans.append(orphan_path)
                     continue
@@ -766,6 +1036,13 @@ def cmd_verify(archive: EmailArchive, fix: bool = False, verbose: bool = False)
             issues_found += 1
             _print_file_list(corrupted_files, "✗ CORRUPTED (hash mismatch)", verbose)
 
+        blob_dir = archive.archive_dir / BLOB_DIR
+        if blob_dir.is_dir():
+            issues_found += _verify_blobs(
+                archive.archive_dir, blob_dir, list(hash_by_filename), checked_stubs,
+                full, max(1, workers), verbose,
+            )
+
     # ── Phase 2: Database health ─────────────────────────────────────────
 
     print("\n2. Checking database...\n")
@@ -931,6 +1208,373 @@ def cmd_verify(archive: EmailArchive, fix: bool = False, verbose: bool = False)
     print("-" * 50 + "\n")
 
 
+def _like_escape(text: str) -> str:
+    """Escape LIKE wildcards in text (use with ESCAPE '\\')."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def cmd_unpack(archive: EmailArchive, source_name: str = None) -> None:
+    """Write packed emails back out as one plain file each.
+
+    Every email stored in pack segments (layout: pack) is written to the
+    YYYY/MM/ path it would have had as a plain file, and its database row
+    is pointed at that file. Files are made durable before the rows that
+    point at them are committed. Pack segments are removed once none of
+    their emails are referenced any more.
+    """
+    import os
+    import tempfile
+
+    from ownmail.storage import WriteBehind, close_pack_maps, parse_pack_address, read_pack_record
+
+    print("\n" + "=" * 50)
+    print("ownmail - Unpack")
+    print("=" * 50 + "\n")
+
+    COMMIT_INTERVAL = 500
+    pattern = "%.pack/%"
+    if source_name:
+        pattern = _like_escape(f"sources/{source_name}/") + pattern
+    conn = sqlite3.connect(archive.db.db_path)
+    try:
+        rows = conn.execute(
+            "SELECT email_id, filename FROM emails WHERE filename LIKE ? ESCAPE '\\'", (pattern,)
+        ).fetchall()
+        if not rows:
+            print("No packed emails found.")
+            return
+
+        print(f"Unpacking {len(rows)} emails...")
+        packs = set()
+        unpacked = 0
+        durable = WriteBehind()
+        try:
+            for email_id, filename in rows:
+                address = parse_pack_address(filename)
+                if address is None:
+                    continue
+                pack_rel, _, _, name = address
+                packs.add(pack_rel)
+                # sources/<name>/packs/pack-N.pack -> sources/<name>/<YYYY/MM/file>
+                target_rel = pack_rel.parent.parent / name
+                target = archive.archive_dir / target_rel
+                durable.ensure_dir(target.parent)
+
+                data = read_pack_record(archive.archive_dir / filename)
+                fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                    os.replace(temp_path, target)
+                except Exception:
+                    if os.path.exists(temp_path):
+                        os.unlink(temp_path)
+                    raise
+                durable.add_file(target)
+
+                conn.execute(
+                    "UPDATE emails SET filename = ? WHERE email_id = ?",
+                    (target_rel.as_posix(), email_id)
+                )
+                unpacked += 1
+                if unpacked % COMMIT_INTERVAL == 0:
+                    durable.flush()
+                    conn.commit()
+                    print(f"\r\033[K  [{unpacked}/{len(rows)}]", end="", flush=True)
+        except KeyboardInterrupt:
+            print("\n\nInterrupted. Run 'unpack' again to continue.")
+        finally:
+            durable.flush()
+            conn.commit()
+
+        # Drop segments that no email points into any more
+        close_pack_maps()
+        removed = 0
+        for pack_rel in sorted(packs):
+            still_used = conn.execute(
+                "SELECT 1 FROM emails WHERE filename LIKE ? ESCAPE '\\' LIMIT 1",
+                (_like_escape(f"{pack_rel.as_posix()}/") + "%",)
+            ).fetchone()
+            if not still_used:
+                (archive.archive_dir / pack_rel).unlink(missing_ok=True)
+                removed += 1
+    finally:
+        conn.close()
+
+    print(f"\r\033[K  Unpacked: {unpacked} emails")
+    print(f"  Removed pack segments: {removed}\n")
+
+
+def _layout_root(rel: Path) -> Optional[Path]:
+    """Source directory of a plain email file, whatever layout it is in."""
+    from ownmail.storage import DIR_LAYOUTS, email_dir
+
+    parent = rel.parent.as_posix()
+    for layout in DIR_LAYOUTS:
+        subdir = email_dir(layout, rel.name)
+        if subdir and parent.endswith("/" + subdir):
+            return Path(parent[:-len(subdir) - 1])
+    return None
+
+
+def cmd_relayout(archive: EmailArchive, layout: str, source_name: str = None) -> None:
+    """Move plain email files into another directory layout.
+
+    Each batch of files is first hard-linked (or copied) to its path in
+    the new layout, then the batch's database rows are updated in one
+    transaction, and only after that commits are the old paths removed.
+    An interrupted run leaves every row pointing at an existing file and
+    can simply be run again. Packed emails are left where they are.
+
+    Args:
+        archive: EmailArchive instance
+        layout: Target layout ("date", "day" or "hash")
+        source_name: Only move this source's emails (default: all)
+    """
+    import os
+    import shutil
+
+    from ownmail.storage import DIR_LAYOUTS, WriteBehind, email_dir
+
+    if layout not in DIR_LAYOUTS:
+        raise ValueError(f"Unsupported layout: {layout}")
+
+    print("\n" + "=" * 50)
+    print("ownmail - Relayout")
+    print("=" * 50 + "\n")
+
+    COMMIT_INTERVAL = 500
+    pattern = _like_escape(f"sources/{source_name}/") + "%" if source_name else "%"
+    conn = sqlite3.connect(archive.db.db_path)
+    try:
+        rows = conn.execute(
+            "SELECT email_id, filename FROM emails WHERE filename LIKE ? ESCAPE '\\' AND filename NOT LIKE ?",
+            (pattern, "%.pack/%")
+        ).fetchall()
+
+        moves = []
+        skipped = 0
+        for email_id, filename in rows:
+            rel = Path(filename)
+            root = _layout_root(rel)
+            if root is None:
+                skipped += 1
+                continue
+            target_rel = root / email_dir(layout, rel.name) / rel.name
+            if target_rel != rel:
+                moves.append((email_id, rel, target_rel))
+
+        if not moves:
+            print(f"All emails already use the '{layout}' layout.")
+            return
+
+        print(f"Moving {len(moves)} emails to the '{layout}' layout...")
+        moved = 0
+        missing = 0
+        old_dirs = set()
+        try:
+            for start in range(0, len(moves), COMMIT_INTERVAL):
+                durable = WriteBehind()
+                done = []
+                for email_id, rel, target_rel in moves[start:start + COMMIT_INTERVAL]:
+                    source = archive.archive_dir / rel
+                    target = archive.archive_dir / target_rel
+                    if not source.exists() and not target.exists():
+                        missing += 1
+                        continue
+                    if not target.exists():
+                        durable.ensure_dir(target.parent)
+                        try:
+                            os.link(source, target)
+                        except OSError:
+                            # No hard links here (e.g. FAT); fall back to a copy
+                            shutil.copy2(source, target)
+                        durable.add_file(target)
+                    conn.execute(
+                        "UPDATE emails SET filename = ? WHERE email_id = ?",
+                        (target_rel.as_posix(), email_id)
+                    )
+                    done.append(source)
+
+                # New paths are durable before rows point at them, and old
+                # paths go only once the rows have moved
+                durable.flush()
+                conn.commit()
+                for source in done:
+                    source.unlink(missing_ok=True)
+                    old_dirs.add(source.parent)
+                moved += len(done)
+                print(f"\r\033[K  [{moved}/{len(moves)}]", end="", flush=True)
+        except KeyboardInterrupt:
+            conn.rollback()
+            print("\n\nInterrupted. Run 'relayout' again to continue.")
+    finally:
+        conn.close()
+
+    # Remove directories the move left empty (deepest first)
+    for directory in sorted(old_dirs, key=lambda d: len(d.parts), reverse=True):
+        while directory != archive.archive_dir and directory.name != "sources":
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+            directory = directory.parent
+
+    print(f"\r\033[K  Moved: {moved} emails")
+    if missing:
+        print(f"  Missing files (run 'verify'): {missing}")
+    if skipped:
+        print(f"  Skipped (unrecognized file names): {skipped}")
+    print(f"\nSet 'layout: {layout}' for the source in config.yaml so new")
+    print("emails are saved the same way.\n")
+
+
+INDEX_REPORT_SAMPLE = 2000
+# Terms queried when none are given: the most common in the sample,
+# whose posting lists quoted history inflates the most
+INDEX_REPORT_QUERIES = 20
+INDEX_REPORT_REPEATS = 5
+
+
+def _build_report_index(rows: List[tuple]) -> sqlite3.Connection:
+    """In-memory FTS table shaped like emails_fts, loaded with rows."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE VIRTUAL TABLE emails_fts USING fts5(
+            subject, sender, recipients, body, attachments,
+            content='', tokenize='porter unicode61'
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO emails_fts (subject, sender, recipients, body, attachments) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('optimize')")
+    return conn
+
+
+def _report_index_bytes(conn: sqlite3.Connection) -> int:
+    """Size of an FTS table's index (its b-tree blocks)."""
+    return conn.execute("SELECT COALESCE(SUM(LENGTH(block)), 0) FROM emails_fts_data").fetchone()[0]
+
+
+def _report_query_ms(conn: sqlite3.Connection, query: str) -> float:
+    """Best-of-N time, in ms, for a relevance-ranked first page of a query."""
+    best = float("inf")
+    for _ in range(INDEX_REPORT_REPEATS):
+        start = time.perf_counter()
+        conn.execute(
+            "SELECT rowid FROM emails_fts WHERE emails_fts MATCH ? ORDER BY rank LIMIT 50", (query,)
+        ).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def cmd_index_report(
+    archive: EmailArchive,
+    sample: int = INDEX_REPORT_SAMPLE,
+    queries: List[str] = None,
+) -> None:
+    """Show what quote and signature stripping would save in the index.
+
+    A sample of emails, spread evenly over the archive, is parsed the way
+    rebuild parses it and indexed twice into in-memory FTS tables: once
+    with the full body and once with strip_quoted_text applied. The
+    report compares index size and query time. The archive's own index
+    and files are not modified.
+
+    Args:
+        archive: EmailArchive instance
+        sample: Number of emails to sample
+        queries: FTS queries to time (default: the most common terms)
+    """
+    print("\n" + "=" * 50)
+    print("ownmail - Index Normalization Report")
+    print("=" * 50 + "\n")
+
+    with sqlite3.connect(archive.db.db_path) as conn:
+        filenames = [row[0] for row in conn.execute(
+            "SELECT filename FROM emails WHERE filename IS NOT NULL ORDER BY rowid"
+        )]
+    if not filenames:
+        print("No emails in the archive.\n")
+        return
+    step = max(1, len(filenames) // max(sample, 1))
+    filenames = filenames[::step][:sample]
+
+    limits = get_index_limits(archive.config)
+    full_rows = []
+    stripped_rows = []
+    full_bytes = stripped_bytes = 0
+    skipped = 0
+    for i, filename in enumerate(filenames, 1):
+        filepath = archive.archive_dir / filename
+        try:
+            parsed = EmailParser.parse_file(content=read_email(filepath), **limits)
+            body = parsed["body"]
+            stripped = strip_quoted_text(body)
+        except Exception:
+            # Missing or unreadable file: leave it out of the sample
+            skipped += 1
+            continue
+        full_bytes += len(body.encode("utf-8", errors="ignore"))
+        stripped_bytes += len(stripped.encode("utf-8", errors="ignore"))
+        fields = (parsed["subject"], parsed["sender"], parsed["recipients"])
+        full_rows.append((*fields, body, parsed["attachments"]))
+        stripped_rows.append((*fields, stripped, parsed["attachments"]))
+        if i % 100 == 0:
+            print(f"\r\033[K  Parsing [{i}/{len(filenames)}]", end="", flush=True)
+
+    if not full_rows:
+        print(f"\r\033[KNo readable emails in the sample (skipped: {skipped}).\n")
+        return
+
+    full = _build_report_index(full_rows)
+    stripped = _build_report_index(stripped_rows)
+    try:
+        if not queries:
+            full.execute("CREATE VIRTUAL TABLE temp.vocab USING fts5vocab(main, emails_fts, 'row')")
+            queries = [f'"{row[0]}"' for row in full.execute(
+                "SELECT term FROM temp.vocab WHERE term GLOB '[a-z]*' AND LENGTH(term) > 2 "
+                "ORDER BY doc DESC LIMIT ?", (INDEX_REPORT_QUERIES,)
+            )]
+
+        full_index = _report_index_bytes(full)
+        stripped_index = _report_index_bytes(stripped)
+
+        def pct(new: float, old: float) -> str:
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        print(f"\r\033[K  Emails sampled:   {len(full_rows)}")
+        if skipped:
+            print(f"  Skipped (unreadable): {skipped}")
+        print(f"  Body text:        {full_bytes / 1e6:.2f} MB -> {stripped_bytes / 1e6:.2f} MB "
+              f"({pct(stripped_bytes, full_bytes)})")
+        print(f"  FTS index:        {full_index / 1e6:.2f} MB -> {stripped_index / 1e6:.2f} MB "
+              f"({pct(stripped_index, full_index)})")
+
+        if queries:
+            full_ms = stripped_ms = 0.0
+            print(f"\n  {'Query (index terms)':<24} {'full':>9} {'stripped':>9}")
+            for query in queries:
+                try:
+                    a = _report_query_ms(full, query)
+                    b = _report_query_ms(stripped, query)
+                except sqlite3.OperationalError as e:
+                    print(f"  {query:<24} error: {e}")
+                    continue
+                full_ms += a
+                stripped_ms += b
+                print(f"  {query:<24} {a:>7.2f}ms {b:>7.2f}ms")
+            print(f"  {'Total':<24} {full_ms:>7.2f}ms {stripped_ms:>7.2f}ms ({pct(stripped_ms, full_ms)})")
+    finally:
+        full.close()
+        stripped.close()
+
+    print("\nSet 'index: {strip_quotes: true}' in config.yaml and run")
+    print("'ownmail rebuild --force' to index emails this way.\n")
+
+
 def cmd_sync_check(
     archive: EmailArchive,
     source_name: str = None,
@@ -1312,11 +1956,10 @@ def cmd_list_unknown(
                 print(f"    - {filename}")
                 # Try to extract date from email file
                 filepath = archive.archive_dir / filename
-                if filepath.exists():
+                if email_exists(filepath):
                     try:
                         import email
-                        with open(filepath, "rb") as f:
-                            msg = email.message_from_binary_file(f)
+                        msg = email.message_from_bytes(read_email(filepath))
                         date_header = msg.get("Date", "")
                         subject = msg.get("Subject", "")[:50]
                         print(f"      Date header: {date_header}")
@@ -3,6 +3,9 @@
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from ownmail.parser import INDEX_BODY_MAX_BYTES, INDEX_PART_MAX_BYTES
+from ownmail.storage import COMPRESSIONS, LAYOUTS
+
 # Optional YAML support
 try:
     from ownmail.yaml_util import load_yaml
@@ -91,6 +94,47 @@ def get_db_dir(config: Dict[str, Any]) -> Optional[Path]:
     return None
 
 
+def get_index_limits(config: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    """Get caps on indexed body text from the optional 'index' section.
+
+    index.max_body_kb and index.max_part_kb cap the body text indexed per
+    message and per MIME part; 0 removes a cap.
+
+    Args:
+        config: Full configuration dictionary
+
+    Returns:
+        Keyword arguments for EmailParser.parse_file (max_body_bytes,
+        max_part_bytes)
+    """
+    index_config = config.get("index") or {}
+    limits = {}
+    for key, arg, default in (
+        ("max_body_kb", "max_body_bytes", INDEX_BODY_MAX_BYTES),
+        ("max_part_kb", "max_part_bytes", INDEX_PART_MAX_BYTES),
+    ):
+        if key in index_config:
+            kb = int(index_config[key])
+            limits[arg] = kb * 1024 if kb > 0 else None
+        else:
+            limits[arg] = default
+    return limits
+
+
+def get_index_strip_quotes(config: Dict[str, Any]) -> bool:
+    """Whether quoted history and signatures are left out of the index.
+
+    Set with index.strip_quotes (see ownmail.normalize).
+
+    Args:
+        config: Full configuration dictionary
+
+    Returns:
+        True to pass body text through strip_quoted_text before indexing
+    """
+    return bool((config.get("index") or {}).get("strip_quotes", False))
+
+
 def get_sources(config: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Get list of source configurations.
 
@@ -209,5 +253,22 @@ def validate_config(config: Dict[str, Any]) -> List[str]:
             if "host" not in source:
                 errors.append(f"Source '{name}': IMAP requires 'host' field")
 
+        compression = source.get("compression")
+        if compression and compression not in COMPRESSIONS:
+            errors.append(f"Source '{name}': unsupported compression '{compression}'")
+
+        layout = source.get("layout")
+        if layout and layout not in LAYOUTS:
+            errors.append(f"Source '{name}': unsupported layout '{layout}'")
+
+    # Index size caps
+    index_config = config.get("index") or {}
+    for key in ("max_body_kb", "max_part_kb"):
+        value = index_config.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            errors.append(f"index.{key} must be a non-negative integer (0 for no limit)")
+    if not isinstance(index_config.get("strip_quotes", False), bool):
+        errors.append("index.strip_quotes must be true or false")
+
     return errors
 
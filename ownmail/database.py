@@ -3,12 +3,17 @@
 import hashlib
 import re
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from ownmail.query import parse_query
 
+# Retry queue for failed downloads: exponential backoff, then give up
+RETRY_BASE_DELAY = 60  # Seconds before the first retry
+RETRY_MAX_DELAY = 7 * 24 * 3600  # Backoff cap
+MAX_DOWNLOAD_ATTEMPTS = 10  # Poison messages are not retried after this
+
 
 class ArchiveDatabase:
     """SQLite database for tracking emails and full-text search.
@@ -16,6 +21,9 @@ class ArchiveDatabase:
     Schema:
     - emails: Track downloaded emails with email_id, provider_id, filename, hash, account
     - sync_state: Key-value store for per-account sync state
+    - download_backfill: Large messages deferred by two-phase download
+    - download_failures: Retry queue for failed downloads (with backoff)
+    - file_catalog: Stat and head digest of each email file when its hash last verified
     - emails_fts: FTS5 virtual table for full-text search
     """
 
@@ -110,6 +118,13 @@ class ArchiveDatabase:
             except sqlite3.OperationalError:
                 pass  # Column already exists
 
+            # Bytes of body text indexed when a size cap cut it short
+            # (NULL: the whole body is indexed)
+            try:
+                conn.execute("ALTER TABLE emails ADD COLUMN body_indexed_bytes INTEGER")
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+
             # Sync state for incremental backup (per-account)
             # Key format: "<account>/<key>" e.g., "alice@gmail.com/history_id"
             conn.execute("""
@@ -119,6 +134,50 @@ class ArchiveDatabase:
                 )
             """)
 
+            # Large messages deferred to a second download phase
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS download_backfill (
+                    account TEXT,
+                    provider_id TEXT,
+                    size INTEGER,
+                    queued_at TEXT,
+                    PRIMARY KEY (account, provider_id)
+                )
+            """)
+
+            # Failed downloads, retried with exponential backoff
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS download_failures (
+                    account TEXT,
+                    provider_id TEXT,
+                    attempts INTEGER,
+                    last_error TEXT,
+                    last_attempt_at TEXT,
+                    next_attempt_at TEXT,
+                    PRIMARY KEY (account, provider_id)
+                )
+            """)
+
+            # Stat cache for incremental verify: files whose stat still
+            # matches are only rehashed by the rolling scrub
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_catalog (
+                    filename TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    last_verified_at TEXT,
+                    head_digest TEXT
+                )
+            """)
+            try:
+                conn.execute("ALTER TABLE file_catalog ADD COLUMN head_digest TEXT")
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_file_catalog_verified ON file_catalog(last_verified_at)"
+            )
+
             # Full-text search index using FTS5 - contentless mode
             # We don't store body in emails table (too large), so use contentless FTS
             # This means we manually manage inserts/deletes in index_email()
@@ -182,6 +241,8 @@ class ArchiveDatabase:
             conn.execute("CREATE INDEX IF NOT EXISTS idx_emails_attachments_date ON emails(has_attachments, email_date DESC)")
             # Unique index for fast provider_id lookups and duplicate prevention
             conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_provider ON emails(account, provider_id)")
+            # Content-hash lookups (dedup hits that carry new labels)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_emails_account_hash ON emails(account, content_hash)")
 
             # Drop legacy single-column indexes replaced by composites or normalized tables
             conn.execute("DROP INDEX IF EXISTS idx_emails_labels")  # replaced by email_labels table
@@ -343,21 +404,32 @@ class ArchiveDatabase:
             ).fetchone()
             return result[0] if result else None
 
-    def set_sync_state(self, account: str, key: str, value: str) -> None:
+    def set_sync_state(
+        self, account: str, key: str, value: str, conn: sqlite3.Connection = None
+    ) -> None:
         """Set sync state value for an account.
 
         Args:
             account: Email address
             key: State key
             value: State value
+            conn: Optional existing connection (for batching)
         """
         state_key = f"{account}/{key}"
-        with sqlite3.connect(self.db_path) as conn:
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
             conn.execute(
                 "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
                 (state_key, value)
             )
-            conn.commit()
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
 
     def delete_sync_state(self, account: str, key: str) -> None:
         """Delete sync state value for an account.
@@ -467,6 +539,70 @@ class ArchiveDatabase:
             ).fetchall()
             return {row[0] for row in results}
 
+    def filter_new_ids(self, account: str, provider_ids: List[str]) -> List[str]:
+        """Return the provider IDs that have not been downloaded yet.
+
+        The candidates go into a temp table and are anti-joined against
+        the (account, provider_id) index, so memory stays flat no matter
+        how large the archive is (unlike get_downloaded_ids()).
+
+        Args:
+            account: Email address
+            provider_ids: Candidate provider IDs
+
+        Returns:
+            Not-yet-downloaded IDs, in their original order
+        """
+        if not provider_ids:
+            return []
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TEMP TABLE candidate_ids (pos INTEGER PRIMARY KEY, provider_id TEXT)"
+            )
+            conn.executemany(
+                "INSERT INTO candidate_ids (pos, provider_id) VALUES (?, ?)",
+                enumerate(provider_ids),
+            )
+            results = conn.execute(
+                """
+                SELECT c.provider_id FROM candidate_ids c
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM emails e
+                    WHERE e.account = ? AND e.provider_id = c.provider_id
+                )
+                ORDER BY c.pos
+                """,
+                (account,)
+            ).fetchall()
+            return [row[0] for row in results]
+
+    def has_content_hash(
+        self,
+        account: str,
+        content_hash: str,
+        conn: sqlite3.Connection = None,
+    ) -> bool:
+        """Check if an email with this content hash is already downloaded.
+
+        Args:
+            account: Email address
+            content_hash: SHA256 hash of file content
+            conn: Optional existing connection (sees uncommitted batch rows)
+        """
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM emails WHERE account = ? AND content_hash = ? LIMIT 1",
+                (account, content_hash)
+            ).fetchone()
+            return row is not None
+        finally:
+            if should_close:
+                conn.close()
+
     def get_email_by_id(self, email_id: str) -> Optional[tuple]:
         """Get email info by email_id.
 
@@ -484,6 +620,23 @@ class ArchiveDatabase:
             ).fetchone()
             return result
 
+    def get_body_indexed_bytes(self, email_id: str) -> Optional[int]:
+        """Get how much of an email's body is in the search index.
+
+        Args:
+            email_id: 24-char hex hash
+
+        Returns:
+            Indexed body length in bytes if a size cap cut the body short,
+            None if the whole body is indexed (or the email is unknown)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            result = conn.execute(
+                "SELECT body_indexed_bytes FROM emails WHERE email_id = ?",
+                (email_id,)
+            ).fetchone()
+            return result[0] if result else None
+
     def get_labels_for_email(self, email_id: str) -> list:
         """Get labels for an email from the email_labels table.
 
@@ -542,6 +695,356 @@ class ArchiveDatabase:
             if should_close:
                 conn.close()
 
+    def add_labels_by_content_hash(
+        self,
+        account: str,
+        content_hash: str,
+        labels: List[str],
+        conn: sqlite3.Connection = None,
+    ) -> None:
+        """Add labels to the already-downloaded email with this content hash.
+
+        Used when a download turns out to be a duplicate (e.g. a message moved
+        into another IMAP folder) so its labels are not lost.
+
+        Args:
+            account: Email address
+            content_hash: SHA256 hash of file content
+            labels: Labels to add
+            conn: Optional existing connection (for batching)
+        """
+        if not labels:
+            return
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
+            row = conn.execute(
+                "SELECT rowid, email_date FROM emails WHERE account = ? AND content_hash = ? LIMIT 1",
+                (account, content_hash)
+            ).fetchone()
+            if row:
+                for label in labels:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO email_labels (email_rowid, label, email_date) VALUES (?, ?, ?)",
+                        (row[0], label, row[1])
+                    )
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    def apply_label_changes(
+        self,
+        account: str,
+        changes: Dict[str, Dict[str, List[str]]],
+        conn: sqlite3.Connection = None,
+    ) -> int:
+        """Apply provider-reported label changes to downloaded emails.
+
+        Args:
+            account: Email address
+            changes: provider_id -> {"add": [labels], "remove": [labels]},
+                     or {"set": [labels]} to replace all labels
+            conn: Optional existing connection (for batching)
+
+        Returns:
+            Number of downloaded emails that were updated
+        """
+        if not changes:
+            return 0
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        updated = 0
+        try:
+            for provider_id, change in changes.items():
+                row = conn.execute(
+                    "SELECT rowid, email_date FROM emails WHERE account = ? AND provider_id = ?",
+                    (account, provider_id)
+                ).fetchone()
+                if not row:
+                    continue
+                rowid, email_date = row
+                if "set" in change:
+                    # Complete label set replaces whatever was stored
+                    conn.execute("DELETE FROM email_labels WHERE email_rowid = ?", (rowid,))
+                for label in change.get("remove", []):
+                    conn.execute(
+                        "DELETE FROM email_labels WHERE email_rowid = ? AND label = ?",
+                        (rowid, label)
+                    )
+                for label in change.get("set", []) + change.get("add", []):
+                    conn.execute(
+                        "INSERT OR IGNORE INTO email_labels (email_rowid, label, email_date) VALUES (?, ?, ?)",
+                        (rowid, label, email_date)
+                    )
+                updated += 1
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+        return updated
+
+    # -------------------------------------------------------------------------
+    # Download Backfill
+    # -------------------------------------------------------------------------
+
+    def queue_backfill(
+        self, account: str, sizes: Dict[str, int], conn: sqlite3.Connection = None
+    ) -> None:
+        """Queue large messages for the backfill phase of a download.
+
+        Args:
+            account: Email address
+            sizes: Dict mapping provider_id -> size in bytes
+            conn: Optional existing connection (for batching)
+        """
+        if not sizes:
+            return
+        now = datetime.now().isoformat()
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO download_backfill (account, provider_id, size, queued_at) VALUES (?, ?, ?, ?)",
+                [(account, pid, size, now) for pid, size in sizes.items()]
+            )
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    def get_backfill_ids(self, account: str) -> List[str]:
+        """Get queued backfill provider IDs for an account, smallest first."""
+        with sqlite3.connect(self.db_path) as conn:
+            results = conn.execute(
+                "SELECT provider_id FROM download_backfill WHERE account = ? ORDER BY size, provider_id",
+                (account,)
+            ).fetchall()
+            return [row[0] for row in results]
+
+    def remove_backfill(
+        self,
+        account: str,
+        provider_ids: List[str],
+        conn: sqlite3.Connection = None,
+    ) -> None:
+        """Remove messages from the backfill queue once they are handled.
+
+        Args:
+            account: Email address
+            provider_ids: Provider IDs to remove
+            conn: Optional existing connection (for batching)
+        """
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
+            conn.executemany(
+                "DELETE FROM download_backfill WHERE account = ? AND provider_id = ?",
+                [(account, pid) for pid in provider_ids]
+            )
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    # -------------------------------------------------------------------------
+    # Download Failures
+    # -------------------------------------------------------------------------
+
+    def record_download_failures(
+        self,
+        account: str,
+        errors: Dict[str, str],
+        conn: sqlite3.Connection = None,
+    ) -> None:
+        """Record failed downloads and schedule their next attempt.
+
+        The delay doubles with every attempt, from RETRY_BASE_DELAY up to
+        RETRY_MAX_DELAY.
+
+        Args:
+            account: Email address
+            errors: Dict mapping provider_id -> error message
+            conn: Optional existing connection (for batching)
+        """
+        if not errors:
+            return
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
+            now = datetime.now()
+            for provider_id, error in errors.items():
+                row = conn.execute(
+                    "SELECT attempts FROM download_failures WHERE account = ? AND provider_id = ?",
+                    (account, provider_id)
+                ).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+                conn.execute(
+                    """INSERT OR REPLACE INTO download_failures
+                       (account, provider_id, attempts, last_error, last_attempt_at, next_attempt_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (account, provider_id, attempts, str(error), now.isoformat(),
+                     (now + timedelta(seconds=delay)).isoformat())
+                )
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    def get_retry_ids(self, account: str) -> List[str]:
+        """Get failed downloads that are due for another attempt.
+
+        Messages that failed MAX_DOWNLOAD_ATTEMPTS times are left out.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            results = conn.execute(
+                """SELECT provider_id FROM download_failures
+                   WHERE account = ? AND attempts < ? AND next_attempt_at <= ?
+                   ORDER BY next_attempt_at""",
+                (account, MAX_DOWNLOAD_ATTEMPTS, datetime.now().isoformat())
+            ).fetchall()
+            return [row[0] for row in results]
+
+    def get_failed_ids(self, account: str) -> set:
+        """Get all provider IDs in the retry queue, due or not."""
+        with sqlite3.connect(self.db_path) as conn:
+            results = conn.execute(
+                "SELECT provider_id FROM download_failures WHERE account = ?",
+                (account,)
+            ).fetchall()
+            return {row[0] for row in results}
+
+    def get_download_failures(self, account: str) -> List[Tuple[str, int, str, str]]:
+        """Get the retry queue for an account.
+
+        Returns:
+            List of (provider_id, attempts, last_error, next_attempt_at)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(
+                """SELECT provider_id, attempts, last_error, next_attempt_at
+                   FROM download_failures WHERE account = ? ORDER BY provider_id""",
+                (account,)
+            ).fetchall()
+
+    def get_exhausted_failures(self, account: str) -> List[Tuple[str, int, str]]:
+        """Get failed downloads that will no longer be retried.
+
+        Returns:
+            List of (provider_id, attempts, last_error) for messages that
+            failed MAX_DOWNLOAD_ATTEMPTS times
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(
+                """SELECT provider_id, attempts, last_error
+                   FROM download_failures WHERE account = ? AND attempts >= ?
+                   ORDER BY provider_id""",
+                (account, MAX_DOWNLOAD_ATTEMPTS)
+            ).fetchall()
+
+    def reset_exhausted_failures(self, account: str) -> int:
+        """Put failed downloads that were given up on back in the retry queue.
+
+        Returns:
+            Number of messages that will be retried on the next download
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute(
+                """UPDATE download_failures SET attempts = 0, next_attempt_at = ?
+                   WHERE account = ? AND attempts >= ?""",
+                (datetime.now().isoformat(), account, MAX_DOWNLOAD_ATTEMPTS)
+            )
+            return cursor.rowcount
+
+    def clear_download_failures(
+        self,
+        account: str,
+        provider_ids: List[str],
+        conn: sqlite3.Connection = None,
+    ) -> None:
+        """Remove messages from the retry queue after they were handled.
+
+        Args:
+            account: Email address
+            provider_ids: Provider IDs to remove
+            conn: Optional existing connection (for batching)
+        """
+        should_close = conn is None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+
+        try:
+            conn.executemany(
+                "DELETE FROM download_failures WHERE account = ? AND provider_id = ?",
+                [(account, pid) for pid in provider_ids]
+            )
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    # -------------------------------------------------------------------------
+    # File Catalog
+    # -------------------------------------------------------------------------
+
+    def get_scrub_filenames(self, limit: int) -> set:
+        """Get the catalogued files verified longest ago."""
+        if limit <= 0:
+            return set()
+        with sqlite3.connect(self.db_path) as conn:
+            results = conn.execute(
+                "SELECT filename FROM file_catalog ORDER BY last_verified_at LIMIT ?",
+                (limit,)
+            ).fetchall()
+            return {row[0] for row in results}
+
+    def update_file_catalog(
+        self,
+        verified: List[Tuple[str, int, int, int, str]],
+        stale: List[str],
+    ) -> None:
+        """Record verified files and forget ones that failed or moved.
+
+        Args:
+            verified: (filename, size, mtime_ns, inode, head_digest) of
+                      files whose hash was just checked and matched
+            stale: Filenames to drop (missing or corrupted)
+        """
+        now = datetime.now().isoformat()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO file_catalog
+                   (filename, size, mtime_ns, inode, head_digest, last_verified_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(*entry, now) for entry in verified]
+            )
+            conn.executemany(
+                "DELETE FROM file_catalog WHERE filename = ?",
+                [(filename,) for filename in stale]
+            )
+            # Rows left behind by relayout, unpack or deleted emails
+            conn.execute(
+                "DELETE FROM file_catalog WHERE filename NOT IN (SELECT filename FROM emails)"
+            )
+            conn.commit()
+
     # -------------------------------------------------------------------------
     # Full-Text Search
     # -------------------------------------------------------------------------
@@ -559,6 +1062,7 @@ class ArchiveDatabase:
         labels: str = "",
         skip_delete: bool = False,
         email_date: str = None,
+        body_indexed_bytes: int = None,
     ) -> None:
         """Add email to search index by updating emails table metadata and FTS.
 
@@ -569,6 +1073,7 @@ class ArchiveDatabase:
             conn: Optional existing connection (for batching)
             skip_delete: Ignored (kept for API compatibility)
             email_date: ISO-formatted UTC date string (populates email_date if NULL)
+            body_indexed_bytes: Indexed body length if capped (None: full body)
         """
         should_close = conn is None
         if conn is None:
@@ -610,10 +1115,12 @@ class ArchiveDatabase:
                     snippet = ?,
                     sender_email = ?,
                     has_attachments = ?,
-                    email_date = COALESCE(email_date, ?)
+                    email_date = COALESCE(email_date, ?),
+                    body_indexed_bytes = ?
                 WHERE email_id = ?
                 """,
-                (subject, sender, recipients, date_str, snippet, sender_email, has_attachments, email_date, email_id)
+                (subject, sender, recipients, date_str, snippet, sender_email, has_attachments, email_date,
+                 body_indexed_bytes, email_id)
             )
 
             # Update normalized recipients table for fast lookups
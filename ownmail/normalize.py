@@ -0,0 +1,129 @@
+"""Index normalizer: drop quoted history and signatures from body text.
+
+With ``index: {strip_quotes: true}``, the body text of each email is passed
+through strip_quoted_text() after EmailParser.parse_file and before it is
+written to the search index. A reply chain then indexes each paragraph
+once, in the email that wrote it, instead of once per reply that quotes
+it. Only the index is affected: the .eml file is never touched.
+
+Removed, in plain-text bodies:
+
+- quoted lines (``> ...``) and the attribution line introducing them
+  (``On <date>, <name> wrote:``, and its equivalents in other languages)
+- everything after an Outlook-style ``-----Original Message-----`` or
+  ``From:``/``Sent:``/``Subject:`` header block
+- a signature after the ``-- `` delimiter, if it is signature-sized
+- ``Sent from my ...`` mobile footers
+
+Forwarded messages are kept: the forward may be the only copy of that
+text in the archive. A forward is recognised by Gmail's ``Forwarded
+message`` marker, Apple Mail's ``Begin forwarded message:``, or a quoted
+header block whose subject starts with ``FW:``/``Fwd:`` (Outlook). If
+stripping would leave nothing, the body is kept as it was.
+"""
+
+import re
+
+# A signature is at most this many lines after the "-- " delimiter;
+# longer tails are more likely content than a signature
+SIGNATURE_MAX_LINES = 10
+
+_QUOTE_RE = re.compile(r"^\s*>")
+_ATTRIBUTION_RE = re.compile(
+    r"(?:wrote|writes|a écrit|schrieb|escribió|ha scritto|schreef|napisał|написал(?:\(а\)|а)?"
+    r"|작성|寫道|写道|のメッセージ|が書きました)\s*[:：]\s*$",
+    re.IGNORECASE,
+)
+_WRAPPED_ATTRIBUTION_RE = re.compile(r"^\s*(?:On|Le|Am|El|Il|Op)\s", re.IGNORECASE)
+_ORIGINAL_MESSAGE_RE = re.compile(r"^\s*-{3,}\s*Original Message\s*-{3,}\s*$", re.IGNORECASE)
+_FORWARD_RE = re.compile(
+    r"^\s*(?:-{3,}\s*Forwarded message\s*-{3,}|Begin forwarded message:)\s*$", re.IGNORECASE
+)
+_FORWARD_SUBJECT_RE = re.compile(r"^\s*\*?Subject\*?:\s*(?:FW|Fwd)\s*:", re.IGNORECASE)
+_HEADER_BLOCK_RE = re.compile(r"^\s*\*?(From|Sent|Date|To|Cc|Subject)\*?:\s", re.IGNORECASE)
+_SIGNATURE_RE = re.compile(r"^--\s?$")
+_MOBILE_FOOTER_RE = re.compile(r"^\s*Sent from my [\w .-]+$", re.IGNORECASE)
+
+
+def _is_header_block(lines: list, start: int) -> bool:
+    """Whether lines[start] opens an Outlook-style quoted header block."""
+    if not re.match(r"^\s*\*?From\*?:\s", lines[start], re.IGNORECASE):
+        return False
+    fields = set()
+    for line in lines[start + 1:start + 6]:
+        match = _HEADER_BLOCK_RE.match(line)
+        if match:
+            fields.add(match.group(1).lower())
+    return bool(fields & {"sent", "date"}) and "subject" in fields
+
+
+def _is_forward(lines: list, start: int) -> bool:
+    """Whether the header block (or original-message line) at lines[start]
+    introduces a forward rather than reply history."""
+    previous = _previous_content_line(lines, start)
+    if previous >= 0 and _FORWARD_RE.match(lines[previous]):
+        return True
+    return any(_FORWARD_SUBJECT_RE.match(line) for line in lines[start:start + 7])
+
+
+def _previous_content_line(lines: list, index: int) -> int:
+    """Index of the last non-blank line before index, or -1."""
+    index -= 1
+    while index >= 0 and not lines[index].strip():
+        index -= 1
+    return index
+
+
+def strip_quoted_text(body: str) -> str:
+    """Remove quoted history and signatures from plain body text.
+
+    Args:
+        body: Body text as extracted by EmailParser.parse_file
+
+    Returns:
+        The body without quoted replies, attribution lines, Outlook
+        original-message blocks and signatures
+    """
+    if not body:
+        return body
+    lines = body.split("\n")
+
+    # Cut at the first Outlook-style original message, unless it is
+    # part of a forward
+    for i, line in enumerate(lines):
+        if _ORIGINAL_MESSAGE_RE.match(line) or _is_header_block(lines, i):
+            if _is_forward(lines, i):
+                break
+            lines = lines[:i]
+            # A separator line of underscores often precedes the block
+            while lines and (not lines[-1].strip() or set(lines[-1].strip()) == {"_"}):
+                lines.pop()
+            break
+
+    kept = []
+    for line in lines:
+        if _QUOTE_RE.match(line):
+            # Drop the attribution line introducing this quote block,
+            # including the line before it if the attribution wrapped
+            j = len(kept) - 1
+            while j >= 0 and not kept[j].strip():
+                j -= 1
+            if j >= 0 and _ATTRIBUTION_RE.search(kept[j]):
+                if j > 0 and kept[j - 1].strip() and _WRAPPED_ATTRIBUTION_RE.match(kept[j - 1]) \
+                        and not _WRAPPED_ATTRIBUTION_RE.match(kept[j]):
+                    j -= 1
+                del kept[j:]
+            continue
+        if _MOBILE_FOOTER_RE.match(line):
+            continue
+        kept.append(line)
+
+    # Signature: the last "-- " delimiter, if what follows is short
+    for i in range(len(kept) - 1, -1, -1):
+        if _SIGNATURE_RE.match(kept[i]):
+            if len([line for line in kept[i + 1:] if line.strip()]) <= SIGNATURE_MAX_LINES:
+                del kept[i:]
+            break
+
+    text = "\n".join(kept).strip()
+    return text if text else body
@@ -4,10 +4,14 @@ import email
 import email.utils
 import html
 import re
+import threading
+from collections import OrderedDict
 from email.policy import default as email_policy
 from pathlib import Path
 
-from lxml import html as lxml_html
+from lxml import etree
+
+from ownmail.storage import read_email
 
 # Regex to extract charset from HTML meta tag
 HTML_CHARSET_RE = re.compile(
@@ -45,6 +49,17 @@ STYLE_TAG_RE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL | re.IGNORECASE)
 SCRIPT_TAG_RE = re.compile(r'<script[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE)
 HTML_TAG_RE = re.compile(r'<[^>]+>')
 
+# Caps on indexed body text, in UTF-8 bytes, per message and per MIME part.
+# Multi-megabyte log dumps and newsletters cost parse time and index size
+# for little search value. None means no cap.
+INDEX_BODY_MAX_BYTES = 1024 * 1024
+INDEX_PART_MAX_BYTES = 256 * 1024
+# HTML is fed to the parser in chunks of this many chars, so a capped
+# conversion stops soon after the cap
+HTML_FEED_CHARS = 64 * 1024
+# Elements whose text is not visible
+HTML_SKIP_TAGS = frozenset({"style", "script", "head", "noscript"})
+
 # Charset mapping for known aliases (used in charset detection)
 CHARSET_MAP = {
     'ks_c_5601-1987': 'cp949',
@@ -53,6 +68,31 @@ CHARSET_MAP = {
     'euc-kr': 'cp949',  # Treat EUC-KR as CP949 (superset)
 }
 
+# Characters _validate_decoded_text does not count as readable
+UNREADABLE_CHAR_RE = re.compile(
+    '[^\t\n\r\x20-\x7e\x80-\xff'
+    '\u200b-\u200d\u2060\ufeff'  # Zero-width chars, word joiner, BOM
+    '\u1100-\u11ff'  # Hangul Jamo
+    '\u3000-\u303f\u3040-\u309f\u30a0-\u30ff'  # CJK punctuation, kana
+    '\u4e00-\u9fff\uac00-\ud7af'  # CJK ideographs, Hangul syllables
+    '\uff00-\uffef]'  # Fullwidth forms
+)
+_HIGH_BYTES = bytes(range(0x80, 0x100))
+
+# Codecs tried, in order, on non-ASCII text whose declared charset is
+# missing or wrong
+CJK_DETECTION_ENCODINGS = [
+    'utf-8', 'cp949', 'euc-kr', 'gb2312', 'gbk',
+    'big5', 'shift_jis', 'euc-jp',
+]
+
+# Decode strategies learned per (declared charset, List-Id or sender
+# domain): mislabeled mail keeps coming from the same senders, so the
+# codec that worked last time is tried right after UTF-8
+DECODE_STRATEGY_CACHE_SIZE = 4096
+_decode_strategies: OrderedDict = OrderedDict()
+_decode_strategies_lock = threading.Lock()
+
 # Default encoding fallback chain for CJK and Cyrillic support
 DEFAULT_ENCODING_CHAIN = [
     'utf-8', 'cp949', 'euc-kr', 'gb2312', 'shift_jis',
@@ -104,6 +144,107 @@ def _detect_charset(raw_bytes: bytes, declared_charset: str = None) -> str:
     return 'utf-8'
 
 
+def count_high_bytes(data: bytes) -> int:
+    """Count non-ASCII bytes (done in C by bytes.translate)."""
+    return len(data) - len(data.translate(None, _HIGH_BYTES))
+
+
+def decode_strategy_key(msg) -> str | None:
+    """Sender identity for the decode-strategy cache.
+
+    The List-Id for mailing lists (one list, one mail setup), otherwise
+    the domain of the From address.
+    """
+    try:
+        list_id = msg.get("List-Id")
+        if list_id:
+            return str(list_id).strip().lower()
+        _name, address = email.utils.parseaddr(str(msg.get("From", "")))
+    except Exception:
+        return None
+    domain = address.rpartition("@")[2].strip().lower()
+    return domain or None
+
+
+def get_decode_strategy(declared_charset: str | None, sender_key: str | None) -> str | None:
+    """Codec that last decoded this sender's text with this declared charset."""
+    if not sender_key:
+        return None
+    key = ((declared_charset or "").lower(), sender_key)
+    with _decode_strategies_lock:
+        codec = _decode_strategies.get(key)
+        if codec is not None:
+            _decode_strategies.move_to_end(key)
+        return codec
+
+
+def remember_decode_strategy(declared_charset: str | None, sender_key: str | None, codec: str) -> None:
+    """Record the codec that decoded a sender's non-ASCII text."""
+    if not sender_key:
+        return
+    key = ((declared_charset or "").lower(), sender_key)
+    with _decode_strategies_lock:
+        _decode_strategies[key] = codec
+        _decode_strategies.move_to_end(key)
+        if len(_decode_strategies) > DECODE_STRATEGY_CACHE_SIZE:
+            _decode_strategies.popitem(last=False)
+
+
+def detection_order(declared_charset: str | None, sender_key: str | None) -> list:
+    """Codecs to try on non-ASCII text, learned codec first after UTF-8.
+
+    UTF-8 stays first: valid UTF-8 is almost never anything else, while a
+    legacy double-byte codec will happily decode some UTF-8 text.
+    """
+    cached = get_decode_strategy(declared_charset, sender_key)
+    if not cached or cached == 'utf-8':
+        return CJK_DETECTION_ENCODINGS
+    return ['utf-8', cached] + [
+        enc for enc in CJK_DETECTION_ENCODINGS[1:] if enc != cached
+    ]
+
+
+def _truncate_utf8(text: str, max_bytes: int) -> tuple:
+    """Cut text to at most max_bytes of UTF-8, on a character boundary.
+
+    Returns:
+        (text, UTF-8 byte length of the returned text)
+    """
+    data = text.encode("utf-8", errors="ignore")
+    if len(data) <= max_bytes:
+        return text, len(data)
+    text = data[:max_bytes].decode("utf-8", errors="ignore")
+    return text, len(text.encode("utf-8"))
+
+
+class _HtmlTextTarget:
+    """lxml parser target collecting visible text in document order."""
+
+    def __init__(self):
+        self.parts = []
+        self.chars = 0
+        self._skip_depth = 0
+
+    def start(self, tag, attrib):
+        if self._skip_depth or tag in HTML_SKIP_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        if self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+            self.chars += len(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return "".join(self.parts)
+
+
 def _decode_grouped_rfc2047_parts(parts: list, fallback_charset: str = None) -> str:
     """Decode RFC 2047 encoded-word parts, handling split multi-byte characters.
 
@@ -192,45 +333,14 @@ def _validate_decoded_text(text: str, min_readable_ratio: float = 0.7) -> bool:
     if '\ufffd' in text:
         return False
 
-    # Count readable vs unreadable characters
-    readable = 0
-    total = 0
-
-    for char in text[:1000]:  # Sample first 1000 chars
-        code = ord(char)
-        total += 1
-
-        # Consider readable:
-        # - ASCII printable (0x20-0x7E)
-        # - Common whitespace (tab, newline, carriage return)
-        # - Latin extended (0x80-0xFF) - accented chars
-        # - Zero-width characters (U+200B-U+200D, U+FEFF) - used in emails
-        # - CJK characters (Chinese, Japanese, Korean)
-        #   - CJK Unified Ideographs: U+4E00-U+9FFF
-        #   - Hangul Syllables: U+AC00-U+D7AF
-        #   - Hangul Jamo: U+1100-U+11FF
-        #   - Hiragana: U+3040-U+309F
-        #   - Katakana: U+30A0-U+30FF
-        # - Common punctuation and symbols
-
-        if (0x20 <= code <= 0x7E or  # ASCII printable
-            code in (0x09, 0x0A, 0x0D) or  # tab, newline, CR
-            0x80 <= code <= 0xFF or  # Latin extended
-            0x200B <= code <= 0x200D or  # Zero-width space/non-joiner/joiner
-            code == 0xFEFF or  # BOM / zero-width no-break space
-            code == 0x00AD or  # Soft hyphen
-            code == 0x2060 or  # Word joiner
-            0x4E00 <= code <= 0x9FFF or  # CJK Unified Ideographs
-            0xAC00 <= code <= 0xD7AF or  # Hangul Syllables
-            0x1100 <= code <= 0x11FF or  # Hangul Jamo
-            0x3040 <= code <= 0x309F or  # Hiragana
-            0x30A0 <= code <= 0x30FF or  # Katakana
-            0x3000 <= code <= 0x303F or  # CJK Punctuation
-            0xFF00 <= code <= 0xFFEF):   # Fullwidth forms
-            readable += 1
-
+    # Readable: ASCII printable and whitespace, Latin-1, zero-width
+    # characters used in emails, CJK, Hangul, kana and fullwidth forms
+    # (see UNREADABLE_CHAR_RE). Counted by a regex over a 1000-char sample.
+    sample = text[:1000]
+    total = len(sample)
     if total == 0:
         return True  # Empty is fine
+    readable = total - len(UNREADABLE_CHAR_RE.findall(sample))
 
     return (readable / total) >= min_readable_ratio
 
@@ -263,39 +373,63 @@ class EmailParser:
         return result.strip()
 
     @staticmethod
-    def _extract_raw_header(content: bytes, header_name: str, charset: str = None) -> str:
-        """Extract a header directly from raw email bytes.
+    def _split_raw_headers(content: bytes) -> dict:
+        """Split the raw header block into {lowercase name: raw value}.
 
-        This is used when the email library corrupts non-ASCII headers.
+        The block is located once (up to the first empty line) and only
+        it is scanned. Continuation lines are joined with spaces. For a
+        repeated header the first occurrence wins (plus any copies that
+        directly follow it), as in the line-by-line scan this replaces.
         """
-        header_prefix = f"{header_name}:".encode('ascii')
-        header_prefix_lower = header_prefix.lower()
-
-        lines = content.split(b'\r\n')
-        if len(lines) == 1:
-            lines = content.split(b'\n')
+        first_nl = content.find(b'\n')
+        if first_nl > 0 and content[first_nl - 1:first_nl] == b'\r':
+            sep, end = b'\r\n', content.find(b'\r\n\r\n')
+        else:
+            sep, end = b'\n', content.find(b'\n\n')
+        if content.startswith(sep):
+            return {}
+        block = content if end == -1 else content[:end]
+
+        headers = {}
+        name = None
+        for line in block.split(sep):
+            if line == b'':
+                break
+            if line.startswith((b' ', b'\t')):
+                if name is not None:
+                    headers[name].append(line.strip())
+                continue
+            colon = line.find(b':')
+            if colon == -1:
+                name = None
+                continue
+            line_name = line[:colon].lower()
+            if line_name in headers and line_name != name:
+                name = None  # Later occurrence: keep the first
+                continue
+            name = line_name
+            headers.setdefault(name, []).append(line[colon + 1:].strip())
+        return {key: b' '.join(values) for key, values in headers.items()}
 
-        value_lines = []
-        in_header = False
+    @staticmethod
+    def _extract_raw_header(
+        content: bytes,
+        header_name: str,
+        charset: str = None,
+        raw_headers: dict = None,
+    ) -> str:
+        """Extract a header directly from raw email bytes.
 
-        for line in lines:
-            if line == b'':
-                break  # End of headers
-
-            if line.lower().startswith(header_prefix_lower):
-                in_header = True
-                value_lines.append(line[len(header_prefix):].strip())
-            elif in_header and line.startswith((b' ', b'\t')):
-                # Continuation line
-                value_lines.append(line.strip())
-            elif in_header:
-                break  # Next header
-
-        if not value_lines:
+        This is used when the email library corrupts non-ASCII headers.
+        Pass raw_headers (from _split_raw_headers) to avoid rescanning
+        content for every header.
+        """
+        if raw_headers is None:
+            raw_headers = EmailParser._split_raw_headers(content)
+        raw_value = raw_headers.get(header_name.lower().encode('ascii'))
+        if not raw_value:
             return ""
 
-        raw_value = b' '.join(value_lines)
-
         # Try to decode with various charsets
         charsets = ['utf-8', 'cp949', 'euc-kr', 'iso-8859-1']
         if charset:
@@ -382,6 +516,7 @@ class EmailParser:
         header_name: str,
         fallback_charset: str = None,
         raw_content: bytes = None,
+        raw_headers: dict = None,
     ) -> str:
         """Safely extract a header, handling encoding errors.
 
@@ -390,6 +525,8 @@ class EmailParser:
             header_name: Name of header to extract
             fallback_charset: Charset to try for decoding
             raw_content: Raw email bytes for fallback extraction
+            raw_headers: raw_content's header map (_split_raw_headers),
+                         shared across calls for the same message
         """
         try:
             val = msg.get(header_name, "") or ""
@@ -404,7 +541,7 @@ class EmailParser:
             # This handles cases where the email library corrupts split multi-byte chars
             if raw_content and has_issues:
                 raw_decoded = EmailParser._extract_raw_header(
-                    raw_content, header_name, fallback_charset
+                    raw_content, header_name, fallback_charset, raw_headers
                 )
                 if raw_decoded and '\ufffd' not in raw_decoded:
                     # If raw extraction returned RFC 2047 encoded string, decode it
@@ -422,7 +559,7 @@ class EmailParser:
             if raw_content:
                 try:
                     raw_decoded = EmailParser._extract_raw_header(
-                        raw_content, header_name, fallback_charset
+                        raw_content, header_name, fallback_charset, raw_headers
                     )
                     if raw_decoded:
                         return EmailParser._sanitize_header(raw_decoded)
@@ -524,14 +661,19 @@ class EmailParser:
             return ""
 
     @staticmethod
-    def _safe_get_content(part) -> str:
-        """Safely extract content from a message part."""
+    def _safe_get_content(part, sender_key: str = None) -> str:
+        """Safely extract content from a message part.
+
+        sender_key (see decode_strategy_key) enables the decode-strategy
+        cache: when the declared charset fails on non-ASCII text, the codec
+        that worked for this sender before is tried right after UTF-8.
+        """
         try:
             # First, try to get raw bytes and decode with proper charset
             payload = part.get_payload(decode=True)
             if payload and isinstance(payload, bytes):
-                # Check header charset first, but validate the result
                 header_charset = part.get_content_charset()
+                # Check header charset first, but validate the result
                 if header_charset:
                     charset = CHARSET_ALIASES.get(header_charset.lower(), header_charset)
                     try:
@@ -561,16 +703,15 @@ class EmailParser:
 
                 # No charset specified or it was wrong - try smart detection
                 # Sample more bytes since CJK content may not appear until later
-                sample_size = min(len(payload), 4000)
-                high_bytes = sum(1 for b in payload[:sample_size] if b >= 0x80)
+                high_bytes = count_high_bytes(payload[:4000])
 
                 if high_bytes > 10:
                     # Has significant non-ASCII content - try various encodings
                     # and validate the result makes sense
-                    for encoding in ['utf-8', 'cp949', 'euc-kr', 'gb2312', 'gbk',
-                                     'big5', 'shift_jis', 'euc-jp']:
+                    for encoding in detection_order(header_charset, sender_key):
                         result = _try_decode(payload, encoding)
                         if result is not None:
+                            remember_decode_strategy(header_charset, sender_key, encoding)
                             return EmailParser._strip_embedded_mime_headers(result)
 
                 # Try common encodings with validation
@@ -606,24 +747,27 @@ class EmailParser:
         )
 
     @staticmethod
-    def _strip_html(html_content: str) -> str:
+    def _strip_html(html_content: str, max_chars: int = None) -> str:
         """Strip HTML tags and extract text content.
 
-        Uses lxml to properly parse HTML and extract only visible text,
-        correctly handling style/script blocks and malformed HTML.
+        Streams the HTML through lxml's parser, keeping only visible text
+        (style/script/head/noscript are skipped) and handling malformed
+        HTML. With max_chars, feeding stops once that much text has been
+        collected, so a giant part is not parsed in full; the result may
+        still be longer than max_chars.
         """
         try:
-            # Parse HTML with lxml (handles malformed HTML well)
-            tree = lxml_html.fromstring(html_content)
-
-            # Remove elements that shouldn't contribute text
-            for element in tree.xpath('//style | //script | //head | //noscript'):
-                parent = element.getparent()
-                if parent is not None:
-                    parent.remove(element)
-
-            # Extract text content
-            text = tree.text_content()
+            target = _HtmlTextTarget()
+            parser = etree.HTMLParser(target=target)
+            for start in range(0, len(html_content), HTML_FEED_CHARS):
+                parser.feed(html_content[start:start + HTML_FEED_CHARS])
+                if max_chars is not None and target.chars >= max_chars:
+                    break
+            try:
+                text = parser.close()
+            except etree.XMLSyntaxError:
+                # Empty document - nothing was collected
+                text = target.close()
 
             # Normalize whitespace
             return ' '.join(text.split())
@@ -636,15 +780,25 @@ class EmailParser:
             return ' '.join(text.split())
 
     @staticmethod
-    def parse_file(filepath: Path = None, content: bytes = None) -> dict:
+    def parse_file(
+        filepath: Path = None,
+        content: bytes = None,
+        max_body_bytes: int = INDEX_BODY_MAX_BYTES,
+        max_part_bytes: int = INDEX_PART_MAX_BYTES,
+    ) -> dict:
         """Parse an .eml file and extract searchable content.
 
         Args:
-            filepath: Path to .eml file (reads from disk)
+            filepath: Path to .eml or .eml.zst file (reads from disk)
             content: Raw email bytes (avoids disk read if already loaded)
+            max_body_bytes: Cap on body text (UTF-8 bytes), None for no cap
+            max_part_bytes: Cap on the text taken from each MIME part,
+                None for no cap
 
         Returns:
-            Dictionary with keys: subject, sender, recipients, date_str, body, attachments
+            Dictionary with keys: subject, sender, recipients, date_str, body,
+            attachments, body_indexed_bytes (length of the body in bytes
+            if a cap cut it short, else None)
         """
         try:
             raw_content = None
@@ -652,8 +806,7 @@ class EmailParser:
                 raw_content = content
                 msg = email.message_from_bytes(content, policy=email_policy)
             elif filepath is not None:
-                with open(filepath, "rb") as f:
-                    raw_content = f.read()
+                raw_content = read_email(filepath)
                 msg = email.message_from_bytes(raw_content, policy=email_policy)
             else:
                 raise ValueError("Must provide filepath or content")
@@ -666,6 +819,7 @@ class EmailParser:
                 "date_str": "",
                 "body": f"[Parse error: {e}]",
                 "attachments": "",
+                "body_indexed_bytes": None,
             }
 
         # Extract headers safely
@@ -676,18 +830,24 @@ class EmailParser:
         except Exception:
             pass
 
-        subject = EmailParser._safe_get_header(msg, "Subject", content_charset, raw_content)
-        sender = EmailParser._safe_get_header(msg, "From", content_charset, raw_content)
+        # Raw header map for fallback decoding: the header block is split
+        # once here rather than rescanned for every header
+        raw_headers = EmailParser._split_raw_headers(raw_content)
+
+        subject = EmailParser._safe_get_header(msg, "Subject", content_charset, raw_content, raw_headers)
+        sender = EmailParser._safe_get_header(msg, "From", content_charset, raw_content, raw_headers)
 
         # Combine all recipient fields
         recipients = []
         for header in ["To", "Cc", "Bcc"]:
-            val = EmailParser._safe_get_header(msg, header, content_charset, raw_content)
+            val = EmailParser._safe_get_header(msg, header, content_charset, raw_content, raw_headers)
             if val:
                 recipients.append(val)
         recipients_str = ", ".join(recipients)
 
-        date_str = EmailParser._safe_get_header(msg, "Date", raw_content=raw_content)
+        date_str = EmailParser._safe_get_header(
+            msg, "Date", raw_content=raw_content, raw_headers=raw_headers
+        )
 
         # If no Date header, try to extract from Received header
         if not date_str:
@@ -696,9 +856,38 @@ class EmailParser:
         # Try to parse and normalize the date to avoid garbled weekday names
         date_str = EmailParser._normalize_date(date_str)
 
-        # Extract body text
+        # Extract body text, up to the caps
         body_parts = []
+        body_bytes = 0
+        truncated = False
         attachments = []
+        sender_key = decode_strategy_key(msg)
+
+        def text_limit():
+            """Bytes of text the next part may add, or None for no cap."""
+            limit = max_part_bytes
+            if max_body_bytes is not None:
+                room = max_body_bytes - body_bytes - (1 if body_parts else 0)
+                limit = room if limit is None else min(limit, room)
+            return limit
+
+        def add_body_text(text: str) -> None:
+            nonlocal body_bytes, truncated
+            limit = text_limit()
+            if limit is None:
+                size = len(text.encode("utf-8", errors="ignore"))
+            else:
+                clipped, size = _truncate_utf8(text, max(limit, 0))
+                if len(clipped) < len(text):
+                    truncated = True
+                    text = clipped
+            if text:
+                body_bytes += size + (1 if body_parts else 0)
+                body_parts.append(text)
+
+        def body_full() -> bool:
+            limit = text_limit()
+            return limit is not None and limit <= 0
 
         try:
             if msg.is_multipart():
@@ -718,24 +907,28 @@ class EmailParser:
 
                         # Extract text content
                         if content_type == "text/plain":
-                            text = EmailParser._safe_get_content(part)
+                            if body_full():
+                                # Not decoded: the cap is already reached
+                                truncated = True
+                                continue
+                            text = EmailParser._safe_get_content(part, sender_key)
                             if text:
-                                body_parts.append(text)
+                                add_body_text(text)
                         elif content_type == "text/html" and not body_parts:
                             # Only use HTML if no plain text
-                            text = EmailParser._safe_get_content(part)
+                            text = EmailParser._safe_get_content(part, sender_key)
                             if text:
                                 # Strip HTML for indexing
-                                text = EmailParser._strip_html(text)
-                                body_parts.append(text)
+                                text = EmailParser._strip_html(text, text_limit())
+                                add_body_text(text)
                     except Exception:
                         continue
             else:
-                text = EmailParser._safe_get_content(msg)
+                text = EmailParser._safe_get_content(msg, sender_key)
                 if text:
                     if msg.get_content_type() == "text/html":
-                        text = EmailParser._strip_html(text)
-                    body_parts.append(text)
+                        text = EmailParser._strip_html(text, text_limit())
+                    add_body_text(text)
         except Exception:
             pass
 
@@ -746,4 +939,5 @@ class EmailParser:
             "date_str": date_str,
             "body": "\n".join(body_parts),
             "attachments": ", ".join(attachments),
+            "body_indexed_bytes": body_bytes if truncated else None,
         }
@@ -1,7 +1,8 @@
 """Abstract base class for email providers."""
 
+import time
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 
 class EmailProvider(ABC):
@@ -93,7 +94,9 @@ class EmailProvider(ABC):
 
         Returns:
             Tuple of (raw_email_bytes, labels):
-            - raw_email_bytes: Raw RFC 2822 email content
+            - raw_email_bytes: Raw RFC 2822 email content, or a Path to a
+              temp file the caller takes over (providers that stream
+              large messages to a spool_dir)
             - labels: List of labels/folders (provider-specific)
 
         Raises:
@@ -114,3 +117,35 @@ class EmailProvider(ABC):
             Provider-specific sync state string, or None if not available
         """
         ...
+
+    def wait_for_changes(self, timeout: float, stop_event=None) -> bool:
+        """Block until the mailbox may have changed (watch mode).
+
+        Providers with push or cheap change detection (IMAP IDLE, Gmail
+        history) override this. The default just waits out the timeout.
+
+        Args:
+            timeout: Maximum seconds to wait
+            stop_event: Optional threading.Event that ends the wait early
+
+        Returns:
+            True if a change was seen or can't be ruled out, False if
+            nothing changed before the timeout or the wait was stopped
+        """
+        if stop_event is not None:
+            return not stop_event.wait(timeout)
+        time.sleep(timeout)
+        return True
+
+    def get_label_changes(self) -> Dict[str, Dict[str, List[str]]]:
+        """Get label changes for already-downloaded messages.
+
+        Providers that can track changes (e.g. IMAP with CONDSTORE/QRESYNC)
+        report them here after get_new_message_ids(). The default is no
+        changes.
+
+        Returns:
+            Dict mapping provider ID -> {"add": [labels], "remove": [labels]},
+            or {"set": [labels]} when the complete label set is known
+        """
+        return {}
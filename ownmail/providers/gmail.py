@@ -22,8 +22,11 @@ SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 # - "Too many concurrent requests" error at high batch sizes
 # - 15,000 quota units/min, messages.get = 5 units = 3,000 msg/min max
 # Conservative settings to avoid 429 concurrent request errors
-BATCH_SIZE = 10  # Messages per batch request (Gmail API limit)
+BATCH_SIZE = 10  # Initial messages per batch request (adapted during backup)
+MAX_BATCH_SIZE = 50  # Upper bound for adaptive batch size (recommended max)
 BATCH_DELAY = 0.2  # Seconds between batches
+SIZE_BATCH_SIZE = 50  # Metadata-only requests per batch (size lookups)
+HISTORY_POLL_INTERVAL = 30  # Seconds between historyId checks in watch mode
 
 
 class GmailProvider(EmailProvider):
@@ -50,6 +53,9 @@ class GmailProvider(EmailProvider):
         self._source_name = source_name
         self._service = None
         self._label_cache = {}
+        # History ID the last listing is complete up to; watch mode
+        # waits for the mailbox to move past it
+        self._synced_history_id: Optional[str] = None
 
     @property
     def name(self) -> str:
@@ -68,6 +74,11 @@ class GmailProvider(EmailProvider):
         """Number of messages to download per batch."""
         return BATCH_SIZE
 
+    @property
+    def max_download_batch_size(self) -> int:
+        """Largest batch download_messages_batch() accepts."""
+        return MAX_BATCH_SIZE
+
     def authenticate(self) -> None:
         """Authenticate with Gmail API using OAuth2."""
         creds = self._keychain.load_gmail_token(self._account)
@@ -186,25 +197,37 @@ class GmailProvider(EmailProvider):
         # (History API doesn't support date filtering)
         if since or until:
             print("  Searching Gmail (this may take a minute)...", flush=True)
+            self._synced_history_id = None
             return self.get_all_message_ids(since=since, until=until), None
 
         if not since_state:
-            # Full sync needed
+            # Full sync needed; mail arriving while listing counts as new
+            self._synced_history_id = self.get_current_sync_state()
             return self.get_all_message_ids(), None
 
         try:
-            new_ids = self._get_messages_since_history(since_state)
-            new_state = self.get_current_sync_state()
+            new_ids, listed_id = self._get_messages_since_history(since_state)
+            # The listing's own history ID: later mail has a higher one,
+            # even if it arrived before this call returns
+            new_state = listed_id or self.get_current_sync_state()
+            self._synced_history_id = new_state
             return new_ids, new_state
         except HttpError as e:
             if e.resp.status == 404:
                 print("History expired, performing full sync...")
+                self._synced_history_id = self.get_current_sync_state()
                 return self.get_all_message_ids(), None
             raise
 
-    def _get_messages_since_history(self, history_id: str) -> List[str]:
-        """Get new messages since the given history ID."""
+    def _get_messages_since_history(self, history_id: str) -> Tuple[List[str], Optional[str]]:
+        """Get new messages since the given history ID.
+
+        Returns:
+            Tuple of (new_ids, the mailbox history ID the listing is
+            complete up to, or None if the API did not report it)
+        """
         new_ids = []
+        listed_id = None
         page_token = None
 
         try:
@@ -230,6 +253,8 @@ class GmailProvider(EmailProvider):
                                     continue
                                 new_ids.append(msg["message"]["id"])
 
+                # Only the last page's ID covers the whole listing
+                listed_id = response.get("historyId")
                 page_token = response.get("nextPageToken")
                 if not page_token:
                     break
@@ -237,7 +262,7 @@ class GmailProvider(EmailProvider):
             print("\n\n⏸ Interrupted during Gmail query.")
             raise
 
-        return new_ids
+        return new_ids, listed_id
 
     def download_message(self, msg_id: str) -> Tuple[bytes, List[str]]:
         """Download a message from Gmail.
@@ -268,7 +293,7 @@ class GmailProvider(EmailProvider):
         """Download multiple messages in a batch request.
 
         Args:
-            msg_ids: List of message IDs to download (max BATCH_SIZE)
+            msg_ids: List of message IDs to download (max MAX_BATCH_SIZE)
 
         Returns:
             Dict mapping msg_id -> (raw_data, labels, error_message)
@@ -314,7 +339,7 @@ class GmailProvider(EmailProvider):
             # Create batch request with Gmail-specific batch URI
             batch = self._service.new_batch_http_request(callback=callback)
 
-            for msg_id in msg_ids[:BATCH_SIZE]:
+            for msg_id in msg_ids[:MAX_BATCH_SIZE]:
                 # Request raw format with labelIds explicitly included
                 batch.add(
                     self._service.users()
@@ -342,7 +367,8 @@ class GmailProvider(EmailProvider):
                 raise
 
         # Note: Individual 429 errors within the batch are NOT retried here.
-        # They're returned as errors and will be picked up on the next backup run.
+        # They're returned as errors and will be picked up on the next backup run;
+        # the archive also shrinks its batch size when it sees them.
         # This keeps the code simple and follows our "resumable operations" design.
 
         # Small delay between batches to avoid rate limiting
@@ -350,6 +376,38 @@ class GmailProvider(EmailProvider):
 
         return results
 
+    def get_message_sizes(self, msg_ids: List[str]) -> Dict[str, int]:
+        """Look up message sizes (sizeEstimate) without downloading bodies.
+
+        Args:
+            msg_ids: List of Gmail message IDs
+
+        Returns:
+            Dict mapping msg_id -> estimated size in bytes (missing if unknown)
+        """
+        sizes: Dict[str, int] = {}
+
+        def callback(request_id: str, response, exception):
+            if not exception and "sizeEstimate" in response:
+                sizes[request_id] = int(response["sizeEstimate"])
+
+        for i in range(0, len(msg_ids), SIZE_BATCH_SIZE):
+            batch = self._service.new_batch_http_request(callback=callback)
+            for msg_id in msg_ids[i : i + SIZE_BATCH_SIZE]:
+                batch.add(
+                    self._service.users()
+                    .messages()
+                    .get(userId="me", id=msg_id, format="minimal", fields="id,sizeEstimate"),
+                    request_id=msg_id,
+                )
+            try:
+                batch.execute()
+            except HttpError:
+                pass  # Unknown sizes are downloaded in the first phase
+            time.sleep(BATCH_DELAY)
+
+        return sizes
+
     def get_labels_for_message(self, message_id: str) -> List[str]:
         """Fetch Gmail labels for a message.
 
@@ -393,6 +451,30 @@ class GmailProvider(EmailProvider):
                 names.append(lid)
         return names
 
+    def wait_for_changes(self, timeout: float, stop_event=None) -> bool:
+        """Poll the profile's historyId until it moves (watch mode).
+
+        getProfile is a single cheap request, so polling it is far lighter
+        than a full download run. It is compared against the history ID the
+        last listing covered, so mail that arrived after that listing but
+        before the wait started is not missed.
+        """
+        start_id = self._synced_history_id or self.get_current_sync_state()
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            interval = min(HISTORY_POLL_INTERVAL, remaining)
+            if stop_event is not None:
+                if stop_event.wait(interval):
+                    return False
+            else:
+                time.sleep(interval)
+            current_id = self.get_current_sync_state()
+            if current_id and current_id != start_id:
+                return True
+
     def get_current_sync_state(self) -> Optional[str]:
         """Get current Gmail history ID."""
         try:
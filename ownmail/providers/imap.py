@@ -9,8 +9,13 @@ Also supports any standard IMAP server (Fastmail, company mail, self-hosted, etc
 import email
 import imaplib
 import json
+import os
 import re
+import select
+import tempfile
 import time
+import zlib
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 from ownmail.providers.base import EmailProvider
@@ -18,8 +23,13 @@ from ownmail.providers.base import EmailProvider
 # Default IMAP settings
 DEFAULT_PORT = 993  # IMAPS
 FETCH_BATCH_SIZE = 500  # UIDs per FETCH command (headers)
-FETCH_BODY_BATCH_SIZE = 25  # UIDs per FETCH command (full messages)
+FETCH_BODY_BATCH_SIZE = 25  # UIDs per FETCH command (full messages, sizes unknown)
+FETCH_BODY_BATCH_BYTES = 16 * 1024 * 1024  # Byte budget per FETCH command (full messages)
+STREAM_THRESHOLD_BYTES = 8 * 1024 * 1024  # Larger messages are streamed to disk
+STREAM_CHUNK_BYTES = 1024 * 1024  # Bytes per BODY.PEEK[]<offset.length> request
 FOLDER_BATCH_DELAY = 0.1  # Seconds between folder scans
+IDLE_MAX_SECONDS = 29 * 60  # Re-issue IDLE before servers drop it (RFC 2177)
+IDLE_POLL_SECONDS = 1.0  # Socket timeout slice while idling (checks stop_event)
 
 # Gmail-specific IMAP settings
 GMAIL_IMAP_HOST = "imap.gmail.com"
@@ -27,6 +37,98 @@ GMAIL_IMAP_HOST = "imap.gmail.com"
 # Folders to exclude by default (can be overridden in config)
 DEFAULT_EXCLUDE_FOLDERS = ["[Gmail]/Trash", "[Gmail]/Spam"]
 
+# Gmail system labels (X-GM-LABELS) -> special-use folder flag (RFC 6154).
+# Labels are stored under the folder name so they match folder-derived labels.
+GMAIL_SYSTEM_LABELS = {
+    "\\sent": "\\Sent",
+    "\\important": "\\Important",
+    "\\starred": "\\Flagged",
+    "\\draft": "\\Drafts",
+    "\\trash": "\\Trash",
+    "\\spam": "\\Junk",
+}
+
+# Fallback folder names when the server does not report special-use flags
+GMAIL_DEFAULT_SPECIAL_FOLDERS = {
+    "\\Sent": "[Gmail]/Sent Mail",
+    "\\Important": "[Gmail]/Important",
+    "\\Flagged": "[Gmail]/Starred",
+    "\\Drafts": "[Gmail]/Drafts",
+    "\\Trash": "[Gmail]/Trash",
+    "\\Junk": "[Gmail]/Spam",
+}
+
+
+class _DeflateStream:
+    """COMPRESS=DEFLATE (RFC 4978) transport for an imaplib connection.
+
+    Replaces the connection's file (reads) and send() (writes) so imaplib
+    keeps parsing plain IMAP while raw deflate travels over the socket.
+    Byte counters track both wire (compressed) and protocol bytes.
+    """
+
+    READ_CHUNK = 65536
+
+    def __init__(self, raw_file, sock):
+        """Wrap an authenticated connection's reader and socket.
+
+        Args:
+            raw_file: Buffered reader of the socket (may hold buffered bytes)
+            sock: Underlying socket for sendall()
+        """
+        self._raw = raw_file
+        self._sock = sock
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        self.wire_bytes_in = 0
+        self.bytes_in = 0
+        self.wire_bytes_out = 0
+        self.bytes_out = 0
+
+    def _fill(self) -> bool:
+        """Read and inflate the next chunk. Returns False at EOF."""
+        chunk = self._raw.read1(self.READ_CHUNK)
+        if not chunk:
+            return False
+        self.wire_bytes_in += len(chunk)
+        data = self._decompressor.decompress(chunk)
+        self.bytes_in += len(data)
+        self._buffer += data
+        return True
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            if not self._fill():
+                break
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, limit: int = -1) -> bytes:
+        while True:
+            newline = self._buffer.find(b"\n")
+            if newline >= 0:
+                end = newline + 1
+                break
+            if 0 <= limit <= len(self._buffer) or not self._fill():
+                end = len(self._buffer)
+                break
+        if limit >= 0:
+            end = min(end, limit)
+        data = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return data
+
+    def send(self, data: bytes) -> None:
+        self.bytes_out += len(data)
+        out = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.wire_bytes_out += len(out)
+        self._sock.sendall(out)
+
+    def close(self) -> None:
+        self._raw.close()
+
 
 class ImapProvider(EmailProvider):
     """IMAP email provider.
@@ -37,6 +139,10 @@ class ImapProvider(EmailProvider):
     - Folder-based labels (IMAP folders → labels)
     - Deduplication by Message-ID across folders
     - Incremental sync via UID tracking
+    - Change tracking via CONDSTORE/QRESYNC (RFC 7162) when advertised
+    - COMPRESS=DEFLATE transport (RFC 4978) when advertised
+    - Byte-budgeted batch downloads, streaming large messages to disk
+    - IMAP IDLE (RFC 2177) on All Mail/INBOX for watch mode
     """
 
     def __init__(
@@ -47,6 +153,9 @@ class ImapProvider(EmailProvider):
         port: int = DEFAULT_PORT,
         exclude_folders: Optional[List[str]] = None,
         source_name: str = "imap",
+        compress: bool = True,
+        batch_bytes: int = FETCH_BODY_BATCH_BYTES,
+        stream_threshold: int = STREAM_THRESHOLD_BYTES,
     ):
         """Initialize IMAP provider.
 
@@ -57,6 +166,10 @@ class ImapProvider(EmailProvider):
             port: IMAP server port (default: 993 for SSL)
             exclude_folders: Folders to skip during sync
             source_name: Source name from config
+            compress: Use COMPRESS=DEFLATE if the server supports it
+            batch_bytes: Byte budget for one batched FETCH of full messages
+            stream_threshold: Messages larger than this are streamed to
+                a temp file in spool_dir instead of being held in memory
         """
         self._account = account
         self._keychain = keychain
@@ -65,6 +178,26 @@ class ImapProvider(EmailProvider):
         self._exclude_folders = exclude_folders or DEFAULT_EXCLUDE_FOLDERS
         self._source_name = source_name
         self._conn: Optional[imaplib.IMAP4_SSL] = None
+        self._compress = compress
+        self._deflate: Optional[_DeflateStream] = None
+        # CONDSTORE/QRESYNC support, negotiated in authenticate()
+        self._condstore = False
+        self._qresync = False
+        # provider_id -> {"add": [...], "remove": [...]} from the last sync
+        self._label_changes: Dict[str, Dict[str, List[str]]] = {}
+        # Special-use flag (e.g. "\\Sent") -> folder name, from LIST
+        self._special_folders: Dict[str, str] = {}
+        # Gmail: "All Mail:uid" -> labels from X-GM-LABELS
+        self._gmail_labels: Dict[str, List[str]] = {}
+        self._batch_bytes = batch_bytes
+        self._stream_threshold = stream_threshold
+        # provider_id -> RFC822.SIZE / INTERNALDATE (epoch), filled by
+        # get_message_sizes() and get_message_dates()
+        self._message_sizes: Dict[str, int] = {}
+        self._message_dates: Dict[str, float] = {}
+        # Directory for streamed messages; set by the archive before download.
+        # Streaming is disabled while this is None.
+        self.spool_dir: Optional[Path] = None
 
     @property
     def name(self) -> str:
@@ -83,6 +216,11 @@ class ImapProvider(EmailProvider):
         """Number of messages to download per batch."""
         return FETCH_BODY_BATCH_SIZE
 
+    @property
+    def max_download_batch_size(self) -> int:
+        """Largest batch the archive may grow to (byte budget still applies)."""
+        return FETCH_BATCH_SIZE
+
     def authenticate(self) -> None:
         """Connect and authenticate with the IMAP server."""
         password = self._keychain.load_imap_password(self._account)
@@ -96,6 +234,9 @@ class ImapProvider(EmailProvider):
             self._conn = imaplib.IMAP4_SSL(self._host, self._port)
             self._conn.login(self._account, password)
             print(f"✓ Connected to {self._host} as {self._account}", flush=True)
+            self._negotiate_extensions()
+            if self._compress:
+                self._enable_compression()
         except imaplib.IMAP4.error as e:
             error_msg = str(e)
             if "AUTHENTICATIONFAILED" in error_msg or "Invalid credentials" in error_msg:
@@ -106,6 +247,87 @@ class ImapProvider(EmailProvider):
                 ) from e
             raise RuntimeError(f"IMAP connection failed: {e}") from e
 
+    def _has_capability(self, name: str) -> bool:
+        """Check whether the server advertised a capability."""
+        capabilities = getattr(self._conn, "capabilities", None)
+        if not isinstance(capabilities, (tuple, list)):
+            return False
+        return name.upper() in (str(c).upper() for c in capabilities)
+
+    def _negotiate_extensions(self) -> None:
+        """Enable CONDSTORE/QRESYNC (RFC 7162) when the server supports them.
+
+        With CONDSTORE, STATUS reports HIGHESTMODSEQ and FETCH accepts
+        CHANGEDSINCE. QRESYNC additionally reports expunged UIDs (VANISHED),
+        which is how messages moved out of a folder are detected.
+        """
+        self._condstore = False
+        self._qresync = False
+
+        # imaplib only reads capabilities before login, and many servers
+        # (Gmail included) advertise CONDSTORE only once authenticated
+        try:
+            status, data = self._conn.capability()
+            if status == "OK" and data and isinstance(data[-1], bytes):
+                self._conn.capabilities = tuple(data[-1].decode().upper().split())
+        except Exception:
+            pass
+
+        if self._has_capability("QRESYNC"):
+            try:
+                status, _ = self._conn.enable("QRESYNC")
+                self._qresync = status == "OK"
+            except Exception:
+                self._qresync = False
+
+        if self._qresync:
+            # QRESYNC implies CONDSTORE
+            self._condstore = True
+        elif self._has_capability("CONDSTORE"):
+            try:
+                if self._has_capability("ENABLE"):
+                    self._conn.enable("CONDSTORE")
+                self._condstore = True
+            except Exception:
+                self._condstore = False
+
+    def _enable_compression(self) -> bool:
+        """Switch the connection to COMPRESS=DEFLATE if advertised.
+
+        Returns:
+            True if compression is active
+        """
+        if self._deflate or not self._has_capability("COMPRESS=DEFLATE"):
+            return self._deflate is not None
+        try:
+            status, _ = self._conn.xatom("COMPRESS", "DEFLATE")
+        except Exception:
+            return False
+        if status != "OK":
+            return False
+
+        self._deflate = _DeflateStream(self._conn.file, self._conn.sock)
+        self._conn.file = self._deflate
+        self._conn.send = self._deflate.send
+        print("  Using COMPRESS=DEFLATE", flush=True)
+        return True
+
+    def get_transfer_stats(self) -> Optional[Dict[str, int]]:
+        """Get byte counters for the compressed transport.
+
+        Returns:
+            Dict with wire_bytes_in, bytes_in, wire_bytes_out, bytes_out,
+            or None if compression is not active
+        """
+        if not self._deflate:
+            return None
+        return {
+            "wire_bytes_in": self._deflate.wire_bytes_in,
+            "bytes_in": self._deflate.bytes_in,
+            "wire_bytes_out": self._deflate.wire_bytes_out,
+            "bytes_out": self._deflate.bytes_out,
+        }
+
     def _list_folders(self) -> List[str]:
         """List all IMAP folders, excluding configured ones.
 
@@ -117,6 +339,7 @@ class ImapProvider(EmailProvider):
             raise RuntimeError("Failed to list IMAP folders")
 
         folders = []
+        self._special_folders = {}
         for item in folder_data:
             if isinstance(item, bytes):
                 # Parse folder list response: (\\Flags) "delimiter" "folder_name"
@@ -132,6 +355,11 @@ class ImapProvider(EmailProvider):
                     if "\\Noselect" in flags:
                         continue
 
+                    # Remember special-use folders (RFC 6154) for label mapping
+                    for flag in flags.split():
+                        if flag in GMAIL_DEFAULT_SPECIAL_FOLDERS:
+                            self._special_folders.setdefault(flag, folder_name)
+
                     # Skip excluded folders
                     if folder_name in self._exclude_folders:
                         continue
@@ -159,6 +387,135 @@ class ImapProvider(EmailProvider):
 
         return [int(uid) for uid in data[0].split()]
 
+    def _get_folder_status(self, folder: str) -> Optional[Dict[str, int]]:
+        """Probe a folder with STATUS (UIDNEXT UIDVALIDITY MESSAGES).
+
+        STATUS does not change the selected mailbox and is much cheaper than
+        SELECT + UID SEARCH, so it is used to detect untouched folders.
+        RFC 3501 says clients SHOULD NOT send STATUS for the selected
+        mailbox (servers may answer from stale state), so a selected
+        mailbox is closed first. Every SELECT here is read-only, so CLOSE
+        never expunges.
+
+        Args:
+            folder: IMAP folder name
+
+        Returns:
+            Dict with "uidnext", "uidvalidity", "messages" and (with
+            CONDSTORE) "highestmodseq" when reported, or None if the server
+            did not answer usefully
+        """
+        keys = ["UIDNEXT", "UIDVALIDITY", "MESSAGES"]
+        if self._condstore:
+            keys.append("HIGHESTMODSEQ")
+        try:
+            if self._conn.state == "SELECTED":
+                self._conn.close()
+            status, data = self._conn.status(f'"{folder}"', f"({' '.join(keys)})")
+        except Exception:
+            return None
+        if status != "OK" or not data or not isinstance(data[0], bytes):
+            return None
+
+        result = {}
+        for key in keys:
+            match = re.search(rb"\b" + key.encode() + rb" (\d+)", data[0])
+            if match:
+                result[key.lower()] = int(match.group(1))
+
+        if "uidnext" not in result or "uidvalidity" not in result:
+            return None
+        return result
+
+    @staticmethod
+    def _is_folder_unchanged(
+        folder_status: Dict[str, int], folder_state: Dict, compare_modseq: bool = True
+    ) -> bool:
+        """Check whether STATUS shows no changes since the saved folder state.
+
+        A folder is unchanged when UIDVALIDITY matches, there are no UIDs
+        above max_uid and, with compare_modseq and when both sides know it,
+        HIGHESTMODSEQ matches. Callers that cannot use flag/label changes
+        pass compare_modseq=False, so a flag change alone does not force a
+        SELECT.
+        """
+        old_validity = folder_state.get("uidvalidity")
+        if not old_validity or str(folder_status["uidvalidity"]) != str(old_validity):
+            return False
+        old_modseq = folder_state.get("highestmodseq")
+        new_modseq = folder_status.get("highestmodseq")
+        if compare_modseq and old_modseq and new_modseq and int(old_modseq) != new_modseq:
+            return False
+        return folder_status["uidnext"] - 1 <= folder_state.get("max_uid", 0)
+
+    @staticmethod
+    def _parse_uid_set(uid_set: bytes) -> List[int]:
+        """Expand an IMAP sequence set such as b"1:3,7" into UIDs."""
+        uids: List[int] = []
+        for part in uid_set.decode(errors="replace").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if ":" in part:
+                start, end = part.split(":", 1)
+                if not (start.isdigit() and end.isdigit()):
+                    continue
+                lo, hi = sorted((int(start), int(end)))
+                uids.extend(range(lo, hi + 1))
+            elif part.isdigit():
+                uids.append(int(part))
+        return uids
+
+    def _fetch_changes_since(
+        self, folder: str, max_uid: int, modseq: int, items: str = "(UID FLAGS)"
+    ) -> Tuple[Dict[int, bytes], List[int]]:
+        """Fetch UIDs changed or expunged since a mod-sequence.
+
+        Uses UID FETCH ... (CHANGEDSINCE modseq) and, with QRESYNC, the
+        VANISHED modifier so expunged UIDs are reported in the same round
+        trip. The folder must already be selected.
+
+        Args:
+            folder: Currently selected folder
+            max_uid: Highest UID known from the previous sync
+            modseq: HIGHESTMODSEQ saved from the previous sync
+            items: FETCH data items for changed messages
+
+        Returns:
+            Tuple of (changed, vanished_uids), where changed maps each changed
+            UID to its FETCH response line
+        """
+        if max_uid < 1:
+            return {}, []
+
+        modifier = f"(CHANGEDSINCE {modseq}{' VANISHED' if self._qresync else ''})"
+        try:
+            status, data = self._conn.uid("fetch", f"1:{max_uid}", items, modifier)
+        except Exception:
+            return {}, []
+        if status != "OK":
+            return {}, []
+
+        changed: Dict[int, bytes] = {}
+        for line in self._join_fetch_lines(data):
+            uid_match = re.search(rb"UID (\d+)", line)
+            if uid_match:
+                changed[int(uid_match.group(1))] = line
+
+        vanished: List[int] = []
+        if self._qresync:
+            try:
+                _, vanished_data = self._conn.response("VANISHED")
+            except Exception:
+                vanished_data = None
+            for item in vanished_data or []:
+                if isinstance(item, bytes):
+                    vanished.extend(
+                        self._parse_uid_set(item.replace(b"(EARLIER)", b""))
+                    )
+
+        return changed, vanished
+
     def _get_message_ids_for_uids(
         self, folder: str, uids: List[int]
     ) -> Dict[int, str]:
@@ -216,6 +573,121 @@ class ImapProvider(EmailProvider):
         """Check if this is a Gmail IMAP connection."""
         return self._host == GMAIL_IMAP_HOST
 
+    def _has_gmail_extensions(self) -> bool:
+        """Check if the server supports X-GM-MSGID / X-GM-LABELS."""
+        return self._is_gmail() and self._has_capability("X-GM-EXT-1")
+
+    @staticmethod
+    def _join_fetch_lines(data) -> List[bytes]:
+        """Join a FETCH response into one line per message.
+
+        imaplib splits a message's response around literals ({n}); literals
+        are re-inserted as quoted strings so the result can be tokenized.
+        """
+        lines: List[bytes] = []
+        for item in data or []:
+            if isinstance(item, tuple) and len(item) == 2:
+                head = re.sub(rb"\{\d+\}$", b"", item[0])
+                literal = item[1] or b""
+                text = head + b'"' + literal.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+            elif isinstance(item, bytes):
+                text = item
+            else:
+                continue
+            if lines and not re.match(rb"\d+ \(", text):
+                lines[-1] += text
+            else:
+                lines.append(text)
+        return lines
+
+    @staticmethod
+    def _parse_gmail_labels(line: bytes) -> Optional[List[str]]:
+        """Parse the X-GM-LABELS list from a FETCH response line.
+
+        Returns:
+            List of raw label names, or None if the line has no X-GM-LABELS
+        """
+        text = line.decode("utf-8", errors="replace")
+        start = text.find("X-GM-LABELS (")
+        if start < 0:
+            return None
+
+        labels = []
+        pos = start + len("X-GM-LABELS (")
+        while pos < len(text) and text[pos] != ")":
+            if text[pos] == " ":
+                pos += 1
+            elif text[pos] == '"':
+                pos += 1
+                buf = []
+                while pos < len(text) and text[pos] != '"':
+                    if text[pos] == "\\" and pos + 1 < len(text):
+                        pos += 1
+                    buf.append(text[pos])
+                    pos += 1
+                pos += 1
+                labels.append("".join(buf))
+            else:
+                end = pos
+                while end < len(text) and text[end] not in " )":
+                    end += 1
+                labels.append(text[pos:end])
+                pos = end
+        return labels
+
+    def _map_gmail_labels(self, all_mail: str, raw_labels: List[str]) -> List[str]:
+        """Convert X-GM-LABELS values to the folder names used as labels.
+
+        \\Inbox becomes INBOX, system labels map to their special-use folder
+        and user labels are already folder names. Excluded folders are dropped.
+        """
+        labels = [all_mail]
+        for raw in raw_labels:
+            if raw.lower() == "\\inbox":
+                name = "INBOX"
+            elif raw.lower() in GMAIL_SYSTEM_LABELS:
+                flag = GMAIL_SYSTEM_LABELS[raw.lower()]
+                name = self._special_folders.get(flag, GMAIL_DEFAULT_SPECIAL_FOLDERS[flag])
+            else:
+                name = raw
+            if name in self._exclude_folders or name in labels:
+                continue
+            labels.append(name)
+        return labels
+
+    def _fetch_gmail_labels(self, all_mail: str, uids: List[int]) -> Dict[str, List[str]]:
+        """Fetch labels for All Mail UIDs with UID FETCH (X-GM-MSGID X-GM-LABELS).
+
+        One command per FETCH_BATCH_SIZE UIDs on the already-selected All Mail
+        folder replaces the per-folder SELECT + Message-ID header scan.
+
+        Args:
+            all_mail: The [Gmail]/All Mail folder (must be selected)
+            uids: UIDs to fetch labels for
+
+        Returns:
+            Dict mapping "folder:uid" -> labels
+        """
+        result: Dict[str, List[str]] = {}
+        for i in range(0, len(uids), FETCH_BATCH_SIZE):
+            batch = uids[i : i + FETCH_BATCH_SIZE]
+            uid_set = ",".join(str(u) for u in batch)
+            try:
+                status, data = self._conn.uid("fetch", uid_set, "(X-GM-MSGID X-GM-LABELS)")
+            except Exception:
+                continue
+            if status != "OK":
+                continue
+
+            for line in self._join_fetch_lines(data):
+                uid_match = re.search(rb"UID (\d+)", line)
+                raw_labels = self._parse_gmail_labels(line)
+                if uid_match and raw_labels is not None:
+                    result[f"{all_mail}:{int(uid_match.group(1))}"] = (
+                        self._map_gmail_labels(all_mail, raw_labels)
+                    )
+        return result
+
     def _get_all_mail_folder(self, folders: List[str]) -> Optional[str]:
         """Find the [Gmail]/All Mail folder if it exists."""
         for f in folders:
@@ -256,8 +728,9 @@ class ImapProvider(EmailProvider):
         """Gmail-optimized scan: use [Gmail]/All Mail as sole download source.
 
         [Gmail]/All Mail contains every message, so no dedup is needed.
-        Other folders are scanned for label mapping only (Message-ID headers
-        fetched from smaller folders, not from All Mail).
+        Labels come from X-GM-LABELS on All Mail when the server supports
+        the Gmail extensions; otherwise other folders are scanned for label
+        mapping (Message-ID headers fetched from smaller folders).
         """
         # Phase 1: Get all UIDs from All Mail (just SEARCH, no header fetch)
         print(f"  Scanning: {all_mail}...\033[K", end="\r", flush=True)
@@ -268,6 +741,15 @@ class ImapProvider(EmailProvider):
 
         all_ids = [f"{all_mail}:{uid}" for uid in all_mail_uids]
 
+        if self._has_gmail_extensions():
+            # All Mail is still selected from the search above
+            self._gmail_labels = self._fetch_gmail_labels(all_mail, all_mail_uids)
+            self._message_id_to_folders = {}
+            self._folder_lookup = {}
+            self._seen_map = {}
+            print(f"  Found {len(all_ids)} messages (labels for {len(self._gmail_labels)} from X-GM-LABELS)")
+            return all_ids
+
         # Phase 2: Scan other folders for label mapping
         # Build message_id -> [folders] from smaller folders
         message_id_to_folders: Dict[str, List[str]] = {}
@@ -415,6 +897,25 @@ class ImapProvider(EmailProvider):
         Uses UID-based incremental sync. The sync state is a JSON dict
         mapping folder names to {"max_uid": N, "uidvalidity": V}.
 
+        Each folder is first probed with STATUS. Folders whose UIDVALIDITY
+        is unchanged and whose UIDNEXT shows no new UIDs are skipped without
+        a SELECT, so a no-op sync costs one round trip per folder.
+
+        With CONDSTORE the state also records "highestmodseq". Its changes
+        are only acted on when the result can be used: with X-GM-EXT-1 on
+        Gmail (relabeled messages) or with QRESYNC (expunged UIDs). Then a
+        moved HIGHESTMODSEQ makes the folder count as changed and changes
+        are fetched with CHANGEDSINCE. Otherwise only UIDNEXT/UIDVALIDITY
+        decide, and the new HIGHESTMODSEQ is just stored.
+
+        UIDs that vanished from a folder are reported by get_label_changes()
+        as removals of that folder's label, keyed "folder:uid". That is the
+        provider ID of messages first downloaded from this folder. A message
+        first downloaded from another folder (a duplicate found by
+        Message-ID, or a Gmail label folder without X-GM-EXT-1) has a
+        different provider ID. Its UID here cannot be mapped back once it is
+        gone, so it keeps this folder's label until a full resync.
+
         Args:
             since_state: JSON string of per-folder sync state
             since: Date filter (YYYY-MM-DD)
@@ -439,35 +940,77 @@ class ImapProvider(EmailProvider):
         folders = self._list_folders()
         new_ids = []
         new_state = {}
+        self._label_changes = {}
 
         # Gmail optimization: only check [Gmail]/All Mail for new messages
         all_mail = self._get_all_mail_folder(folders) if self._is_gmail() else None
+        # With X-GM-LABELS, All Mail alone provides both messages and labels
+        gmail_ext = bool(all_mail) and self._has_gmail_extensions()
+        if gmail_ext:
+            folders = [all_mail]
+            self._gmail_labels = {}
+        # Whether a CHANGEDSINCE fetch yields anything usable
+        track_changes = gmail_ext or self._qresync
 
         # For dedup across folders (standard path only)
         seen: Dict[str, Dict] = {}
         # For Gmail label mapping
         message_id_to_folders: Dict[str, List[str]] = {}
 
+        skipped_folders = 0
+
         for folder in folders:
             print(f"  Checking: {folder}...\033[K", end="\r", flush=True)
 
+            folder_state = state.get(folder, {})
+            old_validity = folder_state.get("uidvalidity")
+            old_max_uid = folder_state.get("max_uid", 0)
+
+            # Untouched folder: carry the saved state forward without SELECT
+            folder_status = self._get_folder_status(folder)
+            if folder_status and self._is_folder_unchanged(folder_status, folder_state, track_changes):
+                new_state[folder] = dict(folder_state)
+                if "highestmodseq" in folder_status:
+                    new_state[folder]["highestmodseq"] = folder_status["highestmodseq"]
+                skipped_folders += 1
+                continue
+
             status, select_data = self._conn.select(f'"{folder}"', readonly=True)
             if status != "OK":
                 continue
 
             # Check UIDVALIDITY
             uidvalidity = self._get_uidvalidity(select_data)
-            folder_state = state.get(folder, {})
-            old_validity = folder_state.get("uidvalidity")
-            old_max_uid = folder_state.get("max_uid", 0)
 
             if old_validity and uidvalidity != old_validity:
                 # UIDVALIDITY changed — folder was rebuilt, full rescan needed
                 print(f"  UIDVALIDITY changed for {folder}, rescanning...")
                 old_max_uid = 0
+            elif track_changes and folder_status and folder_status.get("highestmodseq"):
+                old_modseq = folder_state.get("highestmodseq")
+                if old_modseq and int(old_modseq) != folder_status["highestmodseq"]:
+                    items = "(UID X-GM-LABELS)" if gmail_ext else "(UID FLAGS)"
+                    changed, vanished = self._fetch_changes_since(
+                        folder, old_max_uid, int(old_modseq), items
+                    )
+                    if gmail_ext:
+                        # Relabeled messages: X-GM-LABELS is the full new set
+                        for uid, line in changed.items():
+                            raw_labels = self._parse_gmail_labels(line)
+                            if raw_labels is not None:
+                                self._label_changes[f"{folder}:{uid}"] = {
+                                    "set": self._map_gmail_labels(folder, raw_labels),
+                                }
+                    for uid in vanished:
+                        self._label_changes.setdefault(
+                            f"{folder}:{uid}", {"add": [], "remove": []}
+                        )["remove"].append(folder)
 
             # Search for UIDs > old_max_uid
-            if old_max_uid > 0:
+            if old_max_uid > 0 and folder_status and folder_status["uidnext"] - 1 <= old_max_uid:
+                # Only flags/labels changed: STATUS already shows no new UIDs
+                status, data = "OK", [b""]
+            elif old_max_uid > 0:
                 status, data = self._conn.uid(
                     "search", None, f"UID {old_max_uid + 1}:*"
                 )
@@ -486,6 +1029,8 @@ class ImapProvider(EmailProvider):
                     # Gmail: All Mail UIDs are download candidates, no header fetch needed
                     for uid in all_uids:
                         new_ids.append(f"{all_mail}:{uid}")
+                    if gmail_ext:
+                        self._gmail_labels.update(self._fetch_gmail_labels(all_mail, all_uids))
                 elif all_mail:
                     # Gmail: other folders just contribute labels
                     msg_id_map = self._get_message_ids_for_uids(folder, all_uids)
@@ -509,16 +1054,24 @@ class ImapProvider(EmailProvider):
                                 }
                             new_ids.append(composite_id)
 
-            # Update state for this folder
-            current_uids = self._get_folder_uids(folder)
-            max_uid = max(current_uids) if current_uids else old_max_uid
+            # Update state for this folder. The search above already covers
+            # every UID above old_max_uid, and UIDNEXT (when known) also
+            # accounts for expunged messages at the top of the range.
+            max_uid = max(all_uids) if all_uids else old_max_uid
+            if folder_status:
+                max_uid = max(max_uid, folder_status["uidnext"] - 1)
             new_state[folder] = {
                 "max_uid": max_uid,
                 "uidvalidity": uidvalidity,
             }
+            if folder_status and "highestmodseq" in folder_status:
+                new_state[folder]["highestmodseq"] = folder_status["highestmodseq"]
 
             time.sleep(FOLDER_BATCH_DELAY)
 
+        if skipped_folders:
+            print(f"  Skipped {skipped_folders} unchanged folders\033[K", flush=True)
+
         # Store dedup/label info
         if all_mail:
             self._message_id_to_folders = message_id_to_folders
@@ -538,6 +1091,18 @@ class ImapProvider(EmailProvider):
 
         return new_ids, json.dumps(new_state)
 
+    def get_label_changes(self) -> Dict[str, Dict[str, List[str]]]:
+        """Get label changes for already-downloaded messages.
+
+        Populated by get_new_message_ids() from CONDSTORE/QRESYNC data.
+        Gmail reports the complete new label set under "set".
+
+        Returns:
+            Dict mapping provider ID -> {"add": [...], "remove": [...]}
+            or {"set": [...]}
+        """
+        return self._label_changes
+
     def _get_uidvalidity(self, select_data) -> Optional[str]:
         """Extract UIDVALIDITY from SELECT response."""
         # select_data is a list like [b'12345']
@@ -555,9 +1120,13 @@ class ImapProvider(EmailProvider):
         """Determine labels for a downloaded message.
 
         For standard IMAP: uses _folder_lookup from dedup scan.
-        For Gmail optimized path: extracts Message-ID from raw email
+        For Gmail with X-GM-LABELS: uses the labels fetched during the scan.
+        For the Gmail fallback path: extracts Message-ID from raw email
         and looks up which other folders contain it.
         """
+        if composite_id in self._gmail_labels:
+            return self._gmail_labels[composite_id]
+
         # Standard path: folder lookup populated during dedup scan
         folder_lookup = getattr(self, "_folder_lookup", {})
         if composite_id in folder_lookup:
@@ -576,9 +1145,194 @@ class ImapProvider(EmailProvider):
 
         return [folder]
 
+    def _fetch_sizes(self, uids: List[int]) -> Dict[int, Tuple[int, Optional[float]]]:
+        """Fetch RFC822.SIZE and INTERNALDATE for UIDs in the selected folder.
+
+        Returns:
+            Dict mapping UID -> (size in bytes, internal date as epoch
+            seconds or None)
+        """
+        sizes: Dict[int, Tuple[int, Optional[float]]] = {}
+        for i in range(0, len(uids), FETCH_BATCH_SIZE):
+            uid_set = ",".join(str(uid) for uid in uids[i : i + FETCH_BATCH_SIZE])
+            try:
+                status, data = self._conn.uid("fetch", uid_set, "(RFC822.SIZE INTERNALDATE)")
+            except Exception:
+                continue
+            if status != "OK" or not data:
+                continue
+            for item in data:
+                line = item[0] if isinstance(item, tuple) else item
+                if not isinstance(line, bytes):
+                    continue
+                uid_match = re.search(rb"UID (\d+)", line)
+                size_match = re.search(rb"RFC822\.SIZE (\d+)", line)
+                if uid_match and size_match:
+                    date_tuple = imaplib.Internaldate2tuple(line)
+                    internal_date = time.mktime(date_tuple) if date_tuple else None
+                    sizes[int(uid_match.group(1))] = (int(size_match.group(1)), internal_date)
+        return sizes
+
+    def _load_message_metadata(self, msg_ids: List[str]) -> None:
+        """Fill the size/date caches for messages not looked up yet."""
+        folder_groups: Dict[str, List[int]] = {}
+        for msg_id in msg_ids:
+            if msg_id in self._message_sizes:
+                continue
+            folder, uid_str = msg_id.rsplit(":", 1)
+            folder_groups.setdefault(folder, []).append(int(uid_str))
+
+        for folder, uids in folder_groups.items():
+            status, _ = self._conn.select(f'"{folder}"', readonly=True)
+            if status != "OK":
+                continue
+            for uid, (size, internal_date) in self._fetch_sizes(uids).items():
+                self._message_sizes[f"{folder}:{uid}"] = size
+                if internal_date is not None:
+                    self._message_dates[f"{folder}:{uid}"] = internal_date
+
+    def get_message_sizes(self, msg_ids: List[str]) -> Dict[str, int]:
+        """Look up message sizes (RFC822.SIZE) without downloading bodies.
+
+        Sizes are cached for download_messages_batch(), which uses them
+        to pack FETCH commands by bytes and to stream large messages.
+
+        Args:
+            msg_ids: List of composite IDs ("folder:uid")
+
+        Returns:
+            Dict mapping msg_id -> size in bytes (missing if unknown)
+        """
+        self._load_message_metadata(msg_ids)
+        return {
+            msg_id: self._message_sizes[msg_id]
+            for msg_id in msg_ids
+            if msg_id in self._message_sizes
+        }
+
+    def get_message_dates(self, msg_ids: List[str]) -> Dict[str, float]:
+        """Estimate message dates (INTERNALDATE) without downloading bodies.
+
+        Fetched in the same pre-pass as the sizes, so ordering the queue
+        by date costs no extra round trips.
+
+        Args:
+            msg_ids: List of composite IDs ("folder:uid")
+
+        Returns:
+            Dict mapping msg_id -> epoch seconds (missing if unknown)
+        """
+        self._load_message_metadata(msg_ids)
+        return {
+            msg_id: self._message_dates[msg_id]
+            for msg_id in msg_ids
+            if msg_id in self._message_dates
+        }
+
+    def _should_stream(self, msg_id: str) -> bool:
+        """Check whether a message is large enough to stream to disk."""
+        return (
+            self.spool_dir is not None
+            and self._message_sizes.get(msg_id, 0) > self._stream_threshold
+        )
+
+    def _pack_by_size(self, msg_ids: List[str]) -> List[List[str]]:
+        """Split message IDs into batches that fit the byte budget.
+
+        Messages of unknown size count as batch_bytes / FETCH_BODY_BATCH_SIZE,
+        so without size information batches fall back to the fixed count.
+        Messages that will be streamed get a batch of their own.
+        """
+        unknown_size = self._batch_bytes // FETCH_BODY_BATCH_SIZE
+        batches: List[List[str]] = []
+        current: List[str] = []
+        current_bytes = 0
+
+        for msg_id in msg_ids:
+            if self._should_stream(msg_id):
+                if current:
+                    batches.append(current)
+                    current, current_bytes = [], 0
+                batches.append([msg_id])
+                continue
+            size = self._message_sizes.get(msg_id, unknown_size)
+            if current and (
+                current_bytes + size > self._batch_bytes
+                or len(current) >= FETCH_BATCH_SIZE
+            ):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(msg_id)
+            current_bytes += size
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def plan_download_batches(self, msg_ids: List[str]) -> List[List[str]]:
+        """Group message IDs into download batches by byte budget.
+
+        Runs an RFC822.SIZE pre-pass so that many small messages share
+        one FETCH while large ones don't pile up in memory. Order is
+        preserved: the batches concatenate back to msg_ids.
+
+        Args:
+            msg_ids: List of composite IDs ("folder:uid")
+
+        Returns:
+            List of batches (lists of msg_ids)
+        """
+        self.get_message_sizes(msg_ids)
+        return self._pack_by_size(msg_ids)
+
+    def _stream_message(self, uid: int) -> Path:
+        """Stream a message from the selected folder into a temp file.
+
+        Uses BODY.PEEK[]<offset.length> partial fetches so only one chunk
+        is held in memory at a time. The caller owns the returned file.
+
+        Returns:
+            Path to the temp file in spool_dir
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.spool_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                offset = 0
+                while True:
+                    status, data = self._conn.uid(
+                        "fetch", str(uid),
+                        f"(BODY.PEEK[]<{offset}.{STREAM_CHUNK_BYTES}>)",
+                    )
+                    if status != "OK":
+                        raise RuntimeError(f"FETCH failed for UID {uid} at offset {offset}")
+                    chunk = b""
+                    for item in data or []:
+                        if isinstance(item, tuple) and len(item) == 2:
+                            chunk = item[1]
+                            break
+                    if not chunk and offset == 0:
+                        raise RuntimeError(f"No data for UID {uid}")
+                    f.write(chunk)
+                    offset += len(chunk)
+                    if len(chunk) < STREAM_CHUNK_BYTES:
+                        break
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return Path(temp_path)
+
+    @staticmethod
+    def _read_head(path: Path, limit: int = 65536) -> bytes:
+        """Read the start of a spooled message (enough for its headers)."""
+        with open(path, "rb") as f:
+            return f.read(limit)
+
     def download_message(self, msg_id: str) -> Tuple[bytes, List[str]]:
         """Download a message by its composite ID (folder:uid).
 
+        Messages above the stream threshold (with a spool_dir set) are
+        written to a temp file and returned as its Path.
+
         Returns:
             Tuple of (raw_email_bytes, labels)
             Labels are the IMAP folder names where this message appears.
@@ -591,6 +1345,10 @@ class ImapProvider(EmailProvider):
         if status != "OK":
             raise RuntimeError(f"Cannot select folder: {folder}")
 
+        if self._should_stream(msg_id):
+            path = self._stream_message(uid)
+            return path, self._get_labels_for_downloaded(msg_id, self._read_head(path), folder)
+
         # Fetch the full message
         status, data = self._conn.uid("fetch", str(uid), "(RFC822)")
         if status != "OK" or not data or data[0] is None:
@@ -617,7 +1375,9 @@ class ImapProvider(EmailProvider):
         """Download multiple messages, grouped by folder for efficiency.
 
         Groups message IDs by folder to minimize SELECT calls, then uses
-        batched FETCH commands to download multiple messages at once.
+        batched FETCH commands packed by byte budget (when sizes are
+        known from get_message_sizes()). Messages above the stream
+        threshold are streamed to spool_dir and returned as a Path.
 
         Args:
             msg_ids: List of composite IDs ("folder:uid")
@@ -628,23 +1388,30 @@ class ImapProvider(EmailProvider):
         results: Dict[str, Tuple[Optional[bytes], List[str], Optional[str]]] = {}
 
         # Group by folder to minimize SELECT calls
-        folder_groups: Dict[str, List[Tuple[str, int]]] = {}
+        folder_groups: Dict[str, List[str]] = {}
         for msg_id in msg_ids:
-            folder, uid_str = msg_id.rsplit(":", 1)
-            uid = int(uid_str)
-            folder_groups.setdefault(folder, []).append((msg_id, uid))
+            folder = msg_id.rsplit(":", 1)[0]
+            folder_groups.setdefault(folder, []).append(msg_id)
 
         for folder, items in folder_groups.items():
             # Select folder once for all messages in it
             status, _ = self._conn.select(f'"{folder}"', readonly=True)
             if status != "OK":
-                for msg_id, _ in items:
+                for msg_id in items:
                     results[msg_id] = (None, [], f"Cannot select folder: {folder}")
                 continue
 
             # Fetch full messages in batches
-            for i in range(0, len(items), FETCH_BODY_BATCH_SIZE):
-                batch = items[i : i + FETCH_BODY_BATCH_SIZE]
+            for batch_ids in self._pack_by_size(items):
+                if self._should_stream(batch_ids[0]):
+                    mid = batch_ids[0]
+                    try:
+                        results[mid] = (self._stream_message(int(mid.rsplit(":", 1)[1])), None, None)
+                    except Exception as e:
+                        results[mid] = (None, [], str(e))
+                    continue
+
+                batch = [(mid, int(mid.rsplit(":", 1)[1])) for mid in batch_ids]
                 uid_set = ",".join(str(uid) for _, uid in batch)
                 uid_map = {uid: mid for mid, uid in batch}
 
@@ -684,13 +1451,17 @@ class ImapProvider(EmailProvider):
         for mid, (raw_data, labels, _error) in list(results.items()):
             if raw_data is not None and labels is None:
                 folder = mid.rsplit(":", 1)[0]
-                results[mid] = (raw_data, self._get_labels_for_downloaded(mid, raw_data, folder), None)
+                head = self._read_head(raw_data) if isinstance(raw_data, Path) else raw_data
+                results[mid] = (raw_data, self._get_labels_for_downloaded(mid, head, folder), None)
 
         return results
 
     def get_current_sync_state(self) -> Optional[str]:
         """Get current sync state (per-folder max UID + UIDVALIDITY).
 
+        Uses STATUS (UIDNEXT - 1) where available and falls back to
+        SELECT + UID SEARCH ALL for servers that don't answer STATUS.
+
         Returns:
             JSON string of sync state
         """
@@ -698,6 +1469,16 @@ class ImapProvider(EmailProvider):
         state = {}
 
         for folder in folders:
+            folder_status = self._get_folder_status(folder)
+            if folder_status:
+                state[folder] = {
+                    "max_uid": max(folder_status["uidnext"] - 1, 0),
+                    "uidvalidity": str(folder_status["uidvalidity"]),
+                }
+                if "highestmodseq" in folder_status:
+                    state[folder]["highestmodseq"] = folder_status["highestmodseq"]
+                continue
+
             status, _ = self._conn.select(f'"{folder}"', readonly=True)
             if status != "OK":
                 continue
@@ -713,6 +1494,70 @@ class ImapProvider(EmailProvider):
 
         return json.dumps(state)
 
+    def _get_idle_folder(self) -> str:
+        """Folder to IDLE on: All Mail for Gmail (sees every label), else INBOX."""
+        if self._is_gmail():
+            all_mail = self._get_all_mail_folder(self._list_folders())
+            if all_mail:
+                return all_mail
+        return "INBOX"
+
+    def _idle_readable(self, timeout: float) -> bool:
+        """Check whether a response line may be waiting, without consuming it."""
+        if self._deflate is not None and b"\n" in self._deflate._buffer:
+            return True
+        sock = self._conn.sock
+        pending = getattr(sock, "pending", None)
+        if callable(pending) and pending():
+            return True
+        readable, _, _ = select.select([sock], [], [], timeout)
+        return bool(readable)
+
+    def wait_for_changes(self, timeout: float, stop_event=None) -> bool:
+        """Wait for new mail with IMAP IDLE (watch mode).
+
+        Idles on All Mail (Gmail) or INBOX and returns as soon as the server
+        reports EXISTS, EXPUNGE or FETCH. Servers without IDLE fall back to
+        waiting out the timeout.
+        """
+        if not self._has_capability("IDLE"):
+            return super().wait_for_changes(timeout, stop_event)
+
+        status, _ = self._conn.select(f'"{self._get_idle_folder()}"', readonly=True)
+        if status != "OK":
+            return super().wait_for_changes(timeout, stop_event)
+
+        tag = self._conn._new_tag()
+        self._conn.send(tag + b" IDLE\r\n")
+        line = self._conn.readline()
+        if not line.startswith(b"+"):
+            raise RuntimeError(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+
+        changed = False
+        deadline = time.time() + min(timeout, IDLE_MAX_SECONDS)
+        try:
+            while time.time() < deadline:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                wait = min(IDLE_POLL_SECONDS, max(deadline - time.time(), 0))
+                if not self._idle_readable(wait):
+                    continue
+                line = self._conn.readline()
+                if not line:
+                    raise RuntimeError("Connection closed while idling")
+                if re.match(rb"\* \d+ (EXISTS|EXPUNGE|FETCH)", line):
+                    changed = True
+                    break
+        finally:
+            self._conn.send(b"DONE\r\n")
+            # Drain untagged responses up to the IDLE completion
+            while True:
+                line = self._conn.readline()
+                if not line or line.startswith(tag):
+                    break
+
+        return changed
+
     def close(self) -> None:
         """Close the IMAP connection."""
         if self._conn:
@@ -721,3 +1566,4 @@ class ImapProvider(EmailProvider):
             except Exception:
                 pass
             self._conn = None
+            self._deflate = None
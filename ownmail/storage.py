@@ -0,0 +1,603 @@
+"""Reading and writing raw email files, optionally zstd-compressed or packed.
+
+Compressed emails are stored as ``.eml.zst`` next to plain ``.eml`` files.
+Everything that reads email files goes through open_email()/read_email(),
+so callers always see the original RFC 5322 bytes and content hashes stay
+defined over the uncompressed message.
+
+With the ``pack`` layout, emails are appended to large pack segments
+instead of one file each. A packed email's path (as stored in
+``emails.filename``) addresses its record inside the segment::
+
+    sources/work/packs/pack-000001.pack/<offset>+<length>/2024/01/<name>.eml
+
+The trailing part is the path the email would have as a plain file, which
+is where ``ownmail unpack`` writes it. Segments are read through mmap.
+
+zstd support needs the optional ``zstandard`` package
+(``pip install ownmail[zstd]``).
+"""
+
+import hashlib
+import io
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple, Union
+
+from ownmail.blobs import DEDUP_SUFFIX, manifest_digests, reassemble
+
+try:
+    import fcntl
+    HAS_FLOCK = True
+except ImportError:  # Windows
+    HAS_FLOCK = False
+
+ZSTD_SUFFIX = ".zst"
+ZSTD_LEVEL = 6  # Archival writes happen at download speed; favour ratio a little
+
+COMPRESSIONS = ("zstd",)
+
+HASH_CHUNK_BYTES = 1024 * 1024
+HEAD_BYTES = 16 * 1024  # Prefix digested to tell files apart before a full hash
+READAHEAD_DEPTH = 16  # Emails warmed ahead of a sequential reader
+
+# Storage layouts: one file per email (see email_dir), or pack segments
+DIR_LAYOUTS = ("date", "day", "hash")
+LAYOUTS = DIR_LAYOUTS + ("pack",)
+
+PACK_SUFFIX = ".pack"
+PACK_DIR = "packs"
+PACK_SEGMENT_BYTES = 1024 * 1024 * 1024  # Start a new segment after 1 GiB
+PACK_MAGIC = b"OMPK"
+# Record header: magic + big-endian length, so segments can be scanned
+# without the database
+PACK_HEADER = struct.Struct(">4sQ")
+
+# <YYYYMMDD>_<HHMMSS>_<hash> or unknown_<hash>, as written by backup
+_EMAIL_NAME = re.compile(r"^(?:(\d+)(\d{2})(\d{2})_\d{6}|unknown)_([0-9a-f]{2})")
+_PACK_ADDRESS = re.compile(r"^(.*\.pack)/(\d+)\+(\d+)/(.+)$")
+_pack_maps: Dict[str, mmap.mmap] = {}
+_pack_lock = threading.Lock()
+
+
+def _zstd():
+    """Import zstandard, with an install hint when it is missing."""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(
+            "zstd compression requires the 'zstandard' package. "
+            "Install with: pip install ownmail[zstd]"
+        ) from None
+    return zstandard
+
+
+def check_compression(compression: Optional[str]) -> None:
+    """Raise ValueError for an unknown compression setting."""
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+
+def email_suffix(compression: Optional[str], base: str = ".eml") -> str:
+    """File suffix for emails stored with this compression.
+
+    base is ".emlb" for emails whose attachments were moved to the blob
+    store (see ownmail.blobs).
+    """
+    check_compression(compression)
+    return base + ZSTD_SUFFIX if compression == "zstd" else base
+
+
+def is_compressed(path) -> bool:
+    """Check if an email file is stored compressed (by its suffix)."""
+    return str(path).endswith(ZSTD_SUFFIX)
+
+
+def is_deduped(path) -> bool:
+    """Check if an email was stored with its attachments in the blob store."""
+    name = str(path)
+    if name.endswith(ZSTD_SUFFIX):
+        name = name[:-len(ZSTD_SUFFIX)]
+    return name.endswith(DEDUP_SUFFIX)
+
+
+def is_email_file(path) -> bool:
+    """Check if a path names a stored email file (.eml, .emlb, maybe .zst)."""
+    name = str(path)
+    if name.endswith(ZSTD_SUFFIX):
+        name = name[:-len(ZSTD_SUFFIX)]
+    return name.endswith(".eml") or name.endswith(DEDUP_SUFFIX)
+
+
+def plain_name(name: str) -> str:
+    """Name of an email file as a plain .eml (for downloads)."""
+    if name.endswith(ZSTD_SUFFIX):
+        name = name[:-len(ZSTD_SUFFIX)]
+    if name.endswith(DEDUP_SUFFIX):
+        name = name[:-len(DEDUP_SUFFIX)] + ".eml"
+    return name
+
+
+def check_layout(layout: Optional[str]) -> None:
+    """Raise ValueError for an unknown storage layout."""
+    if layout and layout not in LAYOUTS:
+        raise ValueError(f"Unsupported layout: {layout}")
+
+
+def email_dir(layout: Optional[str], filename: str) -> Optional[str]:
+    """Directory, relative to the source, an email file belongs in.
+
+    date: YYYY/MM, day: YYYY/MM/DD, hash: YYYY/MM/<first two hex digits
+    of the name's hash>. Emails with unparseable dates go to unknown/
+    (unknown/<xx> for hash). The directory is derived from the file name
+    alone, so files can be moved between layouts without reading them.
+
+    Returns None for names not written by ownmail.
+    """
+    match = _EMAIL_NAME.match(filename)
+    if not match:
+        return None
+    year, month, day, prefix = match.groups()
+    if layout == "hash":
+        return f"{year}/{month}/{prefix}" if year else f"unknown/{prefix}"
+    if not year:
+        return "unknown"
+    if layout == "day":
+        return f"{year}/{month}/{day}"
+    return f"{year}/{month}"
+
+
+def pack_address(pack_path: Path, offset: int, length: int, name: str) -> Path:
+    """Path addressing a record inside a pack segment."""
+    return pack_path / f"{offset}+{length}" / name
+
+
+def parse_pack_address(path) -> Optional[Tuple[Path, int, int, str]]:
+    """Split a packed email's path into (pack_path, offset, length, name).
+
+    Returns None for plain email files.
+    """
+    match = _PACK_ADDRESS.match(Path(path).as_posix())
+    if not match:
+        return None
+    return Path(match.group(1)), int(match.group(2)), int(match.group(3)), match.group(4)
+
+
+def is_packed(path) -> bool:
+    """Check if a path addresses an email inside a pack segment."""
+    return parse_pack_address(path) is not None
+
+
+def email_exists(path) -> bool:
+    """Check if an email file (or packed record) exists."""
+    address = parse_pack_address(path)
+    if address is None:
+        return Path(path).exists()
+    pack_path, offset, length, _ = address
+    try:
+        return offset + length <= pack_path.stat().st_size
+    except OSError:
+        return False
+
+
+def stat_email(path) -> Tuple[int, int, int]:
+    """Stat signature (size, mtime_ns, inode) of a stored email.
+
+    Packed records are never rewritten in place, so theirs is the record
+    length and the segment's inode (appends to the segment don't change
+    it). Raises FileNotFoundError if the email is missing.
+    """
+    address = parse_pack_address(path)
+    if address is None:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns, st.st_ino
+    pack_path, offset, length, _ = address
+    st = os.stat(pack_path)
+    if offset + length > st.st_size:
+        raise FileNotFoundError(f"Pack record out of range: {path}")
+    return length, 0, st.st_ino
+
+
+def stored_size(path) -> int:
+    """Bytes an email takes on disk (compressed size for .eml.zst)."""
+    address = parse_pack_address(path)
+    if address is None:
+        return Path(path).stat().st_size
+    return address[2]
+
+
+def _read_pack(pack_path: Path, offset: int, length: int) -> bytes:
+    """Read one record from a pack segment through a cached mmap."""
+    key = str(pack_path)
+    with _pack_lock:
+        mapped = _pack_maps.get(key)
+        if mapped is None or offset + length > len(mapped):
+            # Segment grew since it was mapped (or is not mapped yet)
+            if mapped is not None:
+                mapped.close()
+            with open(pack_path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            _pack_maps[key] = mapped
+        if offset + length > len(mapped):
+            raise ValueError(f"Pack record out of range: {pack_path}@{offset}")
+        return mapped[offset:offset + length]
+
+
+def read_pack_record(path) -> bytes:
+    """Read a packed email's stored bytes (still compressed for .eml.zst)."""
+    pack_path, offset, length, _ = parse_pack_address(path)
+    return _read_pack(pack_path, offset, length)
+
+
+def close_pack_maps() -> None:
+    """Drop all cached pack mmaps (before pack files are removed)."""
+    with _pack_lock:
+        for mapped in _pack_maps.values():
+            mapped.close()
+        _pack_maps.clear()
+
+
+def open_email(path) -> BinaryIO:
+    """Open an email file for reading its uncompressed bytes."""
+    if is_packed(path) or is_deduped(path):
+        return io.BytesIO(read_email(path))
+    f = open(path, "rb")
+    if not is_compressed(path):
+        return f
+    try:
+        return _zstd().ZstdDecompressor().stream_reader(f, closefd=True)
+    except Exception:
+        f.close()
+        raise
+
+
+def read_email(path) -> bytes:
+    """Read the original bytes of an email file.
+
+    Decompresses .zst, reads packed records and reassembles attachments
+    from the blob store, so the result always matches content_hash.
+    """
+    if is_packed(path):
+        data = read_pack_record(path)
+    elif is_deduped(path):
+        with open(path, "rb") as f:
+            data = f.read()
+    else:
+        with open_email(path) as f:
+            return f.read()
+    if is_compressed(path):
+        data = _zstd().ZstdDecompressor().decompress(data)
+    if is_deduped(path):
+        data = reassemble(data, path)
+    return data
+
+
+def blob_digests(path) -> List[str]:
+    """Digests of the attachment blobs an .emlb email refers to."""
+    if is_packed(path):
+        data = read_pack_record(path)
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    if is_compressed(path):
+        data = _zstd().ZstdDecompressor().decompress(data)
+    return manifest_digests(data)
+
+
+def locality_key(path) -> Tuple[str, int]:
+    """Sort key that puts emails in roughly on-disk order.
+
+    Plain files sort by path, which keeps each directory together and,
+    with date-prefixed names, in the order they were written. Packed
+    records sort by segment and offset.
+    """
+    address = parse_pack_address(path)
+    if address is None:
+        return str(path), 0
+    return str(address[0]), address[1]
+
+
+def _advise(fd: int, offset: int, length: int, advice: str) -> None:
+    """posix_fadvise() where the platform has it (not macOS/Windows)."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice))
+        except OSError:
+            pass
+
+
+def _warm(path) -> None:
+    """Get an email's stored bytes into the page cache."""
+    address = parse_pack_address(path)
+    if address is None:
+        target, offset, length = path, 0, 0
+    else:
+        target, offset, length, _ = address
+    fd = os.open(target, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            _advise(fd, offset, length, "POSIX_FADV_WILLNEED")
+            return
+        # No readahead hint: read it once so the real read hits the cache
+        remaining = length or os.fstat(fd).st_size
+        while remaining > 0:
+            chunk = os.pread(fd, min(HASH_CHUNK_BYTES, remaining), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            remaining -= len(chunk)
+    finally:
+        os.close(fd)
+
+
+class Readahead:
+    """Warms the page cache for emails shortly before they are read.
+
+    A background thread walks the paths (best sorted by locality_key)
+    at most `depth` emails ahead of the consumer, which calls advance()
+    as it moves to each next email. Disk reads then overlap with parsing
+    instead of stalling it, which matters most on spinning disks.
+
+    Usage:
+        with Readahead(paths) as readahead:
+            for path in paths:
+                readahead.advance()
+                ...
+    """
+
+    def __init__(self, paths: List, depth: int = READAHEAD_DEPTH):
+        self._paths = paths
+        self._slots = threading.Semaphore(depth)
+        self._started = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ownmail-readahead", daemon=True)
+
+    def __enter__(self) -> "Readahead":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start warming from the first path."""
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def advance(self) -> None:
+        """Move on to the next email (the first call only starts)."""
+        if self._started:
+            self._slots.release()
+        self._started = True
+
+    def _run(self) -> None:
+        for path in self._paths:
+            while not self._slots.acquire(timeout=0.1):
+                if self._stop.is_set():
+                    return
+            if self._stop.is_set():
+                return
+            try:
+                _warm(path)
+            except OSError:
+                pass  # The reader reports missing files itself
+
+
+def hash_email(path, chunk_size: int = HASH_CHUNK_BYTES) -> Tuple[str, int]:
+    """SHA-256 of an email's original bytes, read in chunks.
+
+    Streams plain and .zst files instead of loading them whole (packed
+    and .emlb emails are read as in read_email()).
+
+    Returns:
+        Tuple of (hex digest, number of bytes hashed)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open_email(path) as f:
+        if isinstance(f, io.BufferedReader):
+            # Plain file: ask for aggressive kernel readahead
+            _advise(f.fileno(), 0, 0, "POSIX_FADV_SEQUENTIAL")
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def head_digest(path, size: int = HEAD_BYTES) -> str:
+    """SHA-256 of the first bytes of an email as stored.
+
+    Cheap to compute, and equal for a file and its moved copy, so moves
+    can be matched by (stored size, head digest) before a full hash.
+    For an .emlb stub, which is small, it covers the whole stored stub.
+    """
+    if is_deduped(path):
+        size = stat_email(path)[0]
+    address = parse_pack_address(path)
+    if address is None:
+        with open(path, "rb") as f:
+            head = f.read(size)
+    else:
+        pack_path, offset, length, _ = address
+        head = _read_pack(pack_path, offset, min(length, size))
+    return hashlib.sha256(head).hexdigest()
+
+
+def compress_bytes(data: bytes) -> bytes:
+    """Compress email bytes for a ``.eml.zst`` file."""
+    return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def compress_file(src: Path, fd: int) -> None:
+    """Stream-compress src into an open file descriptor.
+
+    Used for large messages spooled to disk, so they never need to be
+    held in memory.
+    """
+    compressor = _zstd().ZstdCompressor(level=ZSTD_LEVEL)
+    with open(src, "rb") as ifh, os.fdopen(os.dup(fd), "wb") as ofh:
+        compressor.copy_stream(ifh, ofh)
+
+
+class PackWriter:
+    """Appends emails to the newest pack segment of one source.
+
+    Records are flushed to the OS on append, so readers see them at once.
+    They are durable only after sync(), which WriteBehind calls once per
+    batch before the database commit.
+
+    Each record is written under an exclusive flock on the segment, so two
+    processes appending to the same source (a --watch run and a cron
+    download) never interleave or report the wrong offset.
+    """
+
+    def __init__(self, pack_dir: Path, segment_bytes: int = PACK_SEGMENT_BYTES):
+        self.pack_dir = pack_dir
+        self.segment_bytes = segment_bytes
+        self._file: Optional[BinaryIO] = None
+        self._path: Optional[Path] = None
+
+    def _segment(self) -> BinaryIO:
+        """Open segment with room left, starting a new one when full."""
+        if self._file is not None and os.fstat(self._file.fileno()).st_size < self.segment_bytes:
+            return self._file
+        if self._file is not None:
+            self.close()
+
+        self.pack_dir.mkdir(parents=True, exist_ok=True)
+        segments = sorted(self.pack_dir.glob(f"pack-*{PACK_SUFFIX}"))
+        if segments and segments[-1] != self._path and segments[-1].stat().st_size < self.segment_bytes:
+            path = segments[-1]
+        else:
+            number = int(segments[-1].stem.split("-")[1]) + 1 if segments else 1
+            path = self.pack_dir / f"pack-{number:06d}{PACK_SUFFIX}"
+        self._file = open(path, "ab")
+        self._path = path
+        return self._file
+
+    def append(self, data: Union[bytes, Path], name: str) -> Path:
+        """Append one email and return its pack address.
+
+        Args:
+            data: Stored bytes, or a Path to a file to copy in
+            name: Path the email would have as a plain file, relative
+                  to the source directory (e.g. 2024/01/<name>.eml)
+        """
+        f = self._segment()
+        length = data.stat().st_size if isinstance(data, Path) else len(data)
+        if HAS_FLOCK:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            # tell() is stale once another process has appended; the size
+            # is the real end while we hold the lock
+            offset = os.fstat(f.fileno()).st_size + PACK_HEADER.size
+            f.write(PACK_HEADER.pack(PACK_MAGIC, length))
+            if isinstance(data, Path):
+                with open(data, "rb") as src:
+                    shutil.copyfileobj(src, f, 1024 * 1024)
+            else:
+                f.write(data)
+            f.flush()
+        finally:
+            if HAS_FLOCK:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return pack_address(self._path, offset, length, name)
+
+    def sync(self) -> None:
+        """Make all appended records durable."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Sync and close the open segment."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+class WriteBehind:
+    """Batches fsyncs of freshly written email files.
+
+    Files are written and renamed into place right away (so they can be
+    indexed), but made durable only in flush(): one fsync per file and
+    pack segment, then one per touched directory. Callers flush before
+    committing the database rows that point at the files, so after a
+    crash the database never references a file whose data was lost; an
+    unflushed file is just an orphan that the next download rewrites.
+    """
+
+    def __init__(self):
+        self._files: List[Path] = []
+        self._packs: Set[PackWriter] = set()
+        self._dirs: Set[Path] = set()
+        self._known_dirs: Set[Path] = set()
+
+    def ensure_dir(self, path: Path) -> None:
+        """Create a directory once per run (known ones are cached)."""
+        if path in self._known_dirs:
+            return
+        missing = [p for p in (path, *path.parents) if not p.exists()]
+        path.mkdir(parents=True, exist_ok=True)
+        # New directory entries need their parents synced too
+        self._dirs.update(p.parent for p in missing)
+        self._known_dirs.add(path)
+
+    def add_file(self, path: Path) -> None:
+        """Register a file written since the last flush."""
+        self._files.append(path)
+        self._dirs.add(path.parent)
+
+    def add_dir(self, path: Path) -> None:
+        """Register a directory with an entry added since the last flush
+        (for files that were fsynced when written)."""
+        self._dirs.add(path)
+
+    def add_pack(self, pack_writer: PackWriter) -> None:
+        """Register a pack segment appended to since the last flush."""
+        self._packs.add(pack_writer)
+        # A new segment is a new entry in the pack directory
+        self._dirs.add(pack_writer.pack_dir)
+
+    def flush(self) -> None:
+        """Make everything registered since the last flush durable."""
+        for path in self._files:
+            _fsync_path(path)
+        for pack_writer in self._packs:
+            pack_writer.sync()
+        for directory in self._dirs:
+            _fsync_path(directory)
+        self._files.clear()
+        self._packs.clear()
+        self._dirs.clear()
+
+
+def _fsync_path(path: Path) -> None:
+    """fsync a file or directory by path."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except (FileNotFoundError, IsADirectoryError, PermissionError):
+        # Gone since it was written, or a directory on Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Some filesystems (and Windows) refuse to fsync directories
+        if not path.is_dir():
+            raise
+    finally:
+        os.close(fd)
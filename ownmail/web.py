@@ -15,7 +15,22 @@ from flask import Flask, abort, g, redirect, render_template, request, send_file
 from zoneinfo import ZoneInfo
 
 from ownmail.archive import EmailArchive
-from ownmail.parser import EmailParser
+from ownmail.parser import (
+    UNREADABLE_CHAR_RE,
+    EmailParser,
+    count_high_bytes,
+    decode_strategy_key,
+    detection_order,
+    remember_decode_strategy,
+)
+from ownmail.storage import (
+    email_exists,
+    is_compressed,
+    is_deduped,
+    is_packed,
+    plain_name,
+    read_email,
+)
 
 # Regex to find external images in HTML
 EXTERNAL_IMAGE_RE = re.compile(
@@ -580,13 +595,14 @@ def decode_header(value) -> str:
 def _extract_snippet(msg: email.message.Message, max_len: int = 150) -> str:
     """Extract a text snippet from email body for preview."""
     try:
+        sender_key = decode_strategy_key(msg)
         # Try to get plain text part first
         if msg.is_multipart():
             for part in msg.walk():
                 if part.get_content_type() == "text/plain":
                     payload = part.get_payload(decode=True)
                     if payload:
-                        text = _decode_text_body(payload, part.get_content_charset())
+                        text = _decode_text_body(payload, part.get_content_charset(), sender_key)
                         # Clean up whitespace and invisible Unicode characters
                         text = _clean_snippet_text(text)
                         return text[:max_len] + "..." if len(text) > max_len else text
@@ -594,7 +610,7 @@ def _extract_snippet(msg: email.message.Message, max_len: int = 150) -> str:
             if msg.get_content_type() == "text/plain":
                 payload = msg.get_payload(decode=True)
                 if payload:
-                    text = _decode_text_body(payload, msg.get_content_charset())
+                    text = _decode_text_body(payload, msg.get_content_charset(), sender_key)
                     text = _clean_snippet_text(text)
                     return text[:max_len] + "..." if len(text) > max_len else text
     except Exception:
@@ -695,33 +711,12 @@ def _validate_decoded_text(text: str, min_readable_ratio: float = 0.7) -> bool:
     if '\ufffd' in text:
         return False
 
-    # Count readable vs unreadable characters
-    readable = 0
-    total = 0
-
-    for char in text[:1000]:  # Sample first 1000 chars
-        code = ord(char)
-        total += 1
-
-        # Consider readable:
-        # - ASCII printable, whitespace
-        # - Latin extended (accented chars)
-        # - CJK characters (Chinese, Japanese, Korean)
-        # - Common punctuation and symbols
-        if (0x20 <= code <= 0x7E or  # ASCII printable
-            code in (0x09, 0x0A, 0x0D) or  # tab, newline, CR
-            0x80 <= code <= 0xFF or  # Latin extended
-            0x4E00 <= code <= 0x9FFF or  # CJK Unified Ideographs
-            0xAC00 <= code <= 0xD7AF or  # Hangul Syllables
-            0x1100 <= code <= 0x11FF or  # Hangul Jamo
-            0x3040 <= code <= 0x309F or  # Hiragana
-            0x30A0 <= code <= 0x30FF or  # Katakana
-            0x3000 <= code <= 0x303F or  # CJK Punctuation
-            0xFF00 <= code <= 0xFFEF):   # Fullwidth forms
-            readable += 1
-
+    # Count readable vs unreadable characters in the first 1000 chars
+    sample = text[:1000]
+    total = len(sample)
     if total == 0:
         return True
+    readable = total - len(UNREADABLE_CHAR_RE.findall(sample))
 
     return (readable / total) >= min_readable_ratio
 
@@ -843,12 +838,14 @@ def _linkify(text: str) -> str:
     return ''.join(result_lines)
 
 
-def _decode_text_body(payload: bytes, header_charset: str | None) -> str:
+def _decode_text_body(payload: bytes, header_charset: str | None, sender_key: str | None = None) -> str:
     """Decode plain text body with smart charset detection.
 
     Args:
         payload: Raw bytes of text content
         header_charset: Charset from Content-Type header (may be None)
+        sender_key: decode_strategy_key() of the message, to try the
+                    codec that worked for this sender before
 
     Returns:
         Decoded text string
@@ -863,16 +860,15 @@ def _decode_text_body(payload: bytes, header_charset: str | None) -> str:
 
     # Check if payload has high bytes (non-ASCII) suggesting CJK encoding
     # Sample multiple regions since Korean content may not appear in first 500 bytes
-    sample_size = min(len(payload), 4000)
-    high_bytes = sum(1 for b in payload[:sample_size] if b >= 0x80)
+    high_bytes = count_high_bytes(payload[:4000])
 
     if high_bytes > 10:
         # Has significant non-ASCII content - try various encodings
         # and validate the result makes sense
-        for encoding in ['utf-8', 'cp949', 'euc-kr', 'gb2312', 'gbk',
-                         'big5', 'shift_jis', 'euc-jp']:
+        for encoding in detection_order(header_charset, sender_key):
             result = _try_decode(payload, encoding)
             if result is not None:
+                remember_decode_strategy(header_charset, sender_key, encoding)
                 return result
 
     # Try common encodings with validation
@@ -884,12 +880,14 @@ def _decode_text_body(payload: bytes, header_charset: str | None) -> str:
     return payload.decode("utf-8", errors="replace")
 
 
-def _decode_html_body(payload: bytes, header_charset: str | None) -> str:
+def _decode_html_body(payload: bytes, header_charset: str | None, sender_key: str | None = None) -> str:
     """Decode HTML body with charset detection from meta tag fallback.
 
     Args:
         payload: Raw bytes of HTML content
         header_charset: Charset from Content-Type header (may be None)
+        sender_key: decode_strategy_key() of the message, to try the
+                    codec that worked for this sender before
 
     Returns:
         Decoded HTML string
@@ -924,15 +922,14 @@ def _decode_html_body(payload: bytes, header_charset: str | None) -> str:
 
     # No charset found - try smart detection like plain text
     # Sample multiple regions since Korean content may not appear in first 500 bytes
-    sample_size = min(len(payload), 4000)
-    high_bytes = sum(1 for b in payload[:sample_size] if b >= 0x80)
+    high_bytes = count_high_bytes(payload[:4000])
 
     if high_bytes > 10:
         # Has significant non-ASCII content - try various encodings
-        for encoding in ['utf-8', 'cp949', 'euc-kr', 'gb2312', 'gbk',
-                         'big5', 'shift_jis', 'euc-jp']:
+        for encoding in detection_order(header_charset, sender_key):
             result = _try_decode(payload, encoding)
             if result is not None:
+                remember_decode_strategy(header_charset, sender_key, encoding)
                 return result
 
     # Try common encodings with validation
@@ -1334,11 +1331,13 @@ def create_app(
         filename = email_info[1]  # filename is second column
         filepath = archive.archive_dir / filename
 
-        if not filepath.exists():
+        if not email_exists(filepath):
             abort(404)
 
         # Get labels from email_labels table
         labels = archive.db.get_labels_for_email(email_id)
+        # Set when the search index only holds the start of a giant body
+        body_indexed_bytes = archive.db.get_body_indexed_bytes(email_id)
 
         # Parse email using EmailParser for proper Korean charset handling
         if verbose:
@@ -1361,8 +1360,7 @@ def create_app(
             sender = decode_header(sender)
 
         # For body and attachments, we still need to parse the message
-        with open(filepath, "rb") as f:
-            msg = email.message_from_binary_file(f, policy=email_policy)
+        msg = email.message_from_bytes(read_email(filepath), policy=email_policy)
 
         # Extract body
         body = ""
@@ -1371,6 +1369,7 @@ def create_app(
         embedded_messages = []  # Collect embedded message/rfc822 for digests
         attachments = []
         cid_images = {}  # Content-ID -> data URI mapping
+        sender_key = decode_strategy_key(msg)
 
         if msg.is_multipart():
             # Track depth to skip content nested inside message/rfc822 parts
@@ -1453,14 +1452,14 @@ def create_app(
                     payload = part.get_payload(decode=True)
                     if payload:
                         # Collect text/plain parts from main message
-                        text = _decode_text_body(payload, part.get_content_charset())
+                        text = _decode_text_body(payload, part.get_content_charset(), sender_key)
                         if text:
                             body_parts.append(text)
                 elif content_type == "text/html" and not body_html:
                     payload = part.get_payload(decode=True)
                     if payload:
                         # Use helper that can extract charset from HTML meta tag
-                        body_html = _decode_html_body(payload, part.get_content_charset())
+                        body_html = _decode_html_body(payload, part.get_content_charset(), sender_key)
 
             # Combine all text parts
             if body_parts:
@@ -1490,10 +1489,10 @@ def create_app(
                 header_charset = msg.get_content_charset()
                 if content_type == "text/html":
                     # Use helper that can extract charset from HTML meta tag
-                    body_html = _decode_html_body(payload, header_charset)
+                    body_html = _decode_html_body(payload, header_charset, sender_key)
                 else:
                     # Use helper that can detect Korean charset
-                    body = _decode_text_body(payload, header_charset)
+                    body = _decode_text_body(payload, header_charset, sender_key)
 
         # Prefer HTML over plain text for better formatting
         # (we already block external images for privacy)
@@ -1576,6 +1575,7 @@ def create_app(
             recipients_parsed=recipients_parsed,
             date=email_data["date"],
             labels=email_data["labels"],
+            body_indexed_kb=(body_indexed_bytes + 1023) // 1024 if body_indexed_bytes is not None else None,
             body=body_linkified,
             body_html=body_html,
             attachments=email_data["attachments"],
@@ -1600,12 +1600,11 @@ def create_app(
         if not filepath.is_relative_to(archive.archive_dir.resolve()):
             abort(404)
 
-        if not filepath.exists():
+        if not email_exists(filepath):
             abort(404)
 
         # Read file content
-        with open(filepath, "rb") as f:
-            content = f.read().decode("utf-8", errors="replace")
+        content = read_email(filepath).decode("utf-8", errors="replace")
 
         # Render HTML page with filepath and content
         from markupsafe import escape
@@ -1648,11 +1647,21 @@ def create_app(
         if not filepath.is_relative_to(archive.archive_dir.resolve()):
             abort(404)
 
-        if not filepath.exists():
+        if not email_exists(filepath):
             abort(404)
 
         # Use the original filename or generate one from email_id
         download_name = filepath.name
+        if is_compressed(filepath) or is_packed(filepath) or is_deduped(filepath):
+            # Serve the plain .eml, whatever the on-disk format
+            import io
+            download_name = plain_name(download_name)
+            return send_file(
+                io.BytesIO(read_email(filepath)),
+                mimetype="message/rfc822",
+                as_attachment=True,
+                download_name=download_name,
+            )
         return send_file(filepath, as_attachment=True, download_name=download_name)
 
     @app.route("/attachment/<email_id>/<int:index>")
@@ -1667,12 +1676,11 @@ def create_app(
         if not filepath.is_relative_to(archive.archive_dir.resolve()):
             abort(404)
 
-        if not filepath.exists():
+        if not email_exists(filepath):
             abort(404)
 
         # Parse email and find attachment
-        with open(filepath, "rb") as f:
-            msg = email.message_from_binary_file(f, policy=email_policy)
+        msg = email.message_from_bytes(read_email(filepath), policy=email_policy)
 
         attachment_idx = 0
         for part in msg.walk():
@@ -964,3 +964,850 @@ class TestBackupContentDedup:
         # First batch (msg0+msg1) failed, second batch (msg2+msg3) succeeded
         assert result["error_count"] == 2
         assert result["success_count"] == 2
+
+
+class TestBackupLabelChanges:
+    """Tests for label change propagation during backup."""
+
+    def test_provider_label_changes_applied(self, temp_dir, capsys):
+        """Label changes reported by the provider update existing emails."""
+        from unittest.mock import MagicMock
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        archive.db.mark_downloaded(_eid("INBOX:5", account), "INBOX:5", "f.eml", account=account)
+        archive.db.apply_label_changes(account, {"INBOX:5": {"add": ["INBOX"]}})
+
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = ([], "{}")
+        provider.get_label_changes.return_value = {"INBOX:5": {"add": [], "remove": ["INBOX"]}}
+
+        archive.backup(provider)
+
+        assert archive.db.get_labels_for_email(_eid("INBOX:5", account)) == []
+        assert "Updated labels for 1 existing emails" in capsys.readouterr().out
+
+    def test_content_dedup_keeps_new_labels(self, temp_dir, capsys):
+        """A duplicate found under a new folder adds that folder as a label."""
+        import hashlib
+        from unittest.mock import MagicMock
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        raw = _raw_email_with_id(7)
+        archive.db.mark_downloaded(
+            _eid("INBOX:7", account), "INBOX:7", "f.eml",
+            content_hash=hashlib.sha256(raw).hexdigest(), account=account,
+        )
+
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (["Archive:70"], None)
+        provider.get_current_sync_state.return_value = None
+        provider.download_message.return_value = (raw, ["Archive"])
+
+        archive.backup(provider)
+
+        assert archive.db.get_labels_for_email(_eid("INBOX:7", account)) == ["Archive"]
+
+
+class TestBackupStreamedMessages:
+    """Tests for providers that return spooled temp files."""
+
+    def _make_provider(self, account, raw):
+        from unittest.mock import MagicMock
+
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (["INBOX:9"], None)
+        provider.get_current_sync_state.return_value = None
+
+        def download(msg_id):
+            spool = provider.spool_dir / "spooled.tmp"
+            spool.write_bytes(raw)
+            return spool, ["INBOX"]
+
+        provider.download_message.side_effect = download
+        return provider
+
+    def test_spooled_message_moved_into_archive(self, temp_dir):
+        import hashlib
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        raw = _raw_email_with_id(9)
+        provider = self._make_provider(account, raw)
+
+        result = archive.backup(provider)
+
+        assert result["success_count"] == 1
+        emails_dir = archive.get_emails_dir("test_source")
+        assert not list(emails_dir.glob("*.tmp"))
+        saved = list(emails_dir.rglob("*.eml"))
+        assert len(saved) == 1 and saved[0].read_bytes() == raw
+        hashes = archive.db.get_downloaded_content_hashes(account)
+        assert hashlib.sha256(raw).hexdigest() in hashes
+        assert archive.search("Body")
+
+    def test_spooled_duplicate_removed(self, temp_dir):
+        import hashlib
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        raw = _raw_email_with_id(9)
+        archive.db.mark_downloaded(
+            _eid("Archive:9", account), "Archive:9", "f.eml",
+            content_hash=hashlib.sha256(raw).hexdigest(), account=account,
+        )
+        provider = self._make_provider(account, raw)
+
+        archive.backup(provider)
+
+        emails_dir = archive.get_emails_dir("test_source")
+        assert not list(emails_dir.rglob("*.tmp"))
+        assert not list(emails_dir.rglob("*.eml"))
+
+    def test_spooled_message_never_loaded_whole(self, temp_dir):
+        """Dedup and indexing of a spooled message read it in bounded pieces."""
+        import base64
+        import os
+        from pathlib import Path
+        from unittest.mock import patch
+
+        from ownmail.blobs import BLOB_DIR
+        from ownmail.storage import read_email
+
+        attachment = base64.encodebytes(os.urandom(200 * 1024)).replace(b"\n", b"\r\n")
+        raw = (
+            b"From: sender@example.com\r\n"
+            b"Subject: Quarterly\r\n"
+            b"Date: Mon, 15 Jan 2024 10:00:00 +0000\r\n"
+            b'Content-Type: multipart/mixed; boundary="b1"\r\n\r\n'
+            b"--b1\r\nContent-Type: text/plain\r\n\r\nQuarterly numbers attached\r\n"
+            b"--b1\r\nContent-Type: application/pdf\r\n"
+            b'Content-Disposition: attachment; filename="forecast.pdf"\r\n'
+            b"Content-Transfer-Encoding: base64\r\n\r\n" + attachment + b"--b1--\r\n"
+        )
+        archive = EmailArchive(temp_dir, {"index": {"max_body_kb": 1}})
+        provider = self._make_provider("test@example.com", raw)
+        real_read_bytes = Path.read_bytes
+
+        def read_bytes(path):
+            assert path.name != "spooled.tmp", "spool file read whole"
+            return real_read_bytes(path)
+
+        with patch.object(Path, "read_bytes", read_bytes):
+            result = archive.backup(provider, dedup_attachments=True)
+
+        assert result["success_count"] == 1
+        saved = list(archive.get_emails_dir("test_source").rglob("*.emlb"))
+        assert len(saved) == 1 and read_email(saved[0]) == raw
+        assert len([p for p in (temp_dir / BLOB_DIR).rglob("*") if p.is_file()]) == 1
+        assert not list(archive.get_emails_dir("test_source").rglob("*.tmp"))
+        assert archive.search("numbers")
+        assert archive.search("forecast")
+
+    def test_read_for_index_keeps_later_part_headers(self, temp_dir):
+        raw = (
+            b"Subject: x\r\n\r\n--b1\r\nContent-Type: text/plain\r\n\r\n"
+            + b"text line\r\n" * 100
+            + b"--b1\r\nContent-Disposition: attachment; filename=\"a.bin\"\r\n\r\n"
+            + b"QUFB\r\n" * 1000 + b"--b1--\r\n"
+        )
+        path = temp_dir / "spooled.tmp"
+        path.write_bytes(raw)
+
+        content = EmailArchive._read_for_index(path, 100)
+
+        assert content.startswith(raw[:400])
+        assert b'filename="a.bin"' in content
+        assert b"QUFB" not in content[400:]
+        assert EmailArchive._read_for_index(path, None) == raw
+
+
+class TestBackupCompressed:
+    """Tests for zstd-compressed email storage."""
+
+    def _make_provider(self, account, raw, spooled=False):
+        from unittest.mock import MagicMock
+
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (["INBOX:9"], None)
+        provider.get_current_sync_state.return_value = None
+
+        def download(msg_id):
+            if not spooled:
+                return raw, ["INBOX"]
+            spool = provider.spool_dir / "spooled.tmp"
+            spool.write_bytes(raw)
+            return spool, ["INBOX"]
+
+        provider.download_message.side_effect = download
+        return provider
+
+    def test_saves_eml_zst(self, temp_dir):
+        import hashlib
+
+        import pytest
+        zstandard = pytest.importorskip("zstandard")
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        raw = _raw_email_with_id(9)
+
+        result = archive.backup(self._make_provider(account, raw), compression="zstd")
+
+        assert result["success_count"] == 1
+        saved = list(archive.get_emails_dir("test_source").rglob("*.eml.zst"))
+        assert len(saved) == 1
+        assert zstandard.ZstdDecompressor().decompress(saved[0].read_bytes()) == raw
+        # Hash is over the uncompressed message
+        assert archive.db.has_content_hash(account, hashlib.sha256(raw).hexdigest())
+        assert archive.search("Body")
+
+    def test_spooled_message_compressed(self, temp_dir):
+        import pytest
+        pytest.importorskip("zstandard")
+
+        from ownmail.storage import read_email
+
+        archive = EmailArchive(temp_dir, {})
+        raw = _raw_email_with_id(9)
+
+        archive.backup(self._make_provider("test@example.com", raw, spooled=True), compression="zstd")
+
+        emails_dir = archive.get_emails_dir("test_source")
+        saved = list(emails_dir.rglob("*.eml.zst"))
+        assert len(saved) == 1 and read_email(saved[0]) == raw
+        assert not list(emails_dir.rglob("*.tmp"))
+
+    def test_unknown_compression_rejected(self, temp_dir):
+        import pytest
+
+        archive = EmailArchive(temp_dir, {})
+
+        with pytest.raises(ValueError, match="Unsupported compression"):
+            archive.backup(self._make_provider("test@example.com", b""), compression="lz4")
+
+
+class TestBackupPackLayout:
+    """Tests for storing emails in pack segments."""
+
+    def test_backup_appends_to_pack(self, temp_dir):
+        from unittest.mock import MagicMock
+
+        from ownmail.storage import is_packed, read_email
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (["INBOX:1", "INBOX:2"], None)
+        provider.get_current_sync_state.return_value = None
+        provider.download_message.side_effect = lambda msg_id: (
+            _raw_email_with_id(int(msg_id.split(":")[1])), ["INBOX"]
+        )
+
+        result = archive.backup(provider, layout="pack")
+
+        assert result["success_count"] == 2
+        emails_dir = archive.get_emails_dir("test_source")
+        assert not list(emails_dir.rglob("*.eml"))
+        assert [p.name for p in (emails_dir / "packs").iterdir()] == ["pack-000001.pack"]
+        assert not archive._pack_writers
+
+        email_info = archive.db.get_email_by_id(_eid("INBOX:1", account))
+        assert is_packed(email_info[1])
+        assert email_info[1].startswith("sources/test_source/packs/pack-000001.pack/")
+        assert "/2024/01/" in email_info[1]
+        assert read_email(temp_dir / email_info[1]) == _raw_email_with_id(1)
+        assert archive.search("Body")
+
+    def test_backup_hash_layout(self, temp_dir):
+        from unittest.mock import MagicMock
+
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (["INBOX:1"], None)
+        provider.get_current_sync_state.return_value = None
+        provider.download_message.return_value = (_raw_email_with_id(1), ["INBOX"])
+
+        archive.backup(provider, layout="hash")
+
+        filename = archive.db.get_email_by_id(_eid("INBOX:1", account))[1]
+        name = filename.rsplit("/", 1)[1]
+        assert filename == f"sources/test_source/2024/01/{name.split('_')[2][:2]}/{name}"
+        assert (temp_dir / filename).read_bytes() == _raw_email_with_id(1)
+
+
+class TestBackupAttachmentDedup:
+    """Tests for moving large attachments into the blob store."""
+
+    def test_backup_dedups_attachments(self, temp_dir):
+        import base64
+        import hashlib
+        import os
+        from unittest.mock import MagicMock
+
+        from ownmail.blobs import BLOB_DIR, BLOB_MIN_BYTES
+        from ownmail.storage import read_email
+
+        attachment = base64.encodebytes(os.urandom(BLOB_MIN_BYTES)).replace(b"\n", b"\r\n")
+
+        def raw_email(n):
+            return (
+                b"From: sender@example.com\r\n"
+                b"Subject: Invoice " + str(n).encode() + b"\r\n"
+                b"Date: Mon, 15 Jan 2024 10:00:00 +0000\r\n"
+                b'Content-Type: multipart/mixed; boundary="b1"\r\n\r\n'
+                b"--b1\r\nContent-Type: text/plain\r\n\r\nBody\r\n"
+                b"--b1\r\nContent-Type: application/pdf\r\n"
+                b"Content-Transfer-Encoding: base64\r\n\r\n" + attachment + b"--b1--\r\n"
+            )
+
+        account = "test@example.com"
+        archive = EmailArchive(temp_dir, {})
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (["INBOX:1", "INBOX:2"], None)
+        provider.get_current_sync_state.return_value = None
+        provider.download_message.side_effect = lambda msg_id: (
+            raw_email(int(msg_id.split(":")[1])), ["INBOX"]
+        )
+
+        result = archive.backup(provider, dedup_attachments=True)
+
+        assert result["success_count"] == 2
+        saved = sorted(archive.get_emails_dir("test_source").rglob("*.emlb"))
+        assert len(saved) == 2
+        assert all(path.stat().st_size < 1000 for path in saved)
+        assert len([p for p in (temp_dir / BLOB_DIR).rglob("*") if p.is_file()]) == 1
+        for n in (1, 2):
+            assert archive.db.has_content_hash(account, hashlib.sha256(raw_email(n)).hexdigest())
+        assert sorted(read_email(path) for path in saved) == sorted([raw_email(1), raw_email(2)])
+        assert archive.search("Invoice")
+
+
+class TestBackupTwoPhase:
+    """Tests for two-phase download (small emails first, large backfilled)."""
+
+    def _make_provider(self, account, ids, sizes):
+        from unittest.mock import MagicMock
+
+        provider = MagicMock()
+        provider.account = account
+        provider.source_name = "test_source"
+        provider.name = "imap"
+        provider.get_new_message_ids.return_value = (ids, '{"INBOX": {"max_uid": 3}}')
+        provider.get_message_sizes.side_effect = lambda mids: {m: sizes[m] for m in mids if m in sizes}
+        provider.download_message.side_effect = (
+            lambda mid: (_raw_email_with_id(int(mid.split(":")[1])), ["INBOX"])
+        )
+        return provider
+
+    def test_large_emails_downloaded_last(self, temp_dir, capsys):
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        provider = self._make_provider(
+            account, ["INBOX:1", "INBOX:2", "INBOX:3"], {"INBOX:1": 9000, "INBOX:2": 100, "INBOX:3": 200},
+        )
+
+        result = archive.backup(provider, backfill_threshold=1000)
+
+        assert result["success_count"] == 3
+        order = [c.args[0] for c in provider.download_message.call_args_list]
+        assert order == ["INBOX:2", "INBOX:3", "INBOX:1"]
+        assert archive.db.get_backfill_ids(account) == []
+        out = capsys.readouterr().out
+        assert "1 large emails will be backfilled" in out
+        assert "Backfilling 1 large emails" in out
+
+    def test_interrupted_backfill_resumes_from_queue(self, temp_dir):
+        archive = EmailArchive(temp_dir, {})
+        account = "test@example.com"
+        provider = self._make_provider(
+            account, ["INBOX:1", "INBOX:2"], {"INBOX:1": 9000, "INBOX:2": 100},
+        )
+        download = provider.download_message.side_effect
+
+        def fail_large(mid):
+            if mid == "INBOX:1":
+                raise ConnectionError("dropped")
+            return download(mid)
+
+        provider.download_message.side_effect = fail_large
+        archive.backup(provider, backfill_threshold=1000)
+
+        # Small email done: sync point saved, large one still queued
+        assert archive.db.get_sync_state(account, "sync_state") == '{"INBOX": {"max_uid": 3}}'
+        assert archive.db.get_backfill_ids(account) == ["INBOX:1"]
+
+        provider.get_new_message_ids.return_value = ([], '{"INBOX": {"max_uid": 3}}')
+        provider.download_message.side_effect = download
+        result = archive.backup(provider, backfill_threshold=1000)
+
+        assert result["success_count"] == 1
+        assert archive.db.get_backfill_ids(account) == []
+
+    def test_disabled_without_threshold(self, temp_dir):
+        archive = EmailArchive(temp_dir, {})
+        provider = self._make_provider("test@example.com", ["INBOX:1", "INBOX:2"], {"INBOX:1": 9000})
+
+        archive.backup(provider)
+
+        provider.get_message_sizes.assert_not_called()
+        order = [c.args[0] for c in provider.download_message.call_args_list]
+        assert order == ["INBOX:1", "INBOX:2"]
+
+
+class TestBackupNewestFirst:
+    """Tests for newest-first scheduling of the download queue."""
+
+    def test_downloads_newest_first_across_folders(self, temp_dir):
+        from unittest.mock import MagicMock
+
+        archive = EmailArchive(temp_dir, {})
+        provider = MagicMock()
+        provider.account = "test@example.com"
+        provider.source_name = "test_source"
+        provider.get_new_message_ids.return_value = (
+            ["INBOX:1", "INBOX:2", "Archive:3", "Archive:4"], None,
+        )
+        provider.get_current_sync_state.return_value = None
+        provider.get_message_dates.return_value = {
+            "INBOX:1": 1_700_000_000, "INBOX:2": 1_720_000_000, "Archive:3": 1_710_000_000,
+        }
+        provider.download_message.side_effect = (
+            lambda mid: (_raw_email_with_id(int(mid.split(":")[1])), [])
+        )
+
+        result = archive.backup(provider)
+
+        assert result["success_count"] == 4
+        order = [c.args[0] for c in provider.download_message.call_args_list]
+        # Undated messages keep their place at the end
+        assert order == ["INBOX:2", "Archive:3", "INBOX:1", "Archive:4"]
+
+    def test_newest_first_keeps_undated_order(self):
+        dates = {"b": 2.0, "c": 3.0}
+        assert EmailArchive._newest_first(["x", "b", "y", "c"], dates) == ["c", "b", "x", "y"]
+
+
+class TestAdaptiveBatchSize:
+    """Tests for the AIMD batch size controller."""
+
+    def test_grows_while_latency_steady(self):
+        from ownmail.archive import AdaptiveBatchSize
+
+        controller = AdaptiveBatchSize(10, 12)
+        for _ in range(5):
+            controller.record(controller.size, controller.size * 0.1, 0, False)
+
+        assert controller.size == 12
+
+    def test_holds_when_latency_rises(self):
+        from ownmail.archive import AdaptiveBatchSize
+
+        controller = AdaptiveBatchSize(10, 50)
+        controller.record(10, 1.0, 0, False)
+        controller.record(11, 5.0, 0, False)
+
+        assert controller.size == 11
+
+    def test_halves_on_throttling(self):
+        from ownmail.archive import AdaptiveBatchSize
+
+        controller = AdaptiveBatchSize(10, 50)
+        controller.record(10, 1.0, 2, True)
+        assert controller.size == 5
+        controller.record(5, 1.0, 5, True)
+        controller.record(2, 1.0, 2, True)
+        controller.record(1, 1.0, 1, True)
+        assert controller.size == 1
+
+    def test_holds_on_plain_errors(self):
+        from ownmail.archive import AdaptiveBatchSize
+
+        controller = AdaptiveBatchSize(10, 50)
+        controller.record(10, 1.0, 3, False)
+
+        assert controller.size == 10
+        assert controller.error_rate == 0.3
+
+    def test_is_throttle_error(self):
+        from ownmail.archive import AdaptiveBatchSize
+
+        assert AdaptiveBatchSize.is_throttle_error("<HttpError 429 Too Many Requests>")
+        assert AdaptiveBatchSize.is_throttle_error("FETCH failed in INBOX")
+        assert AdaptiveBatchSize.is_throttle_error("The read operation timed out")
+        assert not AdaptiveBatchSize.is_throttle_error("No data for UID 4")
+
+    def test_status(self):
+        from ownmail.archive import AdaptiveBatchSize
+
+        controller = AdaptiveBatchSize(10, 50)
+        controller.record(10, 2.0, 1, False)
+
+        assert controller.status() == "batch 10 | 5.0 msg/s | 10% err"
+
+
+class TestBackupAdaptiveBatches:
+    """Tests for adaptive batch sizing during backup."""
+
+    def _make_provider(self, ids, throttle_first=False):
+        from unittest.mock import MagicMock
+
+        provider = MagicMock()
+        provider.account = "test@example.com"
+        provider.source_name = "test_source"
+        provider.download_batch_size = 4
+        provider.max_download_batch_size = 8
+        provider.get_new_message_ids.return_value = (ids, None)
+        provider.get_current_sync_state.return_value = None
+        provider.plan_download_batches.return_value = None
+        calls = []
+
+        def download_batch(batch_ids):
+            calls.append(list(batch_ids))
+            if throttle_first and len(calls) == 1:
+                return {mid: (None, [], "<HttpError 429 rate limit>") for mid in batch_ids}
+            return {
+                mid: (_raw_email_with_id(int(mid.split(":")[1])), [], None)
+                for mid in batch_ids
+            }
+
+        provider.download_messages_batch.side_effect = download_batch
+        return provider, calls
+
+    def test_batches_shrink_after_throttling(self, temp_dir):
+        archive = EmailArchive(temp_dir, {})
+        provider, calls = self._make_provider([f"m:{n}" for n in range(12)], throttle_first=True)
+
+        result = archive.backup(provider)
+
+        assert [len(c) for c in calls][:2] == [4, 2]
+        assert result["error_count"] == 4
+        assert sum(len(c) for c in calls) == 12
+
+    def test_batches_grow_up_to_provider_cap(self, temp_dir):
+        from unittest.mock import patch
+
+        archive = EmailArchive(temp_dir, {})
+        provider, calls = self._make_provider([f"m:{n}" for n in range(40)])
+
+        with patch("ownmail.archive.time.time", side_effect=lambda: 0.0):
+            result = archive.backup(provider)
+
+        assert result["success_count"] == 40
+        sizes = [len(c) for c in calls]
+        assert sizes[:5] == [4, 5, 6, 7, 8]
+        assert max(sizes) == 8
+
+
+class TestBackupRetryQueue:
+    """Tests for retrying failed downloads from the retry queue."""
+
+    def _make_provider(self, ids):
+        from unittest.mock import MagicMock
+
+        provider = MagicMock()
+        provider.account = "test@example.com"
+        provider.source_name = "test_source"
+        provider.name = "imap"
+        provider.get_new_message_ids.return_value = (ids, "state")
+        return provider
+
+    def _make_due(self, archive):
+        import sqlite3
+
+        with sqlite3.connect(archive.db.db_path) as conn:
+            conn.execute("UPDATE download_failures SET next_attempt_at = '2000-01-01T00:00:00'")
+
+    def test_failures_recorded(self, temp_dir):
+        archive = EmailArchive(temp_dir, {})
+        provider = self._make_provider(["m:1", "m:2"])
+        provider.download_message.side_effect = [
+            (_raw_email_with_id(1), []),
+            Exception("Network error"),
+        ]
+
+        archive.backup(provider)
+
+        [(pid, attempts, error, _)] = archive.db.get_download_failures("test@example.com")
+        assert (pid, attempts, error) == ("m:2", 1, "Network error")
+
+    def test_due_failures_retried_first(self, temp_dir, capsys):
+        archive = EmailArchive(temp_dir, {})
+        archive.db.record_download_failures("test@example.com", {"m:9": "timed out"})
+        self._make_due(archive)
+        provider = self._make_provider(["m:1"])
+        provider.download_message.side_effect = (
+            lambda mid: (_raw_email_with_id(int(mid.split(":")[1])), [])
+        )
+
+        result = archive.backup(provider)
+
+        assert result["success_count"] == 2
+        order = [c.args[0] for c in provider.download_message.call_args_list]
+        assert order == ["m:9", "m:1"]
+        assert archive.db.get_download_failures("test@example.com") == []
+        assert "Retrying 1 previously failed emails" in capsys.readouterr().out
+
+    def test_failures_in_backoff_are_skipped(self, temp_dir):
+        archive = EmailArchive(temp_dir, {})
+        archive.db.record_download_failures("test@example.com", {"m:2": "timed out"})
+        provider = self._make_provider(["m:1", "m:2"])
+        provider.download_message.side_effect = (
+            lambda mid: (_raw_email_with_id(int(mid.split(":")[1])), [])
+        )
+
+        result = archive.backup(provider)
+
+        assert result["success_count"] == 1
+        assert [c.args[0] for c in provider.download_message.call_args_list] == ["m:1"]
+        # The pending retry is tracked in the DB, so the sync point can move on
+        assert archive.db.get_sync_state("test@example.com", "sync_state") == "state"
+        assert archive.db.get_failed_ids("test@example.com") == {"m:2"}
+
+
+class TestArchiveWriter:
+    """Tests for the shared writer used by concurrent backups."""
+
+    def test_runs_on_single_thread_and_commits(self, temp_dir):
+        import sqlite3
+        import threading
+
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        writer = ArchiveWriter(archive)
+        try:
+            threads = {writer.run(lambda: threading.get_ident()) for _ in range(3)}
+            writer.run(writer.conn.execute, "INSERT INTO sync_state (key, value) VALUES ('k', 'v')")
+            with sqlite3.connect(archive.db.db_path) as conn:
+                assert conn.execute("SELECT value FROM sync_state WHERE key = 'k'").fetchone() == ("v",)
+        finally:
+            writer.close()
+
+        assert len(threads) == 1 and threads != {threading.get_ident()}
+
+    def test_failed_job_is_rolled_back(self, temp_dir):
+        import sqlite3
+
+        import pytest
+
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        writer = ArchiveWriter(archive)
+
+        def failing_job():
+            writer.conn.execute("INSERT INTO sync_state (key, value) VALUES ('k', 'v')")
+            raise OSError("disk full")
+
+        try:
+            with pytest.raises(OSError):
+                writer.run(failing_job)
+            writer.run(lambda: None)
+        finally:
+            writer.close()
+
+        with sqlite3.connect(archive.db.db_path) as conn:
+            assert conn.execute("SELECT value FROM sync_state WHERE key = 'k'").fetchone() is None
+
+    def test_write_behind_flushed_before_commit(self, temp_dir):
+        from unittest.mock import MagicMock
+
+        import pytest
+
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        writer = ArchiveWriter(archive)
+        events = []
+        write_behind = MagicMock()
+        write_behind.flush.side_effect = lambda: events.append("flush")
+        try:
+            real_conn = writer.conn
+            writer.conn = MagicMock(wraps=real_conn)
+            writer.conn.commit.side_effect = lambda: (events.append("commit"), real_conn.commit())
+            writer.run(lambda: None, write_behind=write_behind)
+            with pytest.raises(ValueError):
+                writer.run(MagicMock(side_effect=ValueError), write_behind=write_behind)
+            writer.conn = real_conn
+        finally:
+            writer.close()
+
+        assert events == ["flush", "commit"]
+
+    def test_report_renders_one_line_per_source(self, temp_dir, capsys):
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        writer = ArchiveWriter(archive)
+        writer.report("personal", "[1/10] downloading...")
+        writer.report("work", "[5/90] downloading...")
+        writer.report("personal", "[2/10] 1.0/s")
+        writer.close()
+
+        out = capsys.readouterr().out
+        assert out.endswith("\r\033[2F\033[J\033[K  personal: [2/10] 1.0/s\n\033[K  work: [5/90] downloading...\n")
+
+    def test_log_prints_above_status_block(self, temp_dir, capsys):
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        writer = ArchiveWriter(archive)
+        writer.report("personal", "[1/10] downloading...")
+        writer.report("work", "[5/90] downloading...")
+        capsys.readouterr()
+        writer.log("[work] Downloaded 3 new emails")
+        writer.close()
+
+        out = capsys.readouterr().out
+        assert out == (
+            "\r\033[2F\033[J[work] Downloaded 3 new emails\n"
+            "\033[K  personal: [1/10] downloading...\n\033[K  work: [5/90] downloading...\n"
+        )
+
+    def test_concurrent_backups_share_writer(self, temp_dir):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import MagicMock
+
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+
+        def make_provider(account, first):
+            provider = MagicMock()
+            provider.account = account
+            provider.source_name = account.split("@")[0]
+            provider.name = "imap"
+            provider.get_new_message_ids.return_value = (
+                [f"INBOX:{n}" for n in range(first, first + 5)], "state",
+            )
+            provider.download_message.side_effect = (
+                lambda mid: (_raw_email_with_id(int(mid.split(":")[1])), ["INBOX"])
+            )
+            return provider
+
+        providers = [make_provider("a@example.com", 0), make_provider("b@example.com", 100)]
+        writer = ArchiveWriter(archive)
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                results = list(executor.map(lambda p: archive.backup(p, writer=writer), providers))
+        finally:
+            writer.close()
+
+        assert [r["success_count"] for r in results] == [5, 5]
+        assert archive._batch_conn is None
+        assert archive.db.get_email_count("a@example.com") == 5
+        assert archive.db.get_email_count("b@example.com") == 5
+        assert archive.db.get_sync_state("b@example.com", "sync_state") == "state"
+
+    def test_concurrent_backups_write_only_on_writer(self, temp_dir):
+        """Label changes, queue cleanup, backfill queueing and sync state all
+        go through the writer, and sync state lands after the emails."""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import MagicMock
+
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        calls = []
+        for name in (
+            "apply_label_changes", "clear_download_failures", "remove_backfill",
+            "queue_backfill", "set_sync_state", "mark_downloaded",
+        ):
+            def spy(*args, _name=name, _method=getattr(archive.db, name), **kwargs):
+                conn = kwargs.get("conn", args[-1] if args else None)
+                calls.append((_name, args[0] if _name != "mark_downloaded" else kwargs["account"],
+                              threading.current_thread().name, conn))
+                return _method(*args, **kwargs)
+            setattr(archive.db, name, spy)
+
+        def make_provider(account, first):
+            # An already-downloaded message still sits in both queues
+            archive.db.mark_downloaded(
+                _eid("INBOX:0", account), "INBOX:0", "old.eml", account=account
+            )
+            archive.db.record_download_failures(account, {"INBOX:0": "timeout"})
+            archive.db.queue_backfill(account, {"INBOX:0": 10})
+            provider = MagicMock()
+            provider.account = account
+            provider.source_name = account.split("@")[0]
+            provider.name = "imap"
+            provider.get_new_message_ids.return_value = (
+                [f"INBOX:{n}" for n in range(first, first + 4)], "state",
+            )
+            provider.get_label_changes.return_value = {"INBOX:0": {"add": ["Archive"]}}
+            provider.get_message_sizes.return_value = {f"INBOX:{first}": 10_000}
+            provider.get_message_dates.return_value = {}
+            provider.download_message.side_effect = (
+                lambda mid: (_raw_email_with_id(int(mid.split(":")[1])), ["INBOX"])
+            )
+            return provider
+
+        providers = [make_provider("a@example.com", 1), make_provider("b@example.com", 100)]
+        calls.clear()
+        writer = ArchiveWriter(archive)
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                results = list(executor.map(
+                    lambda p: archive.backup(p, writer=writer, backfill_threshold=1000), providers
+                ))
+        finally:
+            writer.close()
+
+        assert [r["success_count"] for r in results] == [4, 4]
+        assert {(name, thread.startswith("ownmail-writer")) for name, _, thread, _ in calls} == {
+            (name, True) for name in (
+                "apply_label_changes", "clear_download_failures", "remove_backfill",
+                "queue_backfill", "set_sync_state", "mark_downloaded",
+            )
+        }
+        assert all(conn is not None for _, _, _, conn in calls)
+        for account in ("a@example.com", "b@example.com"):
+            # Sync state follows the three small emails (phase one) and,
+            # again, the backfilled large one
+            names = [name for name, acct, _, _ in calls if acct == account]
+            stores = [k for k, name in enumerate(names) if name == "mark_downloaded"]
+            saves = [k for k, name in enumerate(names) if name == "set_sync_state"]
+            assert saves[0] > stores[2] and saves[-1] > stores[-1]
+            assert archive.db.get_sync_state(account, "sync_state") == "state"
+            assert archive.db.get_labels_for_email(_eid("INBOX:0", account)) == ["Archive"]
+            assert archive.db.get_failed_ids(account) == set()
+            assert archive.db.get_backfill_ids(account) == []
+
+    def test_stop_event_interrupts_backup(self, temp_dir):
+        from unittest.mock import MagicMock
+
+        from ownmail.archive import ArchiveWriter
+
+        archive = EmailArchive(temp_dir, {})
+        provider = MagicMock()
+        provider.account = "a@example.com"
+        provider.source_name = "a"
+        provider.get_new_message_ids.return_value = (["INBOX:1"], "state")
+        writer = ArchiveWriter(archive)
+        writer.stop_event.set()
+        try:
+            result = archive.backup(provider, writer=writer)
+        finally:
+            writer.close()
+
+        assert result["interrupted"] is True
+        provider.download_message.assert_not_called()
+        assert archive.db.get_sync_state("a@example.com", "sync_state") is None
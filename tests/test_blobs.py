@@ -0,0 +1,144 @@
+"""Tests for the content-addressed attachment store."""
+
+import base64
+import hashlib
+import os
+from unittest.mock import patch
+
+from ownmail.blobs import (
+    BLOB_DIR,
+    BLOB_MIN_BYTES,
+    blob_is_intact,
+    blob_path,
+    find_blob_dir,
+    manifest_digests,
+    reassemble,
+    split_attachments,
+    split_attachments_file,
+)
+
+
+def _email_with_attachment(data: bytes, eol: bytes = b"\r\n", width: int = 76, subject: bytes = b"Report") -> bytes:
+    encoded = base64.b64encode(data)
+    body = eol.join(encoded[i:i + width] for i in range(0, len(encoded), width))
+    return eol.join([
+        b"From: sender@example.com",
+        b"Subject: " + subject,
+        b"MIME-Version: 1.0",
+        b'Content-Type: multipart/mixed; boundary="XYZ"',
+        b"",
+        b"--XYZ",
+        b"Content-Type: text/plain",
+        b"",
+        b"See attached.",
+        b"--XYZ",
+        b"Content-Type: application/pdf",
+        b'Content-Disposition: attachment; filename="report.pdf"',
+        b"Content-Transfer-Encoding: base64",
+        b"",
+        body,
+        b"--XYZ--",
+        b"",
+    ])
+
+
+class TestSplitAttachments:
+    """Tests for splitting and reassembling large attachments."""
+
+    def test_round_trip_is_byte_exact(self, temp_dir):
+        blob_dir = temp_dir / BLOB_DIR
+        for eol in (b"\r\n", b"\n"):
+            raw = _email_with_attachment(os.urandom(BLOB_MIN_BYTES), eol=eol)
+
+            stub = split_attachments(raw, blob_dir)
+
+            assert stub is not None and len(stub) < 1000
+            assert reassemble(stub, temp_dir / "sources" / "a" / "x.emlb") == raw
+
+    def test_same_attachment_stored_once(self, temp_dir):
+        blob_dir = temp_dir / BLOB_DIR
+        data = os.urandom(BLOB_MIN_BYTES)
+
+        split_attachments(_email_with_attachment(data, subject=b"One"), blob_dir)
+        split_attachments(_email_with_attachment(data, width=64, subject=b"Two"), blob_dir)
+
+        blobs = [p for p in blob_dir.rglob("*") if p.is_file()]
+        assert len(blobs) == 1
+        assert blobs[0].read_bytes() == data
+
+    def test_small_parts_stay_inline(self, temp_dir):
+        raw = _email_with_attachment(b"tiny logo")
+
+        assert split_attachments(raw, temp_dir / BLOB_DIR) is None
+
+    def test_irregular_encoding_stays_inline(self, temp_dir):
+        raw = _email_with_attachment(os.urandom(BLOB_MIN_BYTES))
+        # A short line in the middle cannot be reproduced by re-encoding
+        lines = raw.split(b"\r\n")
+        lines[20] = lines[20][:40] + b"\r\n" + lines[20][40:]
+        raw = b"\r\n".join(lines)
+
+        assert split_attachments(raw, temp_dir / BLOB_DIR) is None
+
+    def test_torn_blob_is_rewritten(self, temp_dir):
+        blob_dir = temp_dir / BLOB_DIR
+        data = os.urandom(BLOB_MIN_BYTES)
+        path = blob_path(blob_dir, hashlib.sha256(data).hexdigest())
+        path.parent.mkdir(parents=True)
+        path.write_bytes(data[:100])  # Left behind by a crash mid-write
+
+        stub = split_attachments(_email_with_attachment(data), blob_dir)
+
+        assert path.read_bytes() == data
+        assert blob_is_intact(path)
+        assert manifest_digests(stub) == [path.name]
+
+    def test_blob_fsynced_before_rename_with_write_behind(self, temp_dir):
+        from ownmail.storage import WriteBehind
+
+        blob_dir = temp_dir / BLOB_DIR
+        write_behind = WriteBehind()
+        events = []
+        real_replace = os.replace
+        with patch("ownmail.blobs.os.fsync", side_effect=lambda fd: events.append("fsync")), \
+                patch("ownmail.blobs.os.replace",
+                      side_effect=lambda *a: (events.append("replace"), real_replace(*a))):
+            split_attachments(_email_with_attachment(os.urandom(BLOB_MIN_BYTES)), blob_dir, write_behind)
+
+        assert events == ["fsync", "replace"]
+        assert write_behind._files == []
+
+    def test_file_split_matches_bytes_split(self, temp_dir):
+        blob_dir = temp_dir / BLOB_DIR
+        raw = _email_with_attachment(os.urandom(3 * BLOB_MIN_BYTES), eol=b"\n", width=64)
+        spool = temp_dir / "spool.tmp"
+        spool.write_bytes(raw)
+
+        # A small memory budget makes the decoded data spill to a temp file
+        with patch("ownmail.blobs._RUN_MEMORY_BYTES", 1024):
+            stub_path = split_attachments_file(spool, blob_dir)
+
+        assert stub_path is not None and stub_path.parent == temp_dir
+        assert stub_path.read_bytes() == split_attachments(raw, blob_dir)
+        assert reassemble(stub_path.read_bytes(), temp_dir / "x.emlb") == raw
+        assert [p.name for p in blob_dir.rglob("*") if p.is_file()] == manifest_digests(stub_path.read_bytes())
+
+    def test_file_split_without_parts_leaves_nothing(self, temp_dir):
+        spool = temp_dir / "spool.tmp"
+        spool.write_bytes(_email_with_attachment(b"tiny logo"))
+
+        assert split_attachments_file(spool, temp_dir / BLOB_DIR) is None
+        assert sorted(p.name for p in temp_dir.iterdir()) == ["spool.tmp"]
+
+
+class TestFindBlobDir:
+    """Tests for locating the blob store above an email."""
+
+    def test_store_created_after_miss_is_found(self, temp_dir):
+        email_dir = temp_dir / "sources" / "work" / "2024" / "01"
+        email_dir.mkdir(parents=True)
+
+        assert find_blob_dir(email_dir) is None
+
+        (temp_dir / BLOB_DIR).mkdir()
+        assert find_blob_dir(email_dir) == temp_dir / BLOB_DIR
@@ -215,6 +215,43 @@ sources:
         captured = capsys.readouterr()
         assert "Verify" in captured.out
 
+    def test_main_verify_scrub_fraction(self, temp_dir, monkeypatch):
+        """Test verify passes --full and --scrub-fraction through."""
+        from ownmail.cli import main
+
+        config_path = temp_dir / "config.yaml"
+        config_path.write_text(f"archive_root: {temp_dir}\n")
+        monkeypatch.chdir(temp_dir)
+
+        with patch.object(sys, 'argv', ['ownmail', 'verify', '--full', '--scrub-fraction', '1/10']), \
+                patch("ownmail.commands.cmd_verify") as mock_verify:
+            main()
+
+        assert mock_verify.call_args[0][4:] == (True, 0.1)
+
+    def test_main_index_report(self, temp_dir, monkeypatch):
+        """Test index-report passes --sample and repeated --query through."""
+        from ownmail.cli import main
+
+        config_path = temp_dir / "config.yaml"
+        config_path.write_text(f"archive_root: {temp_dir}\n")
+        monkeypatch.chdir(temp_dir)
+        with patch.object(sys, 'argv', ['ownmail', 'index-report', '--sample', '50',
+                                        '--query', 'invoice', '--query', 'budget']), \
+                patch("ownmail.commands.cmd_index_report") as mock_report:
+            main()
+
+        assert mock_report.call_args[0][1:] == (50, ["invoice", "budget"])
+
+    def test_main_verify_rejects_bad_fraction(self, temp_dir, monkeypatch):
+        """Test verify rejects a scrub fraction above 1."""
+        from ownmail.cli import main
+
+        monkeypatch.chdir(temp_dir)
+        with patch.object(sys, 'argv', ['ownmail', 'verify', '--scrub-fraction', '3/2']), \
+                pytest.raises(SystemExit):
+            main()
+
 
 class TestCmdDownload:
     """Tests for download command."""
@@ -1127,3 +1164,220 @@ sources:
         captured = capsys.readouterr()
         # Should report error about secret_ref format
         assert "error" in captured.out.lower() or "invalid" in captured.out.lower() or "keychain:" in captured.out.lower()
+
+
+class TestCmdDownloadParallel:
+    """Tests for downloading several sources at once."""
+
+    def test_download_parallel_runs_all_sources(self, temp_dir, capsys):
+        from ownmail.archive import EmailArchive
+        from ownmail.cli import cmd_download
+
+        config = {
+            "sources": [
+                {"name": "one", "type": "imap", "account": "one@test.com",
+                 "host": "imap.test.com", "auth": {"secret_ref": "keychain:one"}},
+                {"name": "two", "type": "imap", "account": "two@test.com",
+                 "host": "imap.test.com", "auth": {"secret_ref": "keychain:two"}},
+            ]
+        }
+        archive = EmailArchive(temp_dir, config)
+
+        def make_provider(account, **kwargs):
+            provider = MagicMock()
+            provider.account = account
+            provider.source_name = kwargs["source_name"]
+            provider.name = "imap"
+            provider.get_new_message_ids.return_value = ([], None)
+            provider.get_current_sync_state.return_value = None
+            provider.get_transfer_stats.return_value = None
+            return provider
+
+        with patch('ownmail.providers.imap.ImapProvider', side_effect=make_provider) as mock_cls:
+            cmd_download(archive, config, parallel=True)
+
+        assert mock_cls.call_count == 2
+        out = capsys.readouterr().out
+        assert "Downloading 2 sources in parallel" in out
+        assert out.count("Download Complete!") == 2
+        assert archive._batch_conn is None
+
+
+class TestCmdFailed:
+    """Tests for reporting and retrying downloads that were given up on."""
+
+    def _give_up(self, archive, account, provider_id):
+        import sqlite3
+
+        from ownmail.database import MAX_DOWNLOAD_ATTEMPTS
+
+        archive.db.record_download_failures(account, {provider_id: "bad MIME"})
+        with sqlite3.connect(archive.db.db_path) as conn:
+            conn.execute("UPDATE download_failures SET attempts = ?", (MAX_DOWNLOAD_ATTEMPTS,))
+
+    def test_download_summary_reports_given_up(self, temp_dir, capsys):
+        from ownmail.archive import EmailArchive
+        from ownmail.cli import cmd_download
+
+        config = {
+            "sources": [
+                {"name": "test", "type": "imap", "account": "test@test.com",
+                 "host": "imap.test.com", "auth": {"secret_ref": "keychain:test"}}
+            ]
+        }
+        archive = EmailArchive(temp_dir, config)
+        self._give_up(archive, "test@test.com", "INBOX:7")
+
+        with patch('ownmail.providers.imap.ImapProvider') as mock_provider_cls:
+            provider = mock_provider_cls.return_value
+            provider.account = "test@test.com"
+            provider.name = "imap"
+            provider.get_new_message_ids.return_value = ([], None)
+            provider.get_current_sync_state.return_value = None
+            provider.get_transfer_stats.return_value = None
+            cmd_download(archive, config)
+
+        out = capsys.readouterr().out
+        assert "Gave up on: 1 emails" in out
+        assert "'failed --retry'" in out
+
+    def test_list_and_retry(self, temp_dir, capsys):
+        from ownmail.archive import EmailArchive
+        from ownmail.cli import cmd_failed
+
+        config = {"sources": [{"name": "work", "type": "imap", "account": "me@work.com"}]}
+        archive = EmailArchive(temp_dir, config)
+        self._give_up(archive, "me@work.com", "INBOX:7")
+
+        cmd_failed(archive, config)
+        out = capsys.readouterr().out
+        assert "work (me@work.com): 1 emails given up on" in out
+        assert "INBOX:7" in out and "bad MIME" in out
+
+        cmd_failed(archive, config, "work", retry=True)
+        assert "1 emails will be retried" in capsys.readouterr().out
+        assert archive.db.get_retry_ids("me@work.com") == ["INBOX:7"]
+
+    def test_main_dispatches_failed(self, temp_dir, monkeypatch):
+        from ownmail.cli import main
+
+        (temp_dir / "config.yaml").write_text(f"archive_root: {temp_dir}\n")
+        monkeypatch.chdir(temp_dir)
+
+        with patch("ownmail.cli.cmd_failed") as mock_failed, \
+             patch.object(sys, 'argv', ['ownmail', 'failed', '--retry']):
+            main()
+
+        assert mock_failed.call_args.kwargs == {"retry": True}
+
+
+class TestCmdDownloadWatch:
+    """Tests for download --watch."""
+
+    def test_second_ctrl_c_still_closes_writer(self, temp_dir):
+        import os
+        import signal
+        import threading
+
+        from ownmail.archive import ArchiveWriter, EmailArchive
+        from ownmail.cli import _run_sources_with_writer
+
+        archive = EmailArchive(temp_dir, {})
+        release = threading.Event()
+
+        def interrupt_twice(source, writer):
+            os.kill(os.getpid(), signal.SIGINT)
+            writer.stop_event.wait(5)
+            os.kill(os.getpid(), signal.SIGINT)
+            release.wait(5)
+
+        close = ArchiveWriter.close
+        with patch.object(ArchiveWriter, "close", autospec=True, side_effect=close) as mock_close:
+            with pytest.raises(KeyboardInterrupt):
+                _run_sources_with_writer(archive, [{"name": "work"}], interrupt_twice, "Stopping")
+        release.set()
+
+        mock_close.assert_called_once()
+        assert archive._batch_conn is None
+
+    def test_watch_backs_up_again_after_changes(self, temp_dir, capsys):
+        from ownmail.archive import EmailArchive
+        from ownmail.cli import cmd_download
+
+        config = {
+            "sources": [
+                {"name": "work", "type": "imap", "account": "work@test.com",
+                 "host": "imap.test.com", "auth": {"secret_ref": "keychain:work"}},
+            ]
+        }
+        archive = EmailArchive(temp_dir, config)
+        provider = MagicMock()
+        provider.account = "work@test.com"
+        provider.source_name = "work"
+        provider.name = "imap"
+        provider.get_new_message_ids.return_value = ([], None)
+        provider.get_current_sync_state.return_value = None
+        waits = []
+
+        def wait_for_changes(timeout, stop_event):
+            waits.append(timeout)
+            if len(waits) == 2:
+                stop_event.set()
+                return False
+            return True
+
+        provider.wait_for_changes.side_effect = wait_for_changes
+
+        with patch('ownmail.providers.imap.ImapProvider', return_value=provider):
+            cmd_download(archive, config, watch=True)
+
+        assert provider.get_new_message_ids.call_count == 2
+        assert len(waits) == 2
+        provider.close.assert_called_once()
+        assert "Watching work for new emails" in capsys.readouterr().out
+
+    def test_watch_reconnects_after_error(self, temp_dir, capsys):
+        from ownmail.archive import EmailArchive
+        from ownmail.cli import cmd_download
+
+        config = {
+            "sources": [
+                {"name": "work", "type": "imap", "account": "work@test.com",
+                 "host": "imap.test.com", "auth": {"secret_ref": "keychain:work"}},
+            ]
+        }
+        archive = EmailArchive(temp_dir, config)
+        provider = MagicMock()
+        provider.account = "work@test.com"
+        provider.source_name = "work"
+        provider.name = "imap"
+        provider.get_new_message_ids.return_value = ([], None)
+        provider.get_current_sync_state.return_value = None
+        calls = []
+
+        def wait_for_changes(timeout, stop_event):
+            calls.append(timeout)
+            if len(calls) == 1:
+                raise RuntimeError("Connection closed while idling")
+            stop_event.set()
+            return False
+
+        provider.wait_for_changes.side_effect = wait_for_changes
+
+        with patch('ownmail.providers.imap.ImapProvider', return_value=provider) as mock_cls, \
+             patch('ownmail.cli.WATCH_RETRY_DELAY', 0):
+            cmd_download(archive, config, watch=True)
+
+        assert mock_cls.call_count == 2
+        assert provider.close.call_count == 2
+        assert "Connection closed while idling" in capsys.readouterr().out
+
+    def test_watch_rejects_date_filter(self, temp_dir, capsys):
+        from ownmail.cli import main
+
+        with patch('sys.argv', ['ownmail', '--archive-root', str(temp_dir), 'download', '--watch',
+                                '--since', '2024-01-01']):
+            with pytest.raises(SystemExit):
+                main()
+
+        assert "--watch cannot be combined" in capsys.readouterr().err
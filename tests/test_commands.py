@@ -1,8 +1,12 @@
 """Tests for maintenance commands."""
 
 import hashlib
+import os
 import sqlite3
 from pathlib import Path
+from unittest.mock import patch
+
+import pytest
 
 from ownmail.archive import EmailArchive
 from ownmail.commands import (
@@ -156,6 +160,108 @@ class TestCmdVerify:
         captured = capsys.readouterr()
         assert "No emails in database" in captured.out
 
+    def test_verify_many_files_bounded_queue(self, temp_dir, capsys):
+        """Test verify with more files than the in-flight bound."""
+        from ownmail import commands
+
+        archive = EmailArchive(temp_dir, {})
+        emails_dir = temp_dir / "emails" / "2024" / "01"
+        emails_dir.mkdir(parents=True)
+        for i in range(30):
+            data = f"Subject: {i}\r\n\r\nBody".encode()
+            (emails_dir / f"{i}.eml").write_bytes(data)
+            archive.db.mark_downloaded(
+                _eid(str(i)), str(i), f"emails/2024/01/{i}.eml",
+                content_hash=hashlib.sha256(data).hexdigest(),
+            )
+
+        submitted = []
+        real_verify = commands._verify_single_file
+
+        def tracking_verify(item):
+            submitted.append(item)
+            return real_verify(item)
+
+        with patch.object(commands, "_verify_single_file", tracking_verify):
+            cmd_verify(archive, workers=2)
+
+        out = capsys.readouterr().out
+        assert len(submitted) == 30
+        assert "OK: 30" in out
+        assert "MB/s" in out
+        assert "of 2 workers busy" in out
+
+    def _verified_archive(self, temp_dir, data=b"Subject: s\r\n\r\nBody"):
+        archive = EmailArchive(temp_dir, {})
+        path = temp_dir / "emails" / "2024" / "01" / "a.eml"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(data)
+        archive.db.mark_downloaded(
+            _eid("a"), "a", "emails/2024/01/a.eml", content_hash=hashlib.sha256(data).hexdigest()
+        )
+        cmd_verify(archive)
+        return archive, path
+
+    def test_verify_skips_unchanged_files(self, temp_dir, capsys):
+        """Test a second verify does not rehash files whose stat matches."""
+        archive, path = self._verified_archive(temp_dir)
+        capsys.readouterr()
+
+        with patch("ownmail.commands.hash_email") as mock_hash:
+            cmd_verify(archive, scrub_fraction=0)
+
+        mock_hash.assert_not_called()
+        out = capsys.readouterr().out
+        assert "Skipped 1 unchanged files" in out
+        assert "OK: 1" in out
+
+    def test_verify_rehashes_changed_files(self, temp_dir, capsys):
+        """Test a file whose stat changed is rehashed and caught."""
+        archive, path = self._verified_archive(temp_dir)
+        path.write_bytes(b"tampered")
+
+        cmd_verify(archive, scrub_fraction=0)
+
+        assert "CORRUPTED" in capsys.readouterr().out
+
+    def test_verify_scrub_rehashes_unchanged_files(self, temp_dir, capsys):
+        """Test the scrub slice catches corruption that kept the stat."""
+        archive, path = self._verified_archive(temp_dir)
+        st = path.stat()
+        path.write_bytes(b"Subject: s\r\n\r\nBodz")
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        cmd_verify(archive, scrub_fraction=0)
+        assert "CORRUPTED" not in capsys.readouterr().out
+
+        cmd_verify(archive, scrub_fraction=1 / 30)
+        assert "CORRUPTED" in capsys.readouterr().out
+
+    def test_verify_full_rehashes_everything(self, temp_dir, capsys):
+        """Test --full ignores the stat cache."""
+        archive, path = self._verified_archive(temp_dir)
+        capsys.readouterr()
+
+        cmd_verify(archive, full=True, scrub_fraction=0)
+
+        assert "Skipped" not in capsys.readouterr().out
+
+    def test_verify_files_pulls_work_lazily(self, temp_dir):
+        """Test only a bounded number of files is queued ahead."""
+        from ownmail.commands import VERIFY_QUEUE_PER_WORKER, _verify_files
+
+        pulled = []
+
+        def items():
+            for i in range(100):
+                pulled.append(i)
+                yield (temp_dir, f"missing{i}.eml", None, None, False)
+
+        results = _verify_files(items(), workers=2)
+        assert next(results)[0] == "missing"
+        assert len(pulled) <= 2 * VERIFY_QUEUE_PER_WORKER
+        assert len(list(results)) == 99
+
     def test_verify_finds_missing_file(self, temp_dir, capsys):
         """Test verify detects missing files."""
         archive = EmailArchive(temp_dir, {})
@@ -206,6 +312,25 @@ class TestCmdVerify:
         captured = capsys.readouterr()
         assert "OK: 1" in captured.out
 
+    def test_verify_compressed_file(self, temp_dir, sample_eml_simple, capsys):
+        """Test verify hashes the uncompressed bytes of .eml.zst files."""
+        zstandard = pytest.importorskip("zstandard")
+        archive = EmailArchive(temp_dir, {})
+
+        emails_dir = temp_dir / "emails" / "2024" / "01"
+        emails_dir.mkdir(parents=True)
+        email_path = emails_dir / "test.eml.zst"
+        email_path.write_bytes(zstandard.ZstdCompressor().compress(sample_eml_simple))
+
+        content_hash = hashlib.sha256(sample_eml_simple).hexdigest()
+        rel_path = str(email_path.relative_to(temp_dir))
+        archive.db.mark_downloaded(_eid("test123"), "test123", rel_path, content_hash=content_hash)
+
+        cmd_verify(archive)
+        captured = capsys.readouterr()
+        assert "OK: 1" in captured.out
+        assert "On disk but not indexed" not in captured.out
+
     def test_verify_finds_orphaned_files(self, temp_dir, sample_eml_simple, capsys):
         """Test verify detects orphaned files on disk."""
         import hashlib
@@ -251,6 +376,65 @@ class TestCmdVerify:
         assert "Missing from disk" not in captured.out
         assert "On disk but not indexed" not in captured.out
 
+    def test_verify_moves_matched_by_size_and_head(self, temp_dir, sample_eml_simple, capsys):
+        """Test only orphans matching a catalogued missing file are hashed."""
+        from ownmail import commands
+
+        archive = EmailArchive(temp_dir, {})
+        old_path = temp_dir / "emails" / "2024" / "01" / "old_name.eml"
+        old_path.parent.mkdir(parents=True)
+        old_path.write_bytes(sample_eml_simple)
+        archive.db.mark_downloaded(
+            _eid("moved123"), "moved123", "emails/2024/01/old_name.eml",
+            content_hash=hashlib.sha256(sample_eml_simple).hexdigest(),
+        )
+        cmd_verify(archive)  # Catalogues size and head digest
+
+        new_dir = temp_dir / "emails" / "2024" / "02"
+        new_dir.mkdir(parents=True)
+        old_path.rename(new_dir / "new_name.eml")
+        (new_dir / "same_size.eml").write_bytes(b"x" * len(sample_eml_simple))
+        (new_dir / "other.eml").write_bytes(b"unrelated")
+        capsys.readouterr()
+
+        with patch.object(commands, "hash_email", wraps=commands.hash_email) as mock_hash:
+            cmd_verify(archive)
+
+        hashed = [Path(call.args[0]).name for call in mock_hash.call_args_list]
+        assert hashed == ["new_name.eml"]
+        out = capsys.readouterr().out
+        assert "Moved/renamed: 1" in out
+        assert "On disk but not indexed: 2" in out
+
+    def test_scan_email_files_sorted(self, temp_dir):
+        """Test the scandir walker lists nested email files in sorted order."""
+        from ownmail.commands import _scan_email_files
+
+        for rel in ["sources/b/2024/01/x.eml", "sources/a/2024/02/y.eml.zst",
+                    "sources/a/2024/01/z.emlb", "sources/a/2024/01/notes.txt", "emails/top.eml"]:
+            path = temp_dir / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x")
+
+        files = _scan_email_files(temp_dir, ["emails", "sources", "missing"], workers=2)
+
+        assert files == [
+            "emails/top.eml",
+            "sources/a/2024/01/z.emlb",
+            "sources/a/2024/02/y.eml.zst",
+            "sources/b/2024/01/x.eml",
+        ]
+
+    def test_unindexed_files_merge(self):
+        """Test the sorted merge of disk and database listings."""
+        from ownmail.commands import _unindexed_files
+
+        on_disk = ["a", "b", "c", "e", "f"]
+        indexed = ["0", "b", "d", "e", "z"]
+
+        assert list(_unindexed_files(on_disk, indexed)) == ["a", "c", "f"]
+        assert list(_unindexed_files(on_disk, [])) == on_disk
+
     def test_verify_fix_updates_moved_paths(self, temp_dir, sample_eml_simple, capsys):
         """Test verify --fix updates DB paths for moved files."""
         import hashlib
@@ -332,6 +516,73 @@ class TestCmdVerify:
         assert archive.db.get_sync_state("alice@gmail.com", "history_id") is None
         assert archive.db.get_sync_state("bob@gmail.com", "history_id") is None
 
+    def _deduped_archive(self, temp_dir):
+        """Archive with two .emlb emails sharing one attachment blob."""
+        import base64
+
+        from ownmail.blobs import BLOB_DIR, BLOB_MIN_BYTES, split_attachments
+
+        archive = EmailArchive(temp_dir, {})
+        attachment = base64.encodebytes(os.urandom(BLOB_MIN_BYTES)).replace(b"\n", b"\r\n")
+        email_dir = temp_dir / "sources" / "a" / "2024" / "01"
+        email_dir.mkdir(parents=True)
+        for n in (1, 2):
+            raw = (
+                b"Subject: Invoice " + str(n).encode() + b"\r\n"
+                b'Content-Type: multipart/mixed; boundary="b1"\r\n\r\n'
+                b"--b1\r\nContent-Type: application/pdf\r\n"
+                b"Content-Transfer-Encoding: base64\r\n\r\n" + attachment + b"--b1--\r\n"
+            )
+            (email_dir / f"m{n}.emlb").write_bytes(split_attachments(raw, temp_dir / BLOB_DIR))
+            archive.db.mark_downloaded(
+                _eid(f"m{n}"), f"m{n}", f"sources/a/2024/01/m{n}.emlb",
+                content_hash=hashlib.sha256(raw).hexdigest(),
+            )
+        return archive, next((temp_dir / BLOB_DIR).glob("*/*"))
+
+    def test_verify_hashes_shared_blob_once(self, temp_dir, capsys):
+        """Test verified .emlb stubs are not reassembled and a shared blob is hashed once."""
+        from ownmail import commands
+
+        archive, _blob = self._deduped_archive(temp_dir)
+        cmd_verify(archive, scrub_fraction=0)
+        capsys.readouterr()
+
+        hashed = []
+        real_is_intact = commands.blob_is_intact
+
+        def tracking_is_intact(path):
+            hashed.append(path.name)
+            return real_is_intact(path)
+
+        with patch.object(commands, "blob_is_intact", tracking_is_intact), \
+                patch("ownmail.storage.reassemble") as reassemble:
+            cmd_verify(archive, full=True)
+
+        out = capsys.readouterr().out
+        assert "✓ OK: 2" in out
+        assert "✓ Attachment blobs OK: 1 hashed of 1" in out
+        reassemble.assert_not_called()
+        assert len(hashed) == 1
+
+    def test_verify_reports_corrupted_and_unreferenced_blobs(self, temp_dir, capsys):
+        """Test a blob not matching its name, and one no email uses, are reported."""
+        archive, blob = self._deduped_archive(temp_dir)
+        cmd_verify(archive, scrub_fraction=0)
+        capsys.readouterr()
+
+        blob.write_bytes(b"x" * blob.stat().st_size)
+        stray = blob.parent.parent / "ab" / ("ab" + "0" * 62)
+        stray.parent.mkdir()
+        stray.write_bytes(b"stray")
+        cmd_verify(archive, full=True)
+
+        out = capsys.readouterr().out
+        assert "Attachment blobs CORRUPTED (hash mismatch): 1" in out
+        assert f"{blob.name} (2 emails)" in out
+        assert "Attachment blobs not referenced by any email: 1" in out
+        assert "Attachment blobs missing" not in out
+
 
 class TestCmdVerifyDatabase:
     """Tests for verify command database checks (formerly db-check)."""
@@ -1465,6 +1716,90 @@ class TestRebuildForceMode:
         assert fts_count >= 3
 
 
+class TestIndexStripQuotes:
+    """Tests for indexing with index.strip_quotes and the index report."""
+
+    _REPLY = (
+        b"From: a@example.com\r\nSubject: Re: plan\r\nDate: Tue, 2 Jan 2024 10:00:00 +0000\r\n\r\n"
+        b"Agreed on zanzibar.\r\n\r\nOn Mon, 1 Jan 2024, b@example.com wrote:\r\n"
+        b"> What about quokka?\r\n"
+    )
+
+    def _add_reply(self, archive, temp_dir):
+        path = temp_dir / "sources" / "a" / "2024" / "01" / "reply.eml"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(self._REPLY)
+        archive.db.mark_downloaded(_eid("reply"), "reply", str(path.relative_to(temp_dir)))
+
+    def test_rebuild_strips_quotes(self, temp_dir, capsys):
+        archive = EmailArchive(temp_dir, {"index": {"strip_quotes": True}})
+        self._add_reply(archive, temp_dir)
+
+        cmd_rebuild(archive)
+
+        assert archive.search("zanzibar")
+        assert not archive.search("quokka")
+        # The .eml file is untouched
+        assert (temp_dir / "sources/a/2024/01/reply.eml").read_bytes() == self._REPLY
+
+    def test_quotes_indexed_by_default(self, temp_dir, capsys):
+        archive = EmailArchive(temp_dir, {})
+        self._add_reply(archive, temp_dir)
+
+        cmd_rebuild(archive)
+
+        assert archive.search("quokka")
+
+    def test_index_report(self, temp_dir, capsys):
+        from ownmail.commands import cmd_index_report
+
+        archive = EmailArchive(temp_dir, {})
+        self._add_reply(archive, temp_dir)
+
+        cmd_index_report(archive, queries=["quokka"])
+
+        out = capsys.readouterr().out
+        assert "Emails sampled:   1" in out
+        assert "FTS index:" in out
+        assert "quokka" in out
+        # Reporting never touches the archive's own index
+        with sqlite3.connect(archive.db.db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM emails_fts").fetchone()[0] == 0
+
+    def test_index_report_skips_unparsable_files(self, temp_dir, capsys, monkeypatch):
+        from ownmail import commands
+        from ownmail.commands import cmd_index_report
+
+        archive = EmailArchive(temp_dir, {})
+        self._add_reply(archive, temp_dir)
+        (temp_dir / "sources/a/2024/01/bad.eml").write_bytes(b"broken")
+        archive.db.mark_downloaded(_eid("bad"), "bad", "sources/a/2024/01/bad.eml")
+        original = commands.EmailParser.parse_file
+
+        def parse_file(content=None, **kwargs):
+            if b"zanzibar" not in content:
+                raise ValueError("malformed")
+            return original(content=content, **kwargs)
+
+        monkeypatch.setattr(commands.EmailParser, "parse_file", parse_file)
+        cmd_index_report(archive, queries=["zanzibar"])
+
+        out = capsys.readouterr().out
+        assert "Emails sampled:   1" in out
+        assert "Skipped (unreadable): 1" in out
+
+    def test_index_report_default_queries_and_empty_archive(self, temp_dir, capsys):
+        from ownmail.commands import cmd_index_report
+
+        archive = EmailArchive(temp_dir, {})
+        cmd_index_report(archive)
+        assert "No emails in the archive" in capsys.readouterr().out
+
+        self._add_reply(archive, temp_dir)
+        cmd_index_report(archive)
+        assert '"agre"' in capsys.readouterr().out
+
+
 class TestVerifyEndToEnd:
     """End-to-end verify → verify --fix → verify (clean) flow."""
 
@@ -1648,3 +1983,149 @@ class TestVerifyEndToEnd:
             assert b"Moved Email Test" in response.data
             assert b"sender@example.com" in response.data
             assert b"This email was moved on disk." in response.data
+
+
+class TestCmdUnpack:
+    """Tests for unpack command."""
+
+    def test_unpack_writes_plain_files(self, temp_dir, sample_eml_simple, capsys):
+        from ownmail.commands import cmd_unpack
+        from ownmail.storage import PackWriter
+
+        archive = EmailArchive(temp_dir, {})
+        source_dir = temp_dir / "sources" / "work"
+        writer = PackWriter(source_dir / "packs")
+        address = writer.append(sample_eml_simple, "2024/01/20240115_100000_abc.eml")
+        writer.close()
+        rel_path = str(address.relative_to(temp_dir))
+        content_hash = hashlib.sha256(sample_eml_simple).hexdigest()
+        archive.db.mark_downloaded(_eid("msg1"), "msg1", rel_path, content_hash=content_hash)
+
+        cmd_unpack(archive)
+
+        email_info = archive.db.get_email_by_id(_eid("msg1"))
+        assert email_info[1] == "sources/work/2024/01/20240115_100000_abc.eml"
+        assert (temp_dir / email_info[1]).read_bytes() == sample_eml_simple
+        assert not list((source_dir / "packs").iterdir())
+        assert "Unpacked: 1 emails" in capsys.readouterr().out
+
+    def test_unpack_source_name_is_not_a_pattern(self, temp_dir, sample_eml_simple):
+        from ownmail.commands import cmd_unpack
+        from ownmail.storage import PackWriter
+
+        archive = EmailArchive(temp_dir, {})
+        for source, msg_id in (("my_work", "msg1"), ("myXwork", "msg2")):
+            writer = PackWriter(temp_dir / "sources" / source / "packs")
+            address = writer.append(sample_eml_simple, f"2024/01/{msg_id}.eml")
+            writer.close()
+            archive.db.mark_downloaded(_eid(msg_id), msg_id, str(address.relative_to(temp_dir)))
+
+        cmd_unpack(archive, "my_work")
+
+        assert archive.db.get_email_by_id(_eid("msg1"))[1] == "sources/my_work/2024/01/msg1.eml"
+        assert ".pack/" in archive.db.get_email_by_id(_eid("msg2"))[1]
+
+    def test_unpack_syncs_files_before_commit(self, temp_dir, sample_eml_simple):
+        from ownmail.commands import cmd_unpack
+        from ownmail.storage import PackWriter, WriteBehind
+
+        archive = EmailArchive(temp_dir, {})
+        writer = PackWriter(temp_dir / "sources" / "work" / "packs")
+        address = writer.append(sample_eml_simple, "2024/01/msg1.eml")
+        writer.close()
+        archive.db.mark_downloaded(_eid("msg1"), "msg1", str(address.relative_to(temp_dir)))
+
+        events = []
+        real_flush = WriteBehind.flush
+
+        def flush(self):
+            events.append(("flush", list(self._files)))
+            real_flush(self)
+
+        real_connect = sqlite3.connect
+
+        class Conn:
+            def __init__(self, *args):
+                self._conn = real_connect(*args)
+
+            def commit(self):
+                events.append(("commit",))
+                self._conn.commit()
+
+            def __getattr__(self, name):
+                return getattr(self._conn, name)
+
+        with patch.object(WriteBehind, "flush", flush), \
+             patch("ownmail.commands.sqlite3.connect", Conn):
+            cmd_unpack(archive)
+
+        assert events[0] == ("flush", [temp_dir / "sources/work/2024/01/msg1.eml"])
+        assert events[1] == ("commit",)
+
+    def test_unpack_nothing_packed(self, temp_dir, capsys):
+        from ownmail.commands import cmd_unpack
+
+        cmd_unpack(EmailArchive(temp_dir, {}))
+
+        assert "No packed emails found" in capsys.readouterr().out
+
+
+class TestCmdRelayout:
+    """Tests for relayout command."""
+
+    def _add(self, archive, temp_dir, rel_path, data, msg_id):
+        path = temp_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        archive.db.mark_downloaded(
+            _eid(msg_id), msg_id, rel_path, content_hash=hashlib.sha256(data).hexdigest()
+        )
+
+    def test_moves_files_and_updates_rows(self, temp_dir, sample_eml_simple, capsys):
+        from ownmail.commands import cmd_relayout
+
+        archive = EmailArchive(temp_dir, {})
+        self._add(archive, temp_dir, "sources/work/2024/01/20240115_100000_ab12.eml", sample_eml_simple, "msg1")
+        self._add(archive, temp_dir, "sources/work/unknown/unknown_cd34.eml", b"x", "msg2")
+
+        cmd_relayout(archive, "hash")
+
+        assert archive.db.get_email_by_id(_eid("msg1"))[1] == "sources/work/2024/01/ab/20240115_100000_ab12.eml"
+        assert archive.db.get_email_by_id(_eid("msg2"))[1] == "sources/work/unknown/cd/unknown_cd34.eml"
+        assert (temp_dir / "sources/work/2024/01/ab/20240115_100000_ab12.eml").read_bytes() == sample_eml_simple
+        assert not (temp_dir / "sources/work/2024/01/20240115_100000_ab12.eml").exists()
+        assert "Moved: 2 emails" in capsys.readouterr().out
+
+        cmd_relayout(archive, "day")
+
+        assert archive.db.get_email_by_id(_eid("msg1"))[1] == "sources/work/2024/01/15/20240115_100000_ab12.eml"
+        assert not (temp_dir / "sources/work/2024/01/ab").exists()
+
+    def test_resumes_after_interrupted_move(self, temp_dir, sample_eml_simple):
+        from ownmail.commands import cmd_relayout
+
+        archive = EmailArchive(temp_dir, {})
+        rel_path = "sources/work/2024/01/20240115_100000_ab12.eml"
+        self._add(archive, temp_dir, rel_path, sample_eml_simple, "msg1")
+        # Linked into the new layout, but the row was never committed
+        target = temp_dir / "sources/work/2024/01/15/20240115_100000_ab12.eml"
+        target.parent.mkdir(parents=True)
+        os.link(temp_dir / rel_path, target)
+
+        cmd_relayout(archive, "day")
+
+        assert archive.db.get_email_by_id(_eid("msg1"))[1] == "sources/work/2024/01/15/20240115_100000_ab12.eml"
+        assert target.read_bytes() == sample_eml_simple
+        assert not (temp_dir / rel_path).exists()
+
+    def test_skips_unrecognized_and_packed(self, temp_dir, capsys):
+        from ownmail.commands import cmd_relayout
+
+        archive = EmailArchive(temp_dir, {})
+        self._add(archive, temp_dir, "sources/work/imported/message.eml", b"x", "msg1")
+        archive.db.mark_downloaded(_eid("msg2"), "msg2", "sources/work/packs/pack-000001.pack/12+5/2024/01/x.eml")
+
+        cmd_relayout(archive, "day")
+
+        assert archive.db.get_email_by_id(_eid("msg1"))[1] == "sources/work/imported/message.eml"
+        assert "already use the 'day' layout" in capsys.readouterr().out
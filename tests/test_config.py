@@ -6,6 +6,8 @@ import pytest
 
 from ownmail.config import (
     get_archive_root,
+    get_index_limits,
+    get_index_strip_quotes,
     get_source_by_account,
     get_source_by_name,
     get_sources,
@@ -199,6 +201,29 @@ class TestValidateConfig:
         errors = validate_config(config)
         assert errors == []
 
+    def test_unknown_compression(self):
+        """Test error on an unsupported compression setting."""
+        config = {
+            "sources": [
+                {"name": "work", "type": "gmail_api", "account": "a@test.com",
+                 "auth": {"secret_ref": "keychain:a"}, "compression": "lz4"},
+            ]
+        }
+        errors = validate_config(config)
+        assert any("unsupported compression 'lz4'" in e for e in errors)
+
+    def test_invalid_index_limits(self):
+        """Test error on negative or non-integer index caps."""
+        errors = validate_config({"index": {"max_body_kb": -1, "max_part_kb": "big"}})
+        assert any("index.max_body_kb" in e for e in errors)
+        assert any("index.max_part_kb" in e for e in errors)
+        assert validate_config({"index": {"max_body_kb": 0, "max_part_kb": 64}}) == []
+
+    def test_invalid_strip_quotes(self):
+        """Test error on a non-boolean index.strip_quotes."""
+        errors = validate_config({"index": {"strip_quotes": "yes"}})
+        assert any("index.strip_quotes" in e for e in errors)
+
     def test_missing_name_field(self):
         """Test error when source missing name."""
         config = {"sources": [{"type": "gmail_api"}]}
@@ -300,3 +325,29 @@ class TestValidateConfig:
         config = {"sources": []}
         errors = validate_config(config)
         assert errors == []
+
+
+class TestGetIndexLimits:
+    """Tests for get_index_limits function."""
+
+    def test_defaults(self):
+        from ownmail.parser import INDEX_BODY_MAX_BYTES, INDEX_PART_MAX_BYTES
+        assert get_index_limits({}) == {
+            "max_body_bytes": INDEX_BODY_MAX_BYTES,
+            "max_part_bytes": INDEX_PART_MAX_BYTES,
+        }
+
+    def test_kb_and_zero_for_no_limit(self):
+        limits = get_index_limits({"index": {"max_body_kb": 0, "max_part_kb": 64}})
+        assert limits == {"max_body_bytes": None, "max_part_bytes": 64 * 1024}
+
+
+class TestGetIndexStripQuotes:
+    """Tests for get_index_strip_quotes function."""
+
+    def test_off_by_default(self):
+        assert get_index_strip_quotes({}) is False
+        assert get_index_strip_quotes({"index": None}) is False
+
+    def test_enabled(self):
+        assert get_index_strip_quotes({"index": {"strip_quotes": True}}) is True
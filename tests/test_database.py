@@ -512,3 +512,203 @@ class TestSearchWithAccount:
         assert len(results_bob) == 1
         assert results_bob[0][0] == _eid("msg2", "bob@gmail.com")
         assert len(results_all) == 2
+
+
+class TestLabelChanges:
+    """Tests for applying label changes to downloaded emails."""
+
+    def test_apply_label_changes(self, temp_dir):
+        """Labels are added and removed by provider_id."""
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+        db.mark_downloaded(_eid("INBOX:4", account), "INBOX:4", "f1.eml", account=account)
+        db.index_email(_eid("INBOX:4", account), "S", "F", "T", "D", "B", "", labels="INBOX")
+
+        updated = db.apply_label_changes(account, {
+            "INBOX:4": {"add": ["Archive"], "remove": ["INBOX"]},
+            "INBOX:99": {"add": [], "remove": ["INBOX"]},  # Not downloaded
+        })
+
+        assert updated == 1
+        assert db.get_labels_for_email(_eid("INBOX:4", account)) == ["Archive"]
+
+    def test_add_labels_by_content_hash(self, temp_dir):
+        """Labels attach to the email that already has the content hash."""
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+        db.mark_downloaded(_eid("INBOX:4", account), "INBOX:4", "f1.eml",
+                           content_hash="abc", account=account)
+
+        db.add_labels_by_content_hash(account, "abc", ["Archive"])
+        db.add_labels_by_content_hash(account, "missing", ["Other"])
+
+        assert db.get_labels_for_email(_eid("INBOX:4", account)) == ["Archive"]
+
+    def test_apply_label_changes_set_replaces_labels(self, temp_dir):
+        """A "set" change replaces every stored label."""
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@gmail.com"
+        db.mark_downloaded(_eid("[Gmail]/All Mail:4", account), "[Gmail]/All Mail:4", "f1.eml", account=account)
+        db.apply_label_changes(account, {"[Gmail]/All Mail:4": {"add": ["INBOX", "Old"]}})
+
+        db.apply_label_changes(account, {"[Gmail]/All Mail:4": {"set": ["[Gmail]/All Mail", "Work"]}})
+
+        assert sorted(db.get_labels_for_email(_eid("[Gmail]/All Mail:4", account))) == ["Work", "[Gmail]/All Mail"]
+
+
+class TestDownloadedMembership:
+    """Tests for SQLite-side checks of already-downloaded emails."""
+
+    def test_filter_new_ids_keeps_order(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+        db.mark_downloaded("id1", "msg2", "emails/a.eml", "hash1", account)
+        db.mark_downloaded("id2", "msg4", "emails/b.eml", "hash2", "bob@example.com")
+
+        new_ids = db.filter_new_ids(account, ["msg5", "msg2", "msg4", "msg1"])
+
+        assert new_ids == ["msg5", "msg4", "msg1"]
+        assert db.filter_new_ids(account, []) == []
+
+    def test_has_content_hash(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        db.mark_downloaded("id1", "msg1", "emails/a.eml", "hash1", "alice@example.com")
+
+        assert db.has_content_hash("alice@example.com", "hash1")
+        assert not db.has_content_hash("alice@example.com", "hash2")
+        assert not db.has_content_hash("bob@example.com", "hash1")
+
+
+class TestBodyIndexedBytes:
+    """Tests for recording capped body indexing."""
+
+    def test_recorded_and_cleared_on_reindex(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        db.mark_downloaded(_eid("big"), "big", "big.eml")
+        fields = {"subject": "Logs", "sender": "a@example.com", "recipients": "b@example.com",
+                  "date_str": "", "body": "x" * 100, "attachments": ""}
+
+        db.index_email(email_id=_eid("big"), body_indexed_bytes=100, **fields)
+        assert db.get_body_indexed_bytes(_eid("big")) == 100
+
+        db.index_email(email_id=_eid("big"), **fields)
+        assert db.get_body_indexed_bytes(_eid("big")) is None
+        assert db.get_body_indexed_bytes(_eid("unknown")) is None
+
+
+class TestFileCatalog:
+    """Tests for the verify stat cache."""
+
+    def test_update_and_scrub_order(self, temp_dir):
+        import sqlite3
+
+        db = ArchiveDatabase(temp_dir)
+        for name in ("a", "b", "c"):
+            db.mark_downloaded(f"id_{name}", name, f"emails/{name}.eml", "hash")
+        db.update_file_catalog([("emails/a.eml", 1, 2, 3, "h")], [])
+        db.update_file_catalog([("emails/b.eml", 1, 2, 3, "h"), ("emails/c.eml", 1, 2, 3, "h")], [])
+
+        assert db.get_scrub_filenames(1) == {"emails/a.eml"}
+        assert db.get_scrub_filenames(0) == set()
+
+        db.update_file_catalog([], ["emails/b.eml"])
+        with sqlite3.connect(db.db_path) as conn:
+            names = [r[0] for r in conn.execute("SELECT filename FROM file_catalog ORDER BY filename")]
+        assert names == ["emails/a.eml", "emails/c.eml"]
+
+    def test_drops_rows_without_email(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        db.update_file_catalog([("emails/gone.eml", 1, 2, 3, "h")], [])
+
+        assert db.get_scrub_filenames(10) == set()
+
+
+class TestDownloadBackfill:
+    """Tests for the two-phase download backfill queue."""
+
+    def test_queue_and_remove(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+
+        db.queue_backfill(account, {"INBOX:2": 9000, "INBOX:1": 5000})
+        db.queue_backfill("bob@example.com", {"INBOX:3": 7000})
+
+        assert db.get_backfill_ids(account) == ["INBOX:1", "INBOX:2"]
+
+        db.remove_backfill(account, ["INBOX:1"])
+        assert db.get_backfill_ids(account) == ["INBOX:2"]
+        assert db.get_backfill_ids("bob@example.com") == ["INBOX:3"]
+
+    def test_queue_is_idempotent(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        db.queue_backfill("alice@example.com", {"INBOX:1": 5000})
+        db.queue_backfill("alice@example.com", {"INBOX:1": 5000})
+
+        assert db.get_backfill_ids("alice@example.com") == ["INBOX:1"]
+
+
+class TestDownloadFailures:
+    """Tests for the persistent retry queue of failed downloads."""
+
+    def test_record_and_backoff(self, temp_dir):
+        from datetime import datetime
+
+        from ownmail.database import RETRY_BASE_DELAY
+
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+
+        db.record_download_failures(account, {"INBOX:1": "timed out"})
+        db.record_download_failures(account, {"INBOX:1": "429 rate limit"})
+
+        [(pid, attempts, last_error, next_at)] = db.get_download_failures(account)
+        assert (pid, attempts, last_error) == ("INBOX:1", 2, "429 rate limit")
+        delay = datetime.fromisoformat(next_at) - datetime.now()
+        assert RETRY_BASE_DELAY < delay.total_seconds() <= 2 * RETRY_BASE_DELAY
+        # Not due yet
+        assert db.get_retry_ids(account) == []
+        assert db.get_failed_ids(account) == {"INBOX:1"}
+
+    def test_due_failures_returned(self, temp_dir):
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+        db.record_download_failures(account, {"INBOX:1": "err", "INBOX:2": "err"})
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute("UPDATE download_failures SET next_attempt_at = '2000-01-01T00:00:00'")
+
+        assert sorted(db.get_retry_ids(account)) == ["INBOX:1", "INBOX:2"]
+
+        db.clear_download_failures(account, ["INBOX:1"])
+        assert db.get_retry_ids(account) == ["INBOX:2"]
+
+    def test_poison_messages_not_retried(self, temp_dir):
+        from ownmail.database import MAX_DOWNLOAD_ATTEMPTS
+
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+        db.record_download_failures(account, {"INBOX:1": "err"})
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute(
+                "UPDATE download_failures SET attempts = ?, next_attempt_at = '2000-01-01T00:00:00'",
+                (MAX_DOWNLOAD_ATTEMPTS,),
+            )
+
+        assert db.get_retry_ids(account) == []
+        assert db.get_failed_ids(account) == {"INBOX:1"}
+
+    def test_exhausted_failures_listed_and_reset(self, temp_dir):
+        from ownmail.database import MAX_DOWNLOAD_ATTEMPTS
+
+        db = ArchiveDatabase(temp_dir)
+        account = "alice@example.com"
+        db.record_download_failures(account, {"INBOX:1": "bad MIME", "INBOX:2": "timed out"})
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute(
+                "UPDATE download_failures SET attempts = ? WHERE provider_id = 'INBOX:1'",
+                (MAX_DOWNLOAD_ATTEMPTS,),
+            )
+
+        assert db.get_exhausted_failures(account) == [("INBOX:1", MAX_DOWNLOAD_ATTEMPTS, "bad MIME")]
+        assert db.reset_exhausted_failures(account) == 1
+        assert db.get_exhausted_failures(account) == []
+        assert db.get_retry_ids(account) == ["INBOX:1"]
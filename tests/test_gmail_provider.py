@@ -663,3 +663,89 @@ class TestDownloadMessagesBatch:
             assert "INBOX" in labels
             assert "Work" in labels
             assert error is None
+
+
+class TestGmailMessageSizes:
+    """Tests for size lookups used by two-phase download."""
+
+    def test_get_message_sizes(self):
+        from ownmail.providers.gmail import GmailProvider
+
+        provider = GmailProvider(account="alice@gmail.com", keychain=MagicMock())
+        provider._service = MagicMock()
+        responses = {"msg1": {"id": "msg1", "sizeEstimate": 1200}, "msg2": {"id": "msg2"}}
+
+        def new_batch(callback):
+            batch = MagicMock()
+            added = []
+            batch.add = lambda request, request_id: added.append(request_id)
+            batch.execute = lambda: [callback(rid, responses[rid], None) for rid in added]
+            return batch
+
+        provider._service.new_batch_http_request = new_batch
+
+        with patch("ownmail.providers.gmail.time.sleep"):
+            sizes = provider.get_message_sizes(["msg1", "msg2"])
+
+        assert sizes == {"msg1": 1200}
+        get = provider._service.users.return_value.messages.return_value.get
+        assert get.call_args.kwargs["format"] == "minimal"
+
+
+class TestGmailWaitForChanges:
+    """Tests for history polling in watch mode."""
+
+    def test_returns_when_history_id_moves(self):
+        import threading
+
+        from ownmail.providers.gmail import GmailProvider
+
+        provider = GmailProvider(account="alice@gmail.com", keychain=MagicMock())
+        provider._service = MagicMock()
+        profile = provider._service.users.return_value.getProfile.return_value
+        profile.execute.side_effect = [
+            {"historyId": "100"}, {"historyId": "100"}, {"historyId": "105"},
+        ]
+        stop_event = MagicMock(spec=threading.Event)
+        stop_event.wait.return_value = False
+
+        assert provider.wait_for_changes(3600, stop_event) is True
+        assert stop_event.wait.call_count == 2
+
+    def test_compares_against_synced_history_id(self):
+        """Mail that arrived between the listing and the wait is seen at once."""
+        import threading
+
+        from ownmail.providers.gmail import GmailProvider
+
+        provider = GmailProvider(account="alice@gmail.com", keychain=MagicMock())
+        provider._service = MagicMock()
+        users = provider._service.users.return_value
+        users.history.return_value.list.return_value.execute.return_value = {
+            "history": [{"messagesAdded": [{"message": {"id": "new1"}}]}],
+            "historyId": "100",
+        }
+        # New mail moved the mailbox on before the wait started
+        users.getProfile.return_value.execute.return_value = {"historyId": "105"}
+        stop_event = MagicMock(spec=threading.Event)
+        stop_event.wait.return_value = False
+
+        new_ids, new_state = provider.get_new_message_ids("90")
+
+        assert (new_ids, new_state) == (["new1"], "100")
+        assert provider.wait_for_changes(3600, stop_event) is True
+        assert stop_event.wait.call_count == 1
+
+    def test_stops_when_stop_event_set(self):
+        import threading
+
+        from ownmail.providers.gmail import GmailProvider
+
+        provider = GmailProvider(account="alice@gmail.com", keychain=MagicMock())
+        provider._service = MagicMock()
+        profile = provider._service.users.return_value.getProfile.return_value
+        profile.execute.return_value = {"historyId": "100"}
+        stop_event = threading.Event()
+        stop_event.set()
+
+        assert provider.wait_for_changes(3600, stop_event) is False
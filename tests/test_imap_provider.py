@@ -1242,3 +1242,769 @@ class TestImapFilterByDate:
 
         result = provider._filter_uids_by_date("INBOX", [1, 2, 3], None, None)
         assert result == [1, 2, 3]
+
+
+class TestImapFolderStatus:
+    """Tests for STATUS-based skipping of unchanged folders."""
+
+    def _make_provider(self, host="imap.fastmail.com"):
+        from ownmail.providers.imap import ImapProvider
+
+        mock_keychain = MagicMock()
+        provider = ImapProvider(
+            account="alice@example.com",
+            keychain=mock_keychain,
+            host=host,
+            exclude_folders=[],
+        )
+        provider._conn = MagicMock()
+        return provider
+
+    def test_get_folder_status_parses_response(self):
+        provider = self._make_provider()
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (MESSAGES 5 UIDNEXT 106 UIDVALIDITY 42)'],
+        )
+
+        result = provider._get_folder_status("INBOX")
+        assert result == {"uidnext": 106, "uidvalidity": 42, "messages": 5}
+        provider._conn.status.assert_called_once_with(
+            '"INBOX"', "(UIDNEXT UIDVALIDITY MESSAGES)"
+        )
+
+    def test_get_folder_status_closes_selected_mailbox_first(self):
+        provider = self._make_provider()
+        provider._conn.state = "SELECTED"
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (MESSAGES 5 UIDNEXT 106 UIDVALIDITY 42)'],
+        )
+
+        assert provider._get_folder_status("INBOX")["uidnext"] == 106
+        assert [c[0] for c in provider._conn.method_calls] == ["close", "status"]
+
+    def test_get_folder_status_keeps_authenticated_state(self):
+        provider = self._make_provider()
+        provider._conn.state = "AUTH"
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (MESSAGES 5 UIDNEXT 106 UIDVALIDITY 42)'],
+        )
+
+        provider._get_folder_status("INBOX")
+        provider._conn.close.assert_not_called()
+
+    def test_get_folder_status_failure_returns_none(self):
+        provider = self._make_provider()
+        provider._conn.status.return_value = ("NO", [b"not supported"])
+        assert provider._get_folder_status("INBOX") is None
+
+        provider._conn.status.side_effect = Exception("connection reset")
+        assert provider._get_folder_status("INBOX") is None
+
+    def test_get_folder_status_missing_uidnext(self):
+        provider = self._make_provider()
+        provider._conn.status.return_value = ("OK", [b'"INBOX" (MESSAGES 5)'])
+        assert provider._get_folder_status("INBOX") is None
+
+    def test_unchanged_folder_skips_select(self, capsys):
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK",
+            [b'(\\HasNoChildren) "/" "INBOX"', b'(\\HasNoChildren) "/" "Sent"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 11 UIDVALIDITY 1 MESSAGES 10)'],
+        )
+
+        state = json.dumps({
+            "INBOX": {"max_uid": 10, "uidvalidity": "1"},
+            "Sent": {"max_uid": 10, "uidvalidity": "1"},
+        })
+        with patch("ownmail.providers.imap.time.sleep") as mock_sleep:
+            new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert new_ids == []
+        assert json.loads(new_state) == json.loads(state)
+        provider._conn.select.assert_not_called()
+        provider._conn.uid.assert_not_called()
+        mock_sleep.assert_not_called()
+        assert "Skipped 2 unchanged folders" in capsys.readouterr().out
+
+    def test_changed_folder_uses_uidnext_for_max_uid(self, capsys):
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"'],
+        )
+        # UID 12 was expunged after arrival, so UIDNEXT is ahead of the search
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 13 UIDVALIDITY 1 MESSAGES 11)'],
+        )
+        provider._conn.select.return_value = ("OK", [b"11"])
+        provider._conn.response.return_value = ("OK", [b"1"])
+
+        def mock_uid(cmd, *args):
+            if cmd == "search":
+                return ("OK", [b"11"])
+            return ("OK", [
+                (b'11 (UID 11 BODY[HEADER.FIELDS (MESSAGE-ID)] {30}',
+                 b'Message-ID: <new@test.com>\r\n\r\n'),
+                b')',
+            ])
+
+        provider._conn.uid.side_effect = mock_uid
+
+        state = json.dumps({"INBOX": {"max_uid": 10, "uidvalidity": "1"}})
+        with patch("ownmail.providers.imap.time.sleep"):
+            new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert new_ids == ["INBOX:11"]
+        assert json.loads(new_state)["INBOX"]["max_uid"] == 12
+        # No full UID SEARCH ALL just to compute max_uid
+        search_args = [c.args for c in provider._conn.uid.call_args_list if c.args[0] == "search"]
+        assert all(args[2] != "ALL" for args in search_args)
+
+    def test_uidvalidity_change_is_not_skipped(self, capsys):
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 4 UIDVALIDITY 2 MESSAGES 3)'],
+        )
+        provider._conn.select.return_value = ("OK", [b"3"])
+        provider._conn.response.return_value = ("OK", [b"2"])
+        provider._conn.uid.return_value = ("OK", [b"1 2 3"])
+
+        state = json.dumps({"INBOX": {"max_uid": 10, "uidvalidity": "1"}})
+        with patch("ownmail.providers.imap.time.sleep"):
+            new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert "UIDVALIDITY changed" in capsys.readouterr().out
+        assert json.loads(new_state)["INBOX"] == {"max_uid": 3, "uidvalidity": "2"}
+
+    def test_get_current_sync_state_uses_status(self):
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 51 UIDVALIDITY 12345 MESSAGES 4)'],
+        )
+
+        state = json.loads(provider.get_current_sync_state())
+        assert state == {"INBOX": {"max_uid": 50, "uidvalidity": "12345"}}
+        provider._conn.select.assert_not_called()
+
+
+class TestImapCondstore:
+    """Tests for CONDSTORE/QRESYNC change tracking."""
+
+    def _make_provider(self, capabilities=("IMAP4REV1", "ENABLE", "CONDSTORE", "QRESYNC")):
+        from ownmail.providers.imap import ImapProvider
+
+        mock_keychain = MagicMock()
+        provider = ImapProvider(
+            account="alice@example.com",
+            keychain=mock_keychain,
+            host="imap.fastmail.com",
+            exclude_folders=[],
+        )
+        provider._conn = MagicMock()
+        provider._conn.capability.return_value = ("OK", [" ".join(capabilities).encode()])
+        provider._conn.enable.return_value = ("OK", [b"QRESYNC"])
+        provider._negotiate_extensions()
+        return provider
+
+    def test_negotiates_qresync(self):
+        provider = self._make_provider()
+        assert provider._qresync is True
+        assert provider._condstore is True
+        provider._conn.enable.assert_called_once_with("QRESYNC")
+
+    def test_negotiates_condstore_only(self):
+        provider = self._make_provider(capabilities=("IMAP4REV1", "CONDSTORE"))
+        assert provider._condstore is True
+        assert provider._qresync is False
+        provider._conn.enable.assert_not_called()
+
+    def test_no_extensions(self):
+        provider = self._make_provider(capabilities=("IMAP4REV1",))
+        assert provider._condstore is False
+        assert provider._qresync is False
+
+    def test_status_requests_highestmodseq(self):
+        provider = self._make_provider()
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 11 UIDVALIDITY 1 MESSAGES 10 HIGHESTMODSEQ 900)'],
+        )
+
+        result = provider._get_folder_status("INBOX")
+        assert result["highestmodseq"] == 900
+        provider._conn.status.assert_called_once_with(
+            '"INBOX"', "(UIDNEXT UIDVALIDITY MESSAGES HIGHESTMODSEQ)"
+        )
+
+    def test_parse_uid_set(self):
+        from ownmail.providers.imap import ImapProvider
+
+        assert ImapProvider._parse_uid_set(b"1:3,7") == [1, 2, 3, 7]
+        assert ImapProvider._parse_uid_set(b" 9:8 ") == [8, 9]
+        assert ImapProvider._parse_uid_set(b"") == []
+
+    def test_modseq_change_reports_vanished_as_label_removal(self, capsys):
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 11 UIDVALIDITY 1 MESSAGES 8 HIGHESTMODSEQ 950)'],
+        )
+        provider._conn.select.return_value = ("OK", [b"8"])
+
+        def mock_response(name):
+            if name == "VANISHED":
+                return ("VANISHED", [b"(EARLIER) 4:5"])
+            return (name, [b"1"])
+
+        provider._conn.response.side_effect = mock_response
+
+        def mock_uid(cmd, *args):
+            if cmd == "fetch":
+                return ("OK", [b"3 (UID 3 MODSEQ (940) FLAGS (\\Seen))"])
+            return ("OK", [b"10"])  # No new UIDs (search returns the boundary)
+
+        provider._conn.uid.side_effect = mock_uid
+
+        state = json.dumps({"INBOX": {"max_uid": 10, "uidvalidity": "1", "highestmodseq": 900}})
+        with patch("ownmail.providers.imap.time.sleep"):
+            new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert new_ids == []
+        provider._conn.uid.assert_any_call(
+            "fetch", "1:10", "(UID FLAGS)", "(CHANGEDSINCE 900 VANISHED)"
+        )
+        assert provider.get_label_changes() == {
+            "INBOX:4": {"add": [], "remove": ["INBOX"]},
+            "INBOX:5": {"add": [], "remove": ["INBOX"]},
+        }
+        assert json.loads(new_state)["INBOX"]["highestmodseq"] == 950
+
+    def test_unchanged_modseq_skips_folder(self, capsys):
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 11 UIDVALIDITY 1 MESSAGES 10 HIGHESTMODSEQ 900)'],
+        )
+
+        state = json.dumps({"INBOX": {"max_uid": 10, "uidvalidity": "1", "highestmodseq": 900}})
+        new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert new_ids == []
+        assert provider.get_label_changes() == {}
+        provider._conn.select.assert_not_called()
+
+    def test_condstore_only_ignores_modseq_change(self, capsys):
+        """Without QRESYNC a flag change alone does not SELECT the folder."""
+        provider = self._make_provider(capabilities=("IMAP4REV1", "CONDSTORE"))
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "INBOX"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"INBOX" (UIDNEXT 11 UIDVALIDITY 1 MESSAGES 10 HIGHESTMODSEQ 950)'],
+        )
+
+        state = json.dumps({"INBOX": {"max_uid": 10, "uidvalidity": "1", "highestmodseq": 900}})
+        new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert new_ids == []
+        assert provider.get_label_changes() == {}
+        provider._conn.select.assert_not_called()
+        provider._conn.uid.assert_not_called()
+        assert json.loads(new_state)["INBOX"]["highestmodseq"] == 950
+
+    def test_vanished_matches_primary_provider_id_only(self, temp_dir, capsys):
+        """Vanished UIDs remove the label from messages first downloaded from
+        that folder; a duplicate first downloaded from another folder keeps it."""
+        from ownmail.database import ArchiveDatabase
+
+        account = "alice@example.com"
+        db = ArchiveDatabase(temp_dir)
+        # Archive:4 was downloaded from Archive; Archive:5 was a Message-ID
+        # duplicate of INBOX:9, stored under that ID with both labels
+        db.mark_downloaded(
+            ArchiveDatabase.make_email_id(account, "Archive:4"), "Archive:4", "a.eml", account=account
+        )
+        db.apply_label_changes(account, {"Archive:4": {"add": ["Archive"]}})
+        db.mark_downloaded(
+            ArchiveDatabase.make_email_id(account, "INBOX:9"), "INBOX:9", "b.eml", account=account
+        )
+        db.apply_label_changes(account, {"INBOX:9": {"add": ["INBOX", "Archive"]}})
+
+        provider = self._make_provider()
+        provider._conn.list.return_value = (
+            "OK", [b'(\\HasNoChildren) "/" "Archive"'],
+        )
+        provider._conn.status.return_value = (
+            "OK", [b'"Archive" (UIDNEXT 6 UIDVALIDITY 1 MESSAGES 3 HIGHESTMODSEQ 950)'],
+        )
+        provider._conn.select.return_value = ("OK", [b"3"])
+
+        def mock_response(name):
+            if name == "VANISHED":
+                return ("VANISHED", [b"(EARLIER) 4:5"])
+            return (name, [b"1"])
+
+        provider._conn.response.side_effect = mock_response
+        provider._conn.uid.return_value = ("OK", [None])
+
+        state = json.dumps({"Archive": {"max_uid": 5, "uidvalidity": "1", "highestmodseq": 900}})
+        with patch("ownmail.providers.imap.time.sleep"):
+            provider.get_new_message_ids(state)
+
+        assert db.apply_label_changes(account, provider.get_label_changes()) == 1
+        assert db.get_labels_for_email(ArchiveDatabase.make_email_id(account, "Archive:4")) == []
+        assert sorted(db.get_labels_for_email(ArchiveDatabase.make_email_id(account, "INBOX:9"))) == [
+            "Archive", "INBOX",
+        ]
+
+
+class TestImapGmailExtensions:
+    """Tests for X-GM-MSGID / X-GM-LABELS on Gmail IMAP."""
+
+    def _make_provider(self):
+        from ownmail.providers.imap import ImapProvider
+
+        mock_keychain = MagicMock()
+        provider = ImapProvider(
+            account="alice@gmail.com",
+            keychain=mock_keychain,
+        )
+        provider._conn = MagicMock()
+        provider._conn.capabilities = ("IMAP4REV1", "X-GM-EXT-1")
+        provider._conn.list.return_value = (
+            "OK",
+            [
+                b'(\\HasNoChildren) "/" "INBOX"',
+                b'(\\Noselect \\HasChildren) "/" "[Gmail]"',
+                b'(\\All \\HasNoChildren) "/" "[Gmail]/All Mail"',
+                b'(\\HasNoChildren \\Sent) "/" "[Gmail]/Gesendet"',
+                b'(\\HasNoChildren \\Trash) "/" "[Gmail]/Trash"',
+                b'(\\HasNoChildren) "/" "Work"',
+            ],
+        )
+        return provider
+
+    def test_parse_gmail_labels(self):
+        from ownmail.providers.imap import ImapProvider
+
+        line = b'1 (X-GM-MSGID 1278455344230334865 X-GM-LABELS ("\\\\Inbox" "My \\"Label\\"" Work) UID 5)'
+        assert ImapProvider._parse_gmail_labels(line) == ["\\Inbox", 'My "Label"', "Work"]
+        assert ImapProvider._parse_gmail_labels(b"1 (X-GM-LABELS () UID 5)") == []
+        assert ImapProvider._parse_gmail_labels(b"1 (UID 5)") is None
+
+    def test_join_fetch_lines_with_literal(self):
+        from ownmail.providers.imap import ImapProvider
+
+        data = [
+            (b'1 (UID 5 X-GM-LABELS ("\\\\Inbox" {5}', b"A (b)"),
+            b")",
+            b'2 (UID 6 X-GM-LABELS ("\\\\Sent"))',
+        ]
+        lines = ImapProvider._join_fetch_lines(data)
+        assert len(lines) == 2
+        assert ImapProvider._parse_gmail_labels(lines[0]) == ["\\Inbox", "A (b)"]
+
+    def test_map_gmail_labels_uses_special_use_folders(self):
+        provider = self._make_provider()
+        provider._list_folders()
+
+        labels = provider._map_gmail_labels(
+            "[Gmail]/All Mail", ["\\Inbox", "\\Sent", "\\Starred", "\\Trash", "Work"]
+        )
+        assert labels == ["[Gmail]/All Mail", "INBOX", "[Gmail]/Gesendet", "[Gmail]/Starred", "Work"]
+
+    def test_scan_gmail_fetches_labels_from_all_mail_only(self, capsys):
+        provider = self._make_provider()
+        provider._conn.select.return_value = ("OK", [b"2"])
+
+        def mock_uid(cmd, *args):
+            if cmd == "search":
+                return ("OK", [b"1 2"])
+            return ("OK", [
+                b'1 (X-GM-MSGID 111 X-GM-LABELS ("\\\\Inbox" Work) UID 1)',
+                b'2 (X-GM-MSGID 222 X-GM-LABELS () UID 2)',
+            ])
+
+        provider._conn.uid.side_effect = mock_uid
+
+        ids = provider.get_all_message_ids()
+
+        assert ids == ["[Gmail]/All Mail:1", "[Gmail]/All Mail:2"]
+        provider._conn.select.assert_called_once_with('"[Gmail]/All Mail"', readonly=True)
+        provider._conn.uid.assert_any_call("fetch", "1,2", "(X-GM-MSGID X-GM-LABELS)")
+        assert provider._get_labels_for_downloaded(
+            "[Gmail]/All Mail:1", b"", "[Gmail]/All Mail"
+        ) == ["[Gmail]/All Mail", "INBOX", "Work"]
+        assert provider._get_labels_for_downloaded(
+            "[Gmail]/All Mail:2", b"", "[Gmail]/All Mail"
+        ) == ["[Gmail]/All Mail"]
+
+    def test_incremental_sync_checks_only_all_mail(self, capsys):
+        provider = self._make_provider()
+        provider._conn.status.return_value = (
+            "OK", [b'"[Gmail]/All Mail" (UIDNEXT 13 UIDVALIDITY 7 MESSAGES 12)'],
+        )
+        provider._conn.select.return_value = ("OK", [b"12"])
+        provider._conn.response.return_value = ("OK", [b"7"])
+
+        def mock_uid(cmd, *args):
+            if cmd == "search":
+                return ("OK", [b"12"])
+            return ("OK", [b'1 (X-GM-MSGID 333 X-GM-LABELS ("\\\\Important") UID 12)'])
+
+        provider._conn.uid.side_effect = mock_uid
+
+        state = json.dumps({
+            "[Gmail]/All Mail": {"max_uid": 11, "uidvalidity": "7"},
+            "INBOX": {"max_uid": 3, "uidvalidity": "7"},
+        })
+        with patch("ownmail.providers.imap.time.sleep"):
+            new_ids, new_state = provider.get_new_message_ids(state)
+
+        assert new_ids == ["[Gmail]/All Mail:12"]
+        assert list(json.loads(new_state)) == ["[Gmail]/All Mail"]
+        assert provider._conn.select.call_count == 1
+        assert provider._gmail_labels["[Gmail]/All Mail:12"] == [
+            "[Gmail]/All Mail", "[Gmail]/Important",
+        ]
+
+    def test_condstore_relabel_reports_full_label_set(self, capsys):
+        provider = self._make_provider()
+        provider._condstore = True
+        provider._conn.status.return_value = (
+            "OK", [b'"[Gmail]/All Mail" (UIDNEXT 12 UIDVALIDITY 7 MESSAGES 11 HIGHESTMODSEQ 60)'],
+        )
+        provider._conn.select.return_value = ("OK", [b"11"])
+        provider._conn.response.return_value = ("OK", [b"7"])
+
+        def mock_uid(cmd, *args):
+            if cmd == "fetch":
+                return ("OK", [b'4 (UID 4 MODSEQ (60) X-GM-LABELS (Work))'])
+            return ("OK", [b"11"])
+
+        provider._conn.uid.side_effect = mock_uid
+
+        state = json.dumps({
+            "[Gmail]/All Mail": {"max_uid": 11, "uidvalidity": "7", "highestmodseq": 50},
+        })
+        with patch("ownmail.providers.imap.time.sleep"):
+            new_ids, _ = provider.get_new_message_ids(state)
+
+        assert new_ids == []
+        provider._conn.uid.assert_any_call(
+            "fetch", "1:11", "(UID X-GM-LABELS)", "(CHANGEDSINCE 50)"
+        )
+        assert provider.get_label_changes() == {
+            "[Gmail]/All Mail:4": {"set": ["[Gmail]/All Mail", "Work"]},
+        }
+
+
+class TestImapCompression:
+    """Tests for COMPRESS=DEFLATE transport."""
+
+    @staticmethod
+    def _deflate(data: bytes) -> bytes:
+        import zlib
+
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def test_stream_reads_lines_and_literals(self):
+        import io
+
+        from ownmail.providers.imap import _DeflateStream
+
+        payload = b"* 1 FETCH (UID 5 RFC822 {11}\r\nhello world)\r\nA001 OK done\r\n"
+        raw = io.BufferedReader(io.BytesIO(self._deflate(payload)))
+        stream = _DeflateStream(raw, MagicMock())
+
+        assert stream.readline() == b"* 1 FETCH (UID 5 RFC822 {11}\r\n"
+        assert stream.read(11) == b"hello world"
+        assert stream.readline() == b")\r\n"
+        assert stream.readline(5) == b"A001 "
+        assert stream.readline() == b"OK done\r\n"
+        assert stream.readline() == b""
+        assert stream.bytes_in == len(payload)
+        assert stream.wire_bytes_in > 0
+
+    def test_stream_send_compresses(self):
+        import io
+        import zlib
+
+        from ownmail.providers.imap import _DeflateStream
+
+        sock = MagicMock()
+        stream = _DeflateStream(io.BufferedReader(io.BytesIO(b"")), sock)
+        command = b"A002 UID FETCH 1:* (RFC822)\r\n" * 20
+
+        stream.send(command)
+
+        sent = sock.sendall.call_args.args[0]
+        assert zlib.decompressobj(-zlib.MAX_WBITS).decompress(sent) == command
+        assert stream.bytes_out == len(command)
+        assert stream.wire_bytes_out == len(sent) < len(command)
+
+    def _make_provider(self, compress=True):
+        from ownmail.providers.imap import ImapProvider
+
+        provider = ImapProvider(
+            account="alice@example.com",
+            keychain=MagicMock(),
+            host="imap.fastmail.com",
+            compress=compress,
+        )
+        provider._conn = MagicMock()
+        provider._conn.capabilities = ("IMAP4REV1", "COMPRESS=DEFLATE")
+        provider._conn.xatom.return_value = ("OK", [b"DEFLATE active"])
+        return provider
+
+    def test_enable_compression_wraps_connection(self, capsys):
+        from ownmail.providers.imap import _DeflateStream
+
+        provider = self._make_provider()
+        assert provider._enable_compression() is True
+
+        provider._conn.xatom.assert_called_once_with("COMPRESS", "DEFLATE")
+        assert isinstance(provider._conn.file, _DeflateStream)
+        assert provider._conn.send == provider._conn.file.send
+        assert provider.get_transfer_stats() == {
+            "wire_bytes_in": 0, "bytes_in": 0, "wire_bytes_out": 0, "bytes_out": 0,
+        }
+
+    def test_enable_compression_not_advertised(self):
+        provider = self._make_provider()
+        provider._conn.capabilities = ("IMAP4REV1",)
+
+        assert provider._enable_compression() is False
+        provider._conn.xatom.assert_not_called()
+        assert provider.get_transfer_stats() is None
+
+    def test_enable_compression_rejected(self):
+        provider = self._make_provider()
+        provider._conn.xatom.return_value = ("NO", [b"compression not allowed"])
+
+        assert provider._enable_compression() is False
+        assert provider.get_transfer_stats() is None
+
+    def test_authenticate_respects_config_switch(self, capsys):
+        provider = self._make_provider(compress=False)
+        provider._keychain.load_imap_password.return_value = "pw"
+
+        with patch("ownmail.providers.imap.imaplib.IMAP4_SSL", return_value=provider._conn):
+            provider.authenticate()
+
+        provider._conn.xatom.assert_not_called()
+
+
+class TestImapByteBudget:
+    """Tests for size-aware batching and streaming of large messages."""
+
+    def _make_provider(self, batch_bytes=1000, stream_threshold=500):
+        from ownmail.providers.imap import ImapProvider
+
+        provider = ImapProvider(
+            account="alice@example.com",
+            keychain=MagicMock(),
+            host="imap.fastmail.com",
+            batch_bytes=batch_bytes,
+            stream_threshold=stream_threshold,
+        )
+        provider._conn = MagicMock()
+        provider._conn.select.return_value = ("OK", [b"3"])
+        provider._message_id_to_folders = None
+        return provider
+
+    def test_get_message_sizes(self):
+        provider = self._make_provider()
+        provider._conn.uid.return_value = (
+            "OK",
+            [b"1 (UID 10 RFC822.SIZE 300)", b"2 (RFC822.SIZE 4000 UID 11)"],
+        )
+
+        sizes = provider.get_message_sizes(["INBOX:10", "INBOX:11", "INBOX:12"])
+
+        assert sizes == {"INBOX:10": 300, "INBOX:11": 4000}
+        provider._conn.uid.assert_called_once_with("fetch", "10,11,12", "(RFC822.SIZE INTERNALDATE)")
+        # Cached: no second round trip
+        provider.get_message_sizes(["INBOX:10"])
+        assert provider._conn.uid.call_count == 1
+
+    def test_pack_by_size(self, tmp_path):
+        provider = self._make_provider()
+        provider.spool_dir = tmp_path
+        provider._message_sizes = {
+            "INBOX:1": 400, "INBOX:2": 400, "INBOX:3": 400,
+            "INBOX:4": 5000, "INBOX:5": 100,
+        }
+
+        batches = provider._pack_by_size(["INBOX:1", "INBOX:2", "INBOX:3", "INBOX:4", "INBOX:5"])
+
+        assert batches == [["INBOX:1", "INBOX:2"], ["INBOX:3"], ["INBOX:4"], ["INBOX:5"]]
+
+    def test_pack_without_sizes_uses_fixed_count(self):
+        from ownmail.providers.imap import FETCH_BODY_BATCH_SIZE, ImapProvider
+
+        provider = ImapProvider(account="alice@example.com", keychain=MagicMock())
+        ids = [f"INBOX:{n}" for n in range(60)]
+
+        batches = provider._pack_by_size(ids)
+
+        assert [len(b) for b in batches] == [FETCH_BODY_BATCH_SIZE, FETCH_BODY_BATCH_SIZE, 10]
+
+    def test_large_message_not_streamed_without_spool_dir(self):
+        provider = self._make_provider()
+        provider._message_sizes = {"INBOX:1": 5000}
+
+        assert provider._should_stream("INBOX:1") is False
+        assert provider._pack_by_size(["INBOX:1", "INBOX:2"]) == [["INBOX:1"], ["INBOX:2"]]
+
+    def test_stream_message_in_chunks(self, tmp_path):
+        from ownmail.providers import imap
+
+        provider = self._make_provider()
+        provider.spool_dir = tmp_path
+        body = b"Subject: big\r\n\r\n" + b"x" * 50
+        chunk = 20
+
+        def fake_uid(command, uid, items):
+            offset = int(items.split("<")[1].split(".")[0])
+            part = body[offset:offset + chunk]
+            return "OK", [(f"1 (UID 7 BODY[]<{offset}> {{{len(part)}}}".encode(), part), b")"]
+
+        provider._conn.uid.side_effect = fake_uid
+        with patch.object(imap, "STREAM_CHUNK_BYTES", chunk):
+            path = provider._stream_message(7)
+
+        assert path.parent == tmp_path
+        assert path.read_bytes() == body
+        first = provider._conn.uid.call_args_list[0].args
+        assert first == ("fetch", "7", "(BODY.PEEK[]<0.20>)")
+
+    def test_stream_message_failure_removes_temp_file(self, tmp_path):
+        provider = self._make_provider()
+        provider.spool_dir = tmp_path
+        provider._conn.uid.return_value = ("NO", [b"gone"])
+
+        with pytest.raises(RuntimeError):
+            provider._stream_message(7)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_download_batch_streams_large_message(self, tmp_path):
+        provider = self._make_provider()
+        provider.spool_dir = tmp_path
+        provider._message_sizes = {"INBOX:1": 100, "INBOX:2": 100, "INBOX:3": 5000}
+        big = b"Subject: big\r\n\r\nlarge body"
+
+        def fake_uid(command, uid_set, items):
+            if items.startswith("(BODY.PEEK"):
+                return "OK", [(b"3 (UID 3 BODY[]<0> {25}", big), b")"]
+            return "OK", [
+                (b"1 (UID 1 RFC822 {10}", b"Subject: a\r\n\r\n1"), b")",
+                (b"2 (UID 2 RFC822 {10}", b"Subject: b\r\n\r\n2"), b")",
+            ]
+
+        provider._conn.uid.side_effect = fake_uid
+
+        results = provider.download_messages_batch(["INBOX:1", "INBOX:2", "INBOX:3"])
+
+        assert results["INBOX:1"] == (b"Subject: a\r\n\r\n1", ["INBOX"], None)
+        path, labels, error = results["INBOX:3"]
+        assert path.read_bytes() == big
+        assert labels == ["INBOX"] and error is None
+        fetches = [c.args[1] for c in provider._conn.uid.call_args_list]
+        assert fetches == ["1,2", "3"]
+
+    def test_plan_download_batches_keeps_order(self, tmp_path):
+        provider = self._make_provider()
+        provider.spool_dir = tmp_path
+        provider._conn.uid.return_value = (
+            "OK",
+            [b"1 (UID 1 RFC822.SIZE 600)", b"2 (UID 2 RFC822.SIZE 600)", b"3 (UID 3 RFC822.SIZE 9000)"],
+        )
+
+        batches = provider.plan_download_batches(["INBOX:1", "INBOX:2", "INBOX:3"])
+
+        assert batches == [["INBOX:1"], ["INBOX:2"], ["INBOX:3"]]
+
+    def test_get_message_dates_shares_prepass(self):
+        provider = self._make_provider()
+        provider._conn.uid.return_value = (
+            "OK",
+            [
+                b'1 (UID 1 RFC822.SIZE 300 INTERNALDATE "17-Jul-2024 02:44:25 +0000")',
+                b"2 (UID 2 RFC822.SIZE 400)",
+            ],
+        )
+
+        dates = provider.get_message_dates(["INBOX:1", "INBOX:2"])
+        sizes = provider.get_message_sizes(["INBOX:1", "INBOX:2"])
+
+        assert dates == {"INBOX:1": 1721184265.0}
+        assert sizes == {"INBOX:1": 300, "INBOX:2": 400}
+        assert provider._conn.uid.call_count == 1
+
+
+class TestImapIdle:
+    """Tests for IMAP IDLE in watch mode."""
+
+    def _provider(self, capabilities=("IMAP4REV1", "IDLE")):
+        from ownmail.providers.imap import ImapProvider
+
+        provider = ImapProvider(account="alice@example.com", keychain=MagicMock(), host="imap.example.com")
+        provider._conn = MagicMock()
+        provider._conn.capabilities = capabilities
+        provider._conn.select.return_value = ("OK", [b"10"])
+        provider._conn._new_tag.return_value = b"A001"
+        provider._conn.sock.pending.return_value = 0
+        return provider
+
+    def test_idle_returns_on_new_mail(self):
+        provider = self._provider()
+        provider._conn.readline.side_effect = [
+            b"+ idling\r\n", b"* 11 EXISTS\r\n", b"A001 OK IDLE terminated\r\n",
+        ]
+
+        with patch("ownmail.providers.imap.select.select", return_value=([1], [], [])):
+            assert provider.wait_for_changes(600) is True
+
+        sent = [c.args[0] for c in provider._conn.send.call_args_list]
+        assert sent == [b"A001 IDLE\r\n", b"DONE\r\n"]
+        assert provider._conn.select.call_args.args[0] == '"INBOX"'
+
+    def test_idle_times_out_quietly(self):
+        provider = self._provider()
+        provider._conn.readline.side_effect = [b"+ idling\r\n", b"A001 OK IDLE terminated\r\n"]
+
+        with patch("ownmail.providers.imap.select.select", return_value=([], [], [])), \
+             patch("ownmail.providers.imap.IDLE_POLL_SECONDS", 0.01):
+            assert provider.wait_for_changes(0.05) is False
+
+        assert provider._conn.send.call_args.args[0] == b"DONE\r\n"
+
+    def test_idle_rejected_raises(self):
+        provider = self._provider()
+        provider._conn.readline.return_value = b"A001 BAD unknown command\r\n"
+
+        with pytest.raises(RuntimeError, match="IDLE rejected"):
+            provider.wait_for_changes(600)
+
+    def test_without_idle_falls_back_to_waiting(self):
+        import threading
+
+        provider = self._provider(capabilities=("IMAP4REV1",))
+        stop_event = threading.Event()
+        stop_event.set()
+
+        assert provider.wait_for_changes(600, stop_event) is False
+        provider._conn.send.assert_not_called()
@@ -0,0 +1,86 @@
+"""Tests for the quote- and signature-stripping index normalizer."""
+
+from pathlib import Path
+
+from ownmail.normalize import SIGNATURE_MAX_LINES, strip_quoted_text
+from ownmail.parser import EmailParser
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+class TestStripQuotedText:
+    """Tests for strip_quoted_text."""
+
+    def test_quoted_reply_fixture(self):
+        body = EmailParser.parse_file(filepath=FIXTURES / "quoted_reply.eml")["body"]
+
+        text = strip_quoted_text(body)
+
+        assert "Thanks for your message!" in text
+        assert "My response continues here." in text
+        assert "quoted message" not in text
+        assert "Third level quote" not in text
+        assert "wrote:" not in text
+
+    def test_wrapped_attribution_and_signature(self):
+        body = (
+            "Sounds good.\n\n"
+            "On Mon, 1 Jan 2024 at 12:00, Some Name <\n"
+            "some@example.com> wrote:\n"
+            "> Shall we meet?\n\n"
+            "-- \nJane Doe\nACME Corp\n"
+        )
+        assert strip_quoted_text(body) == "Sounds good."
+
+    def test_inline_replies_kept(self):
+        body = "> question one\nanswer one\n> question two\nanswer two"
+        assert strip_quoted_text(body) == "answer one\nanswer two"
+
+    def test_other_language_attribution_and_mobile_footer(self):
+        body = "확인했습니다.\n\n2024년 1월 1일 (월) 오후 12:00, 홍길동 <a@example.com>님이 작성:\n> 인용문\n\nSent from my iPhone"
+        assert strip_quoted_text(body) == "확인했습니다."
+
+    def test_outlook_original_message(self):
+        body = (
+            "Approved.\n\n________________________________\n"
+            "From: Bob <bob@example.com>\nSent: Monday, January 1, 2024 12:00 PM\n"
+            "To: Alice\nSubject: RE: Budget\n\nEarlier text"
+        )
+        assert strip_quoted_text(body) == "Approved."
+        assert strip_quoted_text("Yes.\n-----Original Message-----\nEarlier") == "Yes."
+
+    def test_forward_kept(self):
+        body = (
+            "FYI\n\n---------- Forwarded message ---------\n"
+            "From: Bob <bob@example.com>\nDate: Mon, Jan 1, 2024\nSubject: Budget\nTo: me\n\n"
+            "Forwarded text"
+        )
+        assert strip_quoted_text(body) == body
+
+    def test_apple_mail_forward_kept(self):
+        body = (
+            "See below\n\nBegin forwarded message:\n\n"
+            "From: Bob <bob@example.com>\nSubject: Budget\nDate: 1 January 2024\nTo: me\n\n"
+            "Forwarded text"
+        )
+        assert strip_quoted_text(body) == body
+
+    def test_outlook_forward_header_block_kept(self):
+        body = (
+            "FYI\n\n________________________________\n"
+            "From: Bob <bob@example.com>\nSent: Monday, January 1, 2024 9:00 AM\n"
+            "To: Me\nSubject: FW: Budget\n\nForwarded text"
+        )
+        assert strip_quoted_text(body) == body
+        original = body.replace("________________________________", "-----Original Message-----")
+        assert strip_quoted_text(original) == original
+        reply = body.replace("FW: Budget", "RE: Budget")
+        assert strip_quoted_text(reply) == "FYI"
+
+    def test_long_tail_after_dashes_is_not_a_signature(self):
+        body = "Intro\n--\n" + "\n".join(f"line {i}" for i in range(SIGNATURE_MAX_LINES + 1))
+        assert strip_quoted_text(body) == body
+
+    def test_nothing_left_keeps_body(self):
+        assert strip_quoted_text("> only a quote\n> more") == "> only a quote\n> more"
+        assert strip_quoted_text("") == ""
@@ -3,6 +3,8 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -192,6 +194,17 @@ class TestParseFileEdgeCases:
         assert result["subject"] == "Test Email"
         assert result["sender"] == "sender@example.com"
 
+    def test_parse_compressed_file_from_disk(self, temp_dir, sample_eml_simple):
+        """Test parsing a zstd-compressed .eml.zst file."""
+        import pytest
+        zstandard = pytest.importorskip("zstandard")
+
+        filepath = temp_dir / "test.eml.zst"
+        filepath.write_bytes(zstandard.ZstdCompressor().compress(sample_eml_simple))
+
+        result = EmailParser.parse_file(filepath=filepath)
+        assert result["subject"] == "Test Email"
+
     def test_parse_multipart_html_fallback(self):
         """Test HTML fallback when no plain text."""
         content = b"""From: sender@example.com
@@ -486,6 +499,247 @@ class TestSafeGetHeaderFallback:
         assert result == ""
 
 
+class TestRawHeaders:
+    """Tests for the single-pass raw header map."""
+
+    def test_split_raw_headers(self):
+        content = (
+            b"Subject: first\r\n  continued\r\n"
+            b"To: a@example.com\r\n"
+            b"X-No-Colon\r\n"
+            b"Subject: later copy\r\n"
+            b"\r\n"
+            b"Body: not a header\r\n"
+        )
+
+        headers = EmailParser._split_raw_headers(content)
+
+        assert headers == {b"subject": b"first continued", b"to": b"a@example.com"}
+
+    def test_split_raw_headers_lf_and_empty(self):
+        assert EmailParser._split_raw_headers(b"From: x\nDate: y\n\nBody") == {
+            b"from": b"x", b"date": b"y",
+        }
+        assert EmailParser._split_raw_headers(b"\r\nBody: x") == {}
+
+    def test_parse_file_splits_headers_once(self):
+        from unittest.mock import patch
+
+        # Raw 8-bit cp949 headers make every header take the raw fallback
+        content = (
+            "Subject: 한글 제목\r\nFrom: 홍길동 <a@example.com>\r\nTo: 김철수 <b@example.com>\r\n"
+        ).encode("cp949") + b"Content-Type: text/plain; charset=cp949\r\n\r\n" + b"Body\r\n" * 1000
+
+        with patch.object(
+            EmailParser, "_split_raw_headers", wraps=EmailParser._split_raw_headers
+        ) as mock_split:
+            result = EmailParser.parse_file(content=content)
+
+        assert mock_split.call_count == 1
+        assert result["subject"] == "한글 제목"
+        assert "홍길동" in result["sender"]
+
+
+class TestDecodeStrategy:
+    """Tests for the per-sender decode-strategy cache."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self, monkeypatch):
+        from collections import OrderedDict
+
+        from ownmail import parser
+        monkeypatch.setattr(parser, "_decode_strategies", OrderedDict())
+
+    def test_count_high_bytes(self):
+        from ownmail.parser import count_high_bytes
+        assert count_high_bytes(b"") == 0
+        assert count_high_bytes(b"plain ascii") == 0
+        assert count_high_bytes("한글 ok".encode("euc-kr")) == 4
+        assert count_high_bytes(bytes(range(256))) == 128
+
+    def test_validate_matches_per_char_ranges(self):
+        import random
+
+        from ownmail.parser import _validate_decoded_text
+
+        def reference(text):
+            sample = text[:1000]
+            readable = sum(
+                1 for c in sample
+                if 0x20 <= ord(c) <= 0x7E or c in "\t\n\r" or 0x80 <= ord(c) <= 0xFF
+                or 0x200B <= ord(c) <= 0x200D or ord(c) in (0x2060, 0xFEFF)
+                or 0x1100 <= ord(c) <= 0x11FF or 0x3000 <= ord(c) <= 0x30FF
+                or 0x4E00 <= ord(c) <= 0x9FFF or 0xAC00 <= ord(c) <= 0xD7AF
+                or 0xFF00 <= ord(c) <= 0xFFEF
+            )
+            return readable / len(sample) >= 0.7
+
+        rng = random.Random(48)
+        for _ in range(200):
+            text = "".join(chr(rng.choice([rng.randrange(0x20, 0x300), rng.randrange(0x300, 0x10000)]))
+                           for _ in range(rng.randrange(1, 50)))
+            text = text.replace("\ufffd", "")
+            if text:
+                assert _validate_decoded_text(text) == reference(text), repr(text)
+
+    def test_decode_strategy_key(self):
+        import email
+
+        from ownmail.parser import decode_strategy_key
+        msg = email.message_from_bytes(b"From: A <a@Mail.Example.COM>\r\n\r\nx")
+        assert decode_strategy_key(msg) == "mail.example.com"
+        msg = email.message_from_bytes(
+            b"From: a@example.com\r\nList-Id: Dev <dev.lists.example.org>\r\n\r\nx"
+        )
+        assert decode_strategy_key(msg) == "dev <dev.lists.example.org>"
+        assert decode_strategy_key(email.message_from_bytes(b"\r\nx")) is None
+
+    def test_remember_and_lru_bound(self, monkeypatch):
+        from ownmail import parser
+        monkeypatch.setattr(parser, "DECODE_STRATEGY_CACHE_SIZE", 2)
+
+        parser.remember_decode_strategy("EUC-KR", "a.example", "cp949")
+        parser.remember_decode_strategy(None, "b.example", "big5")
+        assert parser.get_decode_strategy("euc-kr", "a.example") == "cp949"
+        parser.remember_decode_strategy(None, "c.example", "gbk")
+
+        # b.example was least recently used
+        assert parser.get_decode_strategy(None, "b.example") is None
+        assert parser.get_decode_strategy("euc-kr", "a.example") == "cp949"
+        assert parser.get_decode_strategy(None, "c.example") == "gbk"
+        # Without a sender there is nothing to key on
+        parser.remember_decode_strategy(None, None, "gbk")
+        assert parser.get_decode_strategy(None, None) is None
+
+    def test_detection_order_keeps_utf8_first(self):
+        from ownmail import parser
+        assert parser.detection_order(None, "x.example") == parser.CJK_DETECTION_ENCODINGS
+        parser.remember_decode_strategy(None, "x.example", "big5")
+        order = parser.detection_order(None, "x.example")
+        assert order[:2] == ["utf-8", "big5"]
+        assert sorted(order) == sorted(parser.CJK_DETECTION_ENCODINGS)
+
+    def test_second_message_from_sender_uses_learned_codec(self):
+        from unittest.mock import patch
+
+        from ownmail import parser
+        content = (
+            b"From: news@shop.example.tw\r\nSubject: x\r\n"
+            b"Content-Type: text/plain\r\n\r\n"
+        ) + ("\u6b61\u8fce\u5149\u81e8\u672c\u5e97\u7db2\u7ad9 " * 20).encode("big5")
+
+        first = EmailParser.parse_file(content=content)
+        learned = parser.get_decode_strategy(None, "shop.example.tw")
+        assert learned not in (None, "utf-8")
+
+        with patch.object(parser, "_try_decode", wraps=parser._try_decode) as mock_try:
+            second = EmailParser.parse_file(content=content)
+
+        assert [c.args[1] for c in mock_try.call_args_list] == ["utf-8", learned]
+        assert second["body"] == first["body"]
+
+
+class TestBodyCaps:
+    """Tests for the caps on indexed body text."""
+
+    @staticmethod
+    def _multipart(*parts):
+        body = b"".join(
+            b"--B\r\nContent-Type: " + ctype + b"; charset=utf-8\r\n\r\n" + text + b"\r\n"
+            for ctype, text in parts
+        )
+        return (
+            b"From: a@example.com\r\nSubject: big\r\n"
+            b"Content-Type: multipart/mixed; boundary=B\r\n\r\n" + body + b"--B--\r\n"
+        )
+
+    def test_small_body_not_truncated(self, sample_eml_simple):
+        result = EmailParser.parse_file(content=sample_eml_simple)
+        assert result["body_indexed_bytes"] is None
+
+    def test_part_cap(self):
+        content = self._multipart((b"text/plain", b"a" * 5000), (b"text/plain", b"tail"))
+
+        result = EmailParser.parse_file(content=content, max_part_bytes=1000)
+
+        assert result["body"] == "a" * 1000 + "\ntail"
+        assert result["body_indexed_bytes"] == 1005
+
+    def test_body_cap_skips_later_parts(self):
+        from unittest.mock import patch
+        content = self._multipart(
+            (b"text/plain", b"a" * 3000), (b"text/plain", b"b" * 3000), (b"text/plain", b"c" * 10),
+        )
+
+        with patch.object(
+            EmailParser, "_safe_get_content", wraps=EmailParser._safe_get_content
+        ) as mock_content:
+            result = EmailParser.parse_file(content=content, max_body_bytes=4000, max_part_bytes=None)
+
+        assert result["body"] == "a" * 3000 + "\n" + "b" * 999
+        assert len(result["body"].encode()) == result["body_indexed_bytes"] == 4000
+        # The third part was never decoded
+        assert mock_content.call_count == 2
+
+    def test_cut_on_character_boundary(self):
+        content = self._multipart((b"text/plain", "\ud55c".encode() * 100))
+
+        result = EmailParser.parse_file(content=content, max_part_bytes=100)
+
+        # 3-byte characters: 33 fit in 100 bytes
+        assert result["body"] == "\ud55c" * 33
+        assert result["body_indexed_bytes"] == 99
+
+    def test_no_caps(self):
+        content = self._multipart((b"text/plain", b"a" * 5000))
+
+        result = EmailParser.parse_file(content=content, max_body_bytes=None, max_part_bytes=None)
+
+        assert len(result["body"]) == 5000
+        assert result["body_indexed_bytes"] is None
+
+    def test_html_part_capped(self):
+        html = b"<html><body>" + b"<p>word</p>" * 20000 + b"</body></html>"
+        content = self._multipart((b"text/html", html))
+
+        result = EmailParser.parse_file(content=content, max_part_bytes=1000)
+
+        assert result["body"] == "word" * 250
+        assert result["body_indexed_bytes"] == 1000
+
+    def test_strip_html_stops_feeding_at_cap(self, monkeypatch):
+        from ownmail import parser
+        monkeypatch.setattr(parser, "HTML_FEED_CHARS", 1000)
+        fed = []
+        original = parser.etree.HTMLParser
+
+        def recording_parser(**kwargs):
+            html_parser = original(**kwargs)
+
+            class Recorder:
+                def feed(self, data):
+                    fed.append(data)
+                    html_parser.feed(data)
+
+                def close(self):
+                    return html_parser.close()
+
+            return Recorder()
+
+        monkeypatch.setattr(parser.etree, "HTMLParser", recording_parser)
+        html = "<p>" + "text " * 20000 + "</p>"
+
+        text = EmailParser._strip_html(html, max_chars=2500)
+
+        # 100 chunks in all; the parser may buffer a little text
+        assert len(fed) < 10
+        assert text.startswith("text text")
+
+    def test_strip_html_keeps_text_after_script(self):
+        html = "<p>before</p><script>var x = 1;</script>after <b>bold</b>"
+        assert EmailParser._strip_html(html) == "beforeafter bold"
+
+
 class TestSafeGetContentFallback:
     """Tests for _safe_get_content fallback paths."""
 
@@ -0,0 +1,261 @@
+"""Tests for email file storage (compression and pack segments)."""
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from ownmail.storage import (
+    PackWriter,
+    Readahead,
+    WriteBehind,
+    _warm,
+    email_dir,
+    email_exists,
+    hash_email,
+    is_packed,
+    locality_key,
+    parse_pack_address,
+    read_email,
+    stored_size,
+)
+
+
+class TestPackWriter:
+    """Tests for append-only pack segments."""
+
+    def test_append_and_read(self, temp_dir):
+        writer = PackWriter(temp_dir / "packs")
+        first = writer.append(b"From: a@example.com\r\n\r\nOne", "2024/01/one.eml")
+        second = writer.append(b"From: b@example.com\r\n\r\nTwo", "2024/02/two.eml")
+        writer.close()
+
+        assert is_packed(first) and is_packed(second)
+        assert read_email(first) == b"From: a@example.com\r\n\r\nOne"
+        assert read_email(second) == b"From: b@example.com\r\n\r\nTwo"
+        assert stored_size(second) == len(b"From: b@example.com\r\n\r\nTwo")
+        assert email_exists(second)
+        assert not email_exists(parse_pack_address(second)[0] / "999+5" / "x.eml")
+
+        pack_path, _, _, name = parse_pack_address(second)
+        assert pack_path.name == "pack-000001.pack"
+        assert name == "2024/02/two.eml"
+
+    def test_append_file(self, temp_dir):
+        spool = temp_dir / "spool.tmp"
+        spool.write_bytes(b"x" * 5000)
+
+        writer = PackWriter(temp_dir / "packs")
+        address = writer.append(spool, "2024/01/big.eml")
+        writer.close()
+
+        assert read_email(address) == b"x" * 5000
+
+    def test_two_writers_on_one_segment(self, temp_dir):
+        """A second process appending to the segment doesn't shift our offsets."""
+        watch = PackWriter(temp_dir / "packs")
+        cron = PackWriter(temp_dir / "packs")
+        first = watch.append(b"watch one", "a.eml")
+        second = cron.append(b"cron one", "b.eml")
+        third = watch.append(b"watch two", "c.eml")
+        watch.close()
+        cron.close()
+
+        assert parse_pack_address(first)[0] == parse_pack_address(third)[0]
+        assert [read_email(a) for a in (first, second, third)] == [b"watch one", b"cron one", b"watch two"]
+
+    def test_append_holds_segment_lock(self, temp_dir):
+        fcntl = pytest.importorskip("fcntl")
+
+        writer = PackWriter(temp_dir / "packs")
+        with patch("ownmail.storage.fcntl.flock", wraps=fcntl.flock) as flock:
+            writer.append(b"data", "a.eml")
+        writer.close()
+
+        assert [c.args[1] for c in flock.call_args_list] == [fcntl.LOCK_EX, fcntl.LOCK_UN]
+
+    def test_reads_records_appended_after_mapping(self, temp_dir):
+        writer = PackWriter(temp_dir / "packs")
+        first = writer.append(b"first", "a.eml")
+        assert read_email(first) == b"first"
+
+        second = writer.append(b"second", "b.eml")
+        assert read_email(second) == b"second"
+        writer.close()
+
+    def test_rotates_full_segments(self, temp_dir):
+        writer = PackWriter(temp_dir / "packs", segment_bytes=10)
+        first = writer.append(b"0123456789", "a.eml")
+        second = writer.append(b"abc", "b.eml")
+        writer.close()
+
+        assert parse_pack_address(first)[0].name == "pack-000001.pack"
+        assert parse_pack_address(second)[0].name == "pack-000002.pack"
+
+        # A new writer appends to the newest segment while it has room
+        writer = PackWriter(temp_dir / "packs", segment_bytes=1000)
+        third = writer.append(b"def", "c.eml")
+        writer.close()
+        assert parse_pack_address(third)[0].name == "pack-000002.pack"
+        assert read_email(third) == b"def"
+
+    def test_compressed_record(self, temp_dir):
+        zstandard = pytest.importorskip("zstandard")
+
+        writer = PackWriter(temp_dir / "packs")
+        address = writer.append(zstandard.ZstdCompressor().compress(b"hello"), "2024/01/a.eml.zst")
+        writer.close()
+
+        assert read_email(address) == b"hello"
+
+
+class TestPlainFiles:
+    """Tests for plain and compressed email files."""
+
+    def test_plain_file(self, temp_dir):
+        path = temp_dir / "a.eml"
+        path.write_bytes(b"plain")
+
+        assert not is_packed(path)
+        assert read_email(path) == b"plain"
+        assert stored_size(path) == 5
+        assert email_exists(path)
+        assert not email_exists(temp_dir / "missing.eml")
+
+    def test_compressed_file(self, temp_dir):
+        zstandard = pytest.importorskip("zstandard")
+        path = temp_dir / "a.eml.zst"
+        path.write_bytes(zstandard.ZstdCompressor().compress(b"compressed"))
+
+        assert read_email(path) == b"compressed"
+
+
+class TestWriteBehind:
+    """Tests for batched fsyncs of written emails."""
+
+    def test_flush_syncs_files_dirs_and_packs_once(self, temp_dir):
+        durable = WriteBehind()
+        msg_dir = temp_dir / "2024" / "01"
+        durable.ensure_dir(msg_dir)
+        for name in ("a.eml", "b.eml"):
+            (msg_dir / name).write_bytes(b"x")
+            durable.add_file(msg_dir / name)
+        writer = PackWriter(temp_dir / "packs")
+        writer.append(b"one", "2024/01/c.eml")
+        durable.add_pack(writer)
+        durable.add_pack(writer)
+
+        with patch("ownmail.storage.os.fsync") as fsync:
+            durable.flush()
+            # 2 files + 1 pack segment + msg_dir, 2024/, temp_dir, packs/
+            assert fsync.call_count == 7
+
+            fsync.reset_mock()
+            durable.flush()
+            fsync.assert_not_called()
+        writer.close()
+
+    def test_ensure_dir_caches_known_dirs(self, temp_dir):
+        durable = WriteBehind()
+        msg_dir = temp_dir / "2024" / "01"
+        durable.ensure_dir(msg_dir)
+        assert msg_dir.is_dir()
+
+        with patch.object(Path, "mkdir") as mkdir:
+            durable.ensure_dir(msg_dir)
+            mkdir.assert_not_called()
+
+    def test_flush_skips_removed_files(self, temp_dir):
+        durable = WriteBehind()
+        durable.add_file(temp_dir / "gone.eml")
+        durable.flush()
+
+
+class TestEmailDir:
+    """Tests for directory layouts of plain email files."""
+
+    @pytest.mark.parametrize("layout,expected", [
+        (None, "2024/01"),
+        ("date", "2024/01"),
+        ("day", "2024/01/15"),
+        ("hash", "2024/01/ab"),
+    ])
+    def test_dated_name(self, layout, expected):
+        assert email_dir(layout, "20240115_100000_ab12cd34ef56.eml.zst") == expected
+
+    def test_unknown_date(self):
+        assert email_dir("day", "unknown_ab12cd34ef56.eml") == "unknown"
+        assert email_dir("hash", "unknown_ab12cd34ef56.eml") == "unknown/ab"
+
+    def test_foreign_name(self):
+        assert email_dir("date", "message.eml") is None
+
+
+class TestHashEmail:
+    """Tests for streaming email hashes."""
+
+    def test_plain_file_in_chunks(self, temp_dir):
+        import hashlib
+
+        data = b"x" * 2500
+        path = temp_dir / "a.eml"
+        path.write_bytes(data)
+
+        assert hash_email(path, chunk_size=1000) == (hashlib.sha256(data).hexdigest(), 2500)
+
+    def test_compressed_file(self, temp_dir):
+        import hashlib
+
+        zstandard = pytest.importorskip("zstandard")
+        path = temp_dir / "a.eml.zst"
+        path.write_bytes(zstandard.ZstdCompressor().compress(b"compressed"))
+
+        assert hash_email(path) == (hashlib.sha256(b"compressed").hexdigest(), 10)
+
+
+class TestLocality:
+    """Tests for on-disk ordering and readahead."""
+
+    def test_locality_key_orders_pack_offsets_numerically(self):
+        paths = [
+            "sources/a/packs/pack-000001.pack/900+5/2024/01/b.eml",
+            "sources/a/2024/01/a.eml",
+            "sources/a/packs/pack-000001.pack/12+5/2024/01/a.eml",
+        ]
+
+        assert sorted(paths, key=locality_key) == [paths[1], paths[2], paths[0]]
+
+    def test_readahead_stays_bounded(self, temp_dir):
+        import threading
+
+        warmed = []
+        event = threading.Event()
+
+        def fake_warm(path):
+            warmed.append(path)
+            if len(warmed) in (2, 3):
+                event.set()
+
+        paths = [temp_dir / f"{i}.eml" for i in range(5)]
+        with patch("ownmail.storage._warm", fake_warm), Readahead(paths, depth=2) as readahead:
+            readahead.advance()
+            assert event.wait(5)
+            event.clear()
+            assert warmed == paths[:2]
+
+            readahead.advance()
+            assert event.wait(5)
+            assert warmed == paths[:3]
+
+    def test_warm_reads_without_fadvise(self, temp_dir, monkeypatch):
+        path = temp_dir / "a.eml"
+        path.write_bytes(b"x" * 10)
+        writer = PackWriter(temp_dir / "packs")
+        address = writer.append(b"packed", "2024/01/b.eml")
+        writer.close()
+        monkeypatch.delattr("os.posix_fadvise", raising=False)
+
+        _warm(path)
+        _warm(address)
+        with pytest.raises(OSError):
+            _warm(temp_dir / "missing.eml")
@@ -383,6 +383,25 @@ class TestDecodeTextBody:
         result = _decode_text_body(payload, "invalid-charset-xyz")
         assert "Hello" in result
 
+    def test_learned_codec_tried_after_utf8(self, monkeypatch):
+        """A sender's learned codec is tried right after UTF-8."""
+        from collections import OrderedDict
+        from unittest.mock import patch
+
+        from ownmail import parser, web
+        monkeypatch.setattr(parser, "_decode_strategies", OrderedDict())
+        payload = ("\u6b61\u8fce\u5149\u81e8\u672c\u5e97 " * 10).encode("big5")
+
+        first = web._decode_text_body(payload, None, "shop.example.tw")
+        learned = parser.get_decode_strategy(None, "shop.example.tw")
+        assert learned not in (None, "utf-8")
+
+        with patch.object(web, "_try_decode", wraps=web._try_decode) as mock_try:
+            second = web._decode_text_body(payload, None, "shop.example.tw")
+
+        assert [c.args[1] for c in mock_try.call_args_list] == ["utf-8", learned]
+        assert second == first
+
 
 class TestDecodeHtmlBody:
     """Tests for _decode_html_body function."""
@@ -432,6 +451,12 @@ class TestValidateDecodedText:
         from ownmail.web import _validate_decoded_text
         assert _validate_decoded_text("") is False
 
+    def test_mostly_unreadable_text_fails(self):
+        """Text dominated by characters outside the readable ranges should fail."""
+        from ownmail.web import _validate_decoded_text
+        assert _validate_decoded_text("\u0400\u0401\u0402\u0403 ab") is False
+        assert _validate_decoded_text("\u0400 abcdefg") is True
+
 
 class TestTryDecode:
     """Tests for _try_decode function."""
@@ -497,6 +522,133 @@ class TestRawEmailRoute:
             assert response.status_code == 404
 
 
+class TestCompressedEmailRoutes:
+    """Tests for serving .eml.zst files transparently."""
+
+    def _app(self, tmp_path, eml_content):
+        from unittest.mock import MagicMock
+
+        import pytest
+        zstandard = pytest.importorskip("zstandard")
+
+        from ownmail.web import create_app
+
+        eml_path = tmp_path / "emails" / "test.eml.zst"
+        eml_path.parent.mkdir(parents=True)
+        eml_path.write_bytes(zstandard.ZstdCompressor().compress(eml_content))
+
+        mock_archive = MagicMock()
+        mock_archive.archive_dir = tmp_path
+        mock_archive.db = MagicMock()
+        mock_archive.db.get_email_by_id.return_value = ("msg1", "emails/test.eml.zst")
+        mock_archive.db.get_email_count.return_value = 100
+        return create_app(mock_archive)
+
+    def test_raw_decompresses(self, tmp_path):
+        app = self._app(tmp_path, b"From: test@example.com\nSubject: Test\n\nBody")
+        with app.test_client() as client:
+            response = client.get("/raw/msg1")
+            assert response.status_code == 200
+            assert b"From: test@example.com" in response.data
+
+    def test_download_serves_plain_eml(self, tmp_path):
+        eml_content = b"From: test@example.com\nSubject: Test\n\nBody"
+        app = self._app(tmp_path, eml_content)
+        with app.test_client() as client:
+            response = client.get("/download/msg1")
+            assert response.status_code == 200
+            assert response.data == eml_content
+            assert "test.eml" in response.headers["Content-Disposition"]
+            assert ".zst" not in response.headers["Content-Disposition"]
+
+    def test_attachment_from_compressed_email(self, tmp_path):
+        eml_content = (
+            b"From: test@example.com\n"
+            b"Subject: Test\n"
+            b"MIME-Version: 1.0\n"
+            b"Content-Type: multipart/mixed; boundary=XYZ\n\n"
+            b"--XYZ\nContent-Type: text/plain\n\nBody\n"
+            b"--XYZ\nContent-Type: text/plain\n"
+            b"Content-Disposition: attachment; filename=note.txt\n\nattached text\n"
+            b"--XYZ--\n"
+        )
+        app = self._app(tmp_path, eml_content)
+        with app.test_client() as client:
+            response = client.get("/attachment/msg1/0")
+            assert response.status_code == 200
+            assert b"attached text" in response.data
+
+
+class TestPackedEmailRoutes:
+    """Tests for serving emails stored in pack segments."""
+
+    def test_raw_and_download_from_pack(self, tmp_path):
+        from unittest.mock import MagicMock
+
+        from ownmail.storage import PackWriter
+        from ownmail.web import create_app
+
+        eml_content = b"From: test@example.com\nSubject: Test\n\nBody"
+        writer = PackWriter(tmp_path / "sources" / "work" / "packs")
+        address = writer.append(eml_content, "2024/01/test.eml")
+        writer.close()
+
+        mock_archive = MagicMock()
+        mock_archive.archive_dir = tmp_path
+        mock_archive.db = MagicMock()
+        mock_archive.db.get_email_by_id.return_value = ("msg1", str(address.relative_to(tmp_path)))
+        mock_archive.db.get_email_count.return_value = 100
+
+        app = create_app(mock_archive)
+        with app.test_client() as client:
+            response = client.get("/raw/msg1")
+            assert response.status_code == 200
+            assert b"From: test@example.com" in response.data
+
+            response = client.get("/download/msg1")
+            assert response.status_code == 200
+            assert response.data == eml_content
+            assert "test.eml" in response.headers["Content-Disposition"]
+
+
+class TestDedupedEmailRoutes:
+    """Tests for serving emails whose attachments are in the blob store."""
+
+    def test_download_reassembles(self, tmp_path):
+        import base64
+        import os
+        from unittest.mock import MagicMock
+
+        from ownmail.blobs import BLOB_DIR, BLOB_MIN_BYTES, split_attachments
+        from ownmail.web import create_app
+
+        eml_content = (
+            b"From: test@example.com\r\nSubject: Test\r\n"
+            b'Content-Type: multipart/mixed; boundary="b1"\r\n\r\n'
+            b"--b1\r\nContent-Type: text/plain\r\n\r\nBody\r\n"
+            b"--b1\r\nContent-Type: image/png\r\nContent-Transfer-Encoding: base64\r\n\r\n"
+            + base64.encodebytes(os.urandom(BLOB_MIN_BYTES)).replace(b"\n", b"\r\n")
+            + b"--b1--\r\n"
+        )
+        eml_path = tmp_path / "sources" / "work" / "2024" / "01" / "test.emlb"
+        eml_path.parent.mkdir(parents=True)
+        eml_path.write_bytes(split_attachments(eml_content, tmp_path / BLOB_DIR))
+
+        mock_archive = MagicMock()
+        mock_archive.archive_dir = tmp_path
+        mock_archive.db = MagicMock()
+        mock_archive.db.get_email_by_id.return_value = ("msg1", "sources/work/2024/01/test.emlb")
+        mock_archive.db.get_email_count.return_value = 100
+
+        app = create_app(mock_archive)
+        with app.test_client() as client:
+            response = client.get("/download/msg1")
+            assert response.status_code == 200
+            assert response.data == eml_content
+            assert "test.eml" in response.headers["Content-Disposition"]
+            assert ".emlb" not in response.headers["Content-Disposition"]
+
+
 class TestAttachmentRoute:
     """Tests for /attachment/<email_id>/<index> route."""
 
@@ -597,6 +749,29 @@ This is the email body.
             assert b"Test Subject" in response.data
             assert b"sender@example.com" in response.data
 
+    def test_view_email_shows_index_truncation(self, tmp_path):
+        """A body only partly indexed is flagged on the detail page."""
+        from unittest.mock import MagicMock
+
+        from ownmail.web import create_app
+
+        eml_path = tmp_path / "emails" / "big.eml"
+        eml_path.parent.mkdir(parents=True)
+        eml_path.write_bytes(b"From: a@example.com\nSubject: Logs\nContent-Type: text/plain\n\nlog line\n")
+
+        mock_archive = MagicMock()
+        mock_archive.archive_dir = tmp_path
+        mock_archive.db.get_email_by_id.return_value = ("msg1", "emails/big.eml")
+        mock_archive.db.get_email_count.return_value = 100
+
+        app = create_app(mock_archive)
+        with app.test_client() as client:
+            mock_archive.db.get_body_indexed_bytes.return_value = 1024 * 1024
+            assert b"indexed first 1024 KB" in client.get("/email/msg1").data
+
+            mock_archive.db.get_body_indexed_bytes.return_value = None
+            assert b"indexed first" not in client.get("/email/msg1").data
+
     def test_view_email_with_html_body(self, tmp_path):
         """View email with HTML body should render HTML."""
         from unittest.mock import MagicMock